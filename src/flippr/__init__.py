@@ -1,13 +1,22 @@
 from . import __about__
 
+import asyncio
+from concurrent.futures import CancelledError, Executor
 from pathlib import Path
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
 
 import polars as pl
 
 from . import datatypes as _types
+from . import progress as _progress
 from . import validate as _validate
 from . import reader as _reader
+from . import store as _store
+from . import sweep as _sweep
+from .meta import meta_analysis
+from .power import simulate_power
+from .progress import CancellationToken
+from .server import serve
 from .parameters import rcParams
 
 __version__ = __about__.__version__
@@ -48,6 +57,7 @@ class Study:
         self.method: str = _method
         self.processes: dict[str, _types.Process] = dict()
         self.results: dict[str, _types.Result] = dict()
+        self._store: _store.ResultStore = _store.ResultStore(rcParams)
 
     @property
     def samples(self) -> dict[str, set[str]]:
@@ -65,6 +75,94 @@ class Study:
 
         return {"LiP": lip_samples}
 
+    @property
+    def memory_usage(self) -> pl.DataFrame:
+        """
+        Returns the size in bytes and state (`memory` or `disk`) of every table held by the study results, and of the parsed
+        FragPipe tables shared by the processes and `Study().qc()` (`Process` is null, `Table` names the parsed input).
+        The total memory is bounded by `flippr.rcParams["store.memory_budget"]`.
+
+        """
+
+        processes = {result._namespace: pid for pid, result in self.results.items()}
+
+        return (
+            self._store._usage()
+            .filter(pl.col("Namespace").is_in(list(processes) + ["__raw__"]))
+            .select(
+                pl.col("Namespace").replace_strict(processes, default=None, return_dtype=pl.String).alias("Process"),
+                pl.exclude("Namespace"),
+            )
+        )
+
+    def sweep(self, grid: dict[str, list[Any]], executor: Optional[Executor] = None) -> pl.DataFrame:
+        """
+        Run the processes added to the study over every combination of the rcParams values in `grid`.
+        Each key is mapped to the first pipeline stage it affects (ion statistics, TrP normalization or protein summary),
+        so upstream stages are computed once per distinct value of their own keys and shared by the downstream grid points.
+        Grid points are evaluated in parallel on `executor` (a thread pool of `run.n_workers` if `None`).
+
+        Returns a table with one row per process and grid point: the swept values, `No. of Ions`, `No. of Normalized Proteins` (with TrP),
+        the numbers of valid and significant modified peptides, peptides and cut sites, and the number of proteins with significant cut sites.
+
+        Args:
+            grid (dict[str, list]): rcParams keys to the values to evaluate, other keys keep their current `flippr.rcParams` value.
+            executor (concurrent.futures.Executor, optional): Executor used to evaluate the grid points.
+
+        Examples:
+            >>> study.sweep({
+            ...     "ion.missing_intensity_thresh": [0, 1],
+            ...     "protein.adj_pval_sig_thresh": [0.01, 0.05, 0.1],
+            ... })
+
+        """
+
+        _validate._validate_sweep_grid(grid)
+
+        return _sweep._sweep(self.processes, grid, rcParams, executor)
+
+    def qc(self) -> dict[str, _types.QualityControl]:
+        """
+        Replicate quality control of the LiP and TrP (if included) datasets.
+        Computed from the intensity columns of the parsed FragPipe tables, which are shared with `Study().run()`.
+
+        Returns a `QualityControl` per dataset with the tables:
+            `correlation` - pairwise Pearson correlation of the log2 intensities between samples
+            `missingness` - number and fraction of missing intensities per sample
+            `cv` - distribution of the replicate coefficients of variation per condition
+            `intensity` - distribution of the log2 intensities per sample
+
+        Examples:
+            >>> qc = study.qc()
+            >>> qc["LiP"].correlation
+
+        """
+
+        qc = {"LiP": self._qc(self.lip, "ion")}
+
+        if self.trp is not None:
+            qc.update({"TrP": self._qc(self.trp, "trp")})
+
+        return qc
+
+    def _qc(self, path: Path, kind: str) -> _types.QualityControl:
+        annot = _reader._read_experiment_annotation(path)
+        if kind == "ion":
+            df = _types._read_ions(self._store, path, self.method, None, rcParams)
+        else:
+            df = _types._read_raw(self._store, kind, path, self.method, rcParams)
+
+        suffix = "Intensity"
+        if kind == "trp" and self.method == "dda":
+            suffix = rcParams.get("trp_protein.intensity_value", "MaxLFQ Intensity")
+
+        names = [name for info in annot.values() if (name := info.get("Sample Name")) and f"{name} {suffix}" in df.columns]
+
+        samples = {name: f"{name} {suffix}" for name in names}
+        conditions = {name: "_".join(name.split("_")[:-1]) for name in names}
+
+        return _types.QualityControl(df, samples, conditions)
+
     def _get_samples(self, path: Path) -> set[str]:
         """
         Returns the names of the samples from experimental annotations.
@@ -73,9 +171,7 @@ class Study:
 
         annot = _reader._read_experiment_annotation(path)
 
-        samples = [info.get("Sample Name") for info in annot.values()]
-
-        samples = list(filter(None, samples))
+        samples = [name for info in annot.values() if (name := info.get("Sample Name"))]
 
         samples = ["_".join(name.split("_")[:-1]) for name in samples]
 
@@ -132,17 +228,141 @@ class Study:
                     trp_ctrl,
                     trp_test,
                     trp_n_rep,
+                    self._store,
                 )
             }
         )
 
-    def run(self) -> dict[str, _types.Result]:
+    def dose_response(
+            self,
+            ctrl: str,
+            doses: dict[str, float],
+            n_rep: int,
+            model: str = "sigmoid"
+    ) -> _types.DoseResponse:
+        """
+        Fit dose-response curves of the LiP fold-changes across an ordered series of dose conditions.
+        Every ion, modified peptide, peptide and cut site is fitted at once with vectorized least squares.
+
+        Args:
+            ctrl (str): Control (zero dose) condition sample name from the LiP experiment.
+            doses (dict[str, float]): Dose condition sample names mapped to their concentrations, all concentrations must be positive.
+            n_rep (int): Number of replicates in every condition, the same for all conditions.
+            model (str): `sigmoid` - `Top / (1 + 10^(Hill * (Log EC50 - log10(dose))))`; `log-linear` - `Intercept + Slope * log10(dose)`. Defaults to `sigmoid`.
+
+        Examples:
+            Fit a sigmoidal curve across four doses
+            >>> dr = study.dose_response("DMSO", {"Drug_1uM": 1, "Drug_10uM": 10, "Drug_100uM": 100, "Drug_1mM": 1000}, 3)
+            >>> dr.cut_site.sort("P-value")
+
+        """
+
+        return _types.DoseResponse(
+            rcParams,
+            self.lip,
+            self.method,
+            ctrl,
+            doses,
+            n_rep,
+            model,
+            self._store,
+        )
+
+    def run(self,
+            progress: Optional[_progress.ProgressCallback] = None,
+            cancel: Optional[CancellationToken] = None,
+    ) -> dict[str, _types.Result]:
         """
         Run the processes added to the study.
         Global `Study` parameters can be changed by editing the `flippr.rcParams` dictionary.
-        
+
+        `progress` is called from the thread running the process with one dictionary per event, each with the `event` name
+        and the `process` id:
+
+        - `process_started`
+        - `stage_started` : `table` (`ion` or `trp`) and `stage` (`read`, the `cull` to `log10` statistics stages, `shards`, `clean_up` or `normalize`)
+        - `stage_finished` : as `stage_started`, with the `rows` of the stage output and its duration in `seconds`
+        - `shard_finished` : `shard` (completed count), `n_shards` and `rows`, when `run.n_shards` is greater than `1`
+        - `process_finished` : `rows` of `Result().ion`
+
+        `cancel` is checked between stages and shards; once cancelled, the running stage completes and
+        `concurrent.futures.CancelledError` is raised. `Study().results` keeps the processes that finished before.
+
+        Args:
+            progress (Callable[[dict], None], optional): Progress callback. Defaults to None.
+            cancel (flippr.CancellationToken, optional): Token to stop the run cooperatively. Defaults to None.
+
+        Examples:
+            Log the duration of every stage
+            >>> study.run(progress=lambda e: print(e) if e["event"] == "stage_finished" else None)
+
         """
 
-        self.results = {pid: proc.run() for pid, proc in self.processes.items()}
+        self.results = dict()
+
+        for pid, proc in self.processes.items():
+            self.results[pid] = proc.run(_progress._Monitor(pid, progress, [cancel]))
 
         return self.results
+
+    async def arun(self,
+                   executor: Optional[Executor] = None,
+                   progress: Optional[_progress.ProgressCallback] = None,
+                   cancel: Optional[CancellationToken] = None,
+    ) -> AsyncIterator[tuple[str, _types.Result]]:
+        """
+        Run the processes added to the study without blocking the event loop.
+        Processes are offloaded to `executor` (the event loop default executor if `None`) and yielded as `(pid, Result)` as soon as each one finishes.
+        `Study().results` is filled as results arrive.
+
+        Cancelling the consuming task, or closing the iterator early, cancels every process that has not started yet
+        and stops the processes that are already running at their next stage. `progress` and `cancel` behave as in
+        `Study().run()`; the callback is called from the executor threads, not the event loop.
+
+        Args:
+            executor (concurrent.futures.Executor, optional): Executor used to run each process.
+            progress (Callable[[dict], None], optional): Progress callback, see `Study().run()`. Defaults to None.
+            cancel (flippr.CancellationToken, optional): Token to stop the run cooperatively. Defaults to None.
+
+        Examples:
+            Stream results from an asyncio service
+            >>> async for pid, result in study.arun():
+            ...     await publish(pid, result.cut_site)
+
+        """
+
+        loop = asyncio.get_running_loop()
+
+        self.results = dict()
+
+        # Set when the consumer stops iterating, so running processes do not outlive the iterator
+        stop = CancellationToken()
+
+        futures = {
+            loop.run_in_executor(executor, proc.run, _progress._Monitor(pid, progress, [cancel, stop])): pid
+            for pid, proc in self.processes.items()
+        }
+        pending = set(futures)
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                for future in done:
+                    pid = futures[future]
+                    try:
+                        self.results[pid] = future.result()
+                    except asyncio.CancelledError as e:
+                        # asyncio converts the `CancelledError` of a cancelled token, raise it as `Study().run()` does
+                        raise CancelledError(*e.args) from None
+
+                    yield pid, self.results[pid]
+
+        finally:
+            stop.cancel()
+            for future in pending:
+                future.cancel()
+            for future in futures:
+                # Only the first error is raised, the others completed in the same wait are marked retrieved
+                if future.done() and not future.cancelled():
+                    future.exception()
@@ -2,11 +2,11 @@ import numpy as np
 import polars as pl
 import scipy as sp
 
-from .functions import _log2, _neg_log10
-from .parameters import _FLIPPR_COMBINE_KEY
+from .functions import _log2, _neg_log10, _format_cut_sites
+from .parameters import _FLIPPR_COMBINE_KEY, _FLIPPR_CUT_SITE_FORMAT_COLUMNS
 
 COMB_NAME_COLUMN = {
-    "CUT SITE": "Cut Site ID",
+    "CUT SITE": "Cut Site Key",
     "PEPTIDE": "Peptide Sequence",
     "MODIFIED PEPTIDE": "Modified Sequence",
 }
@@ -37,12 +37,8 @@ def combine_by(df: pl.DataFrame, by: str, fc: str) -> pl.DataFrame:
             .otherwise([0.0])
             .alias(fc)
         ).with_columns(
-            pl.col("P-value")
-            .map_elements(lambda x: sp.stats.combine_pvalues(x)[1], return_dtype=pl.Float64)
-            .alias("P-value"),
-            pl.col("Adj. P-value")
-            .map_elements(lambda x: sp.stats.combine_pvalues(x)[1], return_dtype=pl.Float64)
-            .alias("Adj. P-value"),
+            _fisher_pvalue("P-value"),
+            _fisher_pvalue("Adj. P-value"),
             pl.col("CV").list.max()
             .alias("CV"),
             pl.col(fc).list.median()
@@ -54,9 +50,36 @@ def combine_by(df: pl.DataFrame, by: str, fc: str) -> pl.DataFrame:
     combined = _neg_log10(combined, "P-value")
     combined = _neg_log10(combined, "Adj. P-value")
 
+    if by == "CUT SITE":
+        # Strings are only built once per cut site, after grouping on the integer key
+        combined = _format_cut_sites(combined).select(
+            "Protein ID",
+            "Cut Site ID",
+            "Cut Site",
+            pl.exclude(["Protein ID", "Cut Site ID", "Cut Site", "Cut Site Key"] + _FLIPPR_CUT_SITE_FORMAT_COLUMNS),
+        )
+
     return combined
 
 
+def _fisher_pvalue(col: str) -> pl.Expr:
+    """
+    Fisher's method, as in `scipy.stats.combine_pvalues()`, applied to every list of `col` at once.
+
+    """
+
+    return pl.struct(
+        (-2 * pl.col(col).list.eval(pl.element().log()).list.sum()).alias("stat"),
+        pl.col(col).list.len().alias("n"),
+    ).map_batches(
+        lambda x: pl.Series(
+            sp.special.chdtrc(2 * x.struct.field("n").to_numpy(), x.struct.field("stat").to_numpy()),
+            dtype=pl.Float64,
+        ),
+        return_dtype=pl.Float64,
+    ).alias(col)
+
+
 def summary_by(df: pl.DataFrame, by: str, fc: str, rcParams: dict) -> pl.DataFrame:
 
     prot_fc_sig = rcParams.get("protein.fc_sig_thresh", 1.0)
@@ -88,3 +111,111 @@ def summary_by(df: pl.DataFrame, by: str, fc: str, rcParams: dict) -> pl.DataFra
     )
 
     return val.join(sig, on="Protein ID").join(sigsig, on="Protein ID")
+
+
+def _residue_profile(df: pl.DataFrame, fc: str) -> pl.DataFrame:
+    """
+    Per residue profiles of every protein from the `Start`/`End` intervals of its ions.
+    Residues are expanded with `int_ranges` and aggregated in one grouped pass, then packed as one list per protein where
+    position `i` holds residue `i + 1`. Residues not covered by any ion are null (`No. of Ions` is `0`).
+
+    """
+
+    log2 = f"Log2 {fc}"
+    values = [f"Max Abs {log2}", "Min P-value", "Min Adj. P-value"]
+
+    residues = (
+        df.select(
+            "Protein ID",
+            "Start",
+            "End",
+            pl.col(log2).abs().alias(f"Max Abs {log2}"),
+            pl.col("P-value").alias("Min P-value"),
+            pl.col("Adj. P-value").alias("Min Adj. P-value"),
+        )
+        .drop_nulls(["Start", "End"])
+        .with_columns(pl.int_ranges("Start", pl.col("End") + 1).alias("Residue"))
+        .explode("Residue")
+        .group_by(["Protein ID", "Residue"])
+        .agg(
+            pl.col(f"Max Abs {log2}").max(),
+            pl.col("Min P-value").min(),
+            pl.col("Min Adj. P-value").min(),
+            pl.len().alias("No. of Ions"),
+        )
+    )
+
+    # Dense residue grid up to the last covered residue of each protein
+    grid = (
+        residues.group_by("Protein ID")
+        .agg(pl.col("Residue").max().alias("Length"))
+        .with_columns(pl.int_ranges(1, pl.col("Length") + 1).alias("Residue"))
+        .explode("Residue")
+    )
+
+    return (
+        grid.join(residues, on=["Protein ID", "Residue"], how="left")
+        .sort(["Protein ID", "Residue"])
+        .group_by("Protein ID", maintain_order=True)
+        .agg(
+            pl.col("Length").first(),
+            pl.col(values),
+            pl.col("No. of Ions").fill_null(0),
+        )
+    )
+
+
+def _volcano(df: pl.DataFrame, x: str, pvalue: str, nx: int, ny: int, rcParams: dict) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Bin `x` against `-Log10 {pvalue}` into an `nx` by `ny` grid and select the significant rows of `df`, in one pass over `df`.
+    Infinite `-Log10` values (P-values of zero) fall in the top bin, rows with missing coordinates are not binned.
+
+    """
+
+    prot_fc_sig = rcParams.get("protein.fc_sig_thresh", 1.0)
+    prot_pv_sig = rcParams.get("protein.pval_sig_thresh", 0.01)
+    prot_apv_sig = rcParams.get("protein.adj_pval_sig_thresh", 0.05)
+
+    y = f"-Log10 {pvalue}"
+    thresh = prot_pv_sig if pvalue == "P-value" else prot_apv_sig
+
+    bounds = df.select(
+        pl.col(x).filter(pl.col(x).is_finite()).min().alias("x_min"),
+        pl.col(x).filter(pl.col(x).is_finite()).max().alias("x_max"),
+        pl.col(y).filter(pl.col(y).is_finite()).max().alias("y_max"),
+    ).row(0)
+
+    x_min, x_max = (bounds[0], bounds[1]) if bounds[0] is not None else (0.0, 0.0)
+    y_min, y_max = 0.0, bounds[2] if bounds[2] is not None else 0.0
+    # empty ranges still get one bin of unit width
+    dx = (x_max - x_min) / nx if x_max > x_min else 1.0 / nx
+    dy = (y_max - y_min) / ny if y_max > y_min else 1.0 / ny
+
+    def __bin(col: str, low: float, width: float, n: int) -> pl.Expr:
+        return ((pl.col(col) - low) / width).floor().clip(0, n - 1).cast(pl.Int64)
+
+    binned = df.filter(
+        pl.col(x).is_not_null() & pl.col(x).is_not_nan() & pl.col(y).is_not_null() & pl.col(y).is_not_nan()
+    ).select(
+        __bin(x, x_min, dx, nx).alias("x_bin"),
+        __bin(y, y_min, dy, ny).alias("y_bin"),
+    )
+
+    grid = (
+        binned.group_by(["x_bin", "y_bin"])
+        .len("Count")
+        .sort(["x_bin", "y_bin"])
+        .select(
+            (x_min + pl.col("x_bin") * dx).alias(f"{x} Low"),
+            (x_min + (pl.col("x_bin") + 1) * dx).alias(f"{x} High"),
+            (y_min + pl.col("y_bin") * dy).alias(f"{y} Low"),
+            (y_min + (pl.col("y_bin") + 1) * dy).alias(f"{y} High"),
+            pl.col("Count"),
+        )
+    )
+
+    points = df.filter(
+        pl.col(x).abs().ge(prot_fc_sig) & pl.col(pvalue).le(thresh)
+    )
+
+    return grid, points
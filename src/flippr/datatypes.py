@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import weakref
+
+import numpy as np
 import polars as pl
 from pathlib import Path
-from typing import Optional, Any, cast
+from typing import Callable, Optional, Any, cast
 from functools import cached_property
 
 from . import combine as _combine
+from . import dose as _dose
 from . import functions as _functions
+from . import index as _index
+from . import parallel as _parallel
+from . import progress as _progress
+from . import qc as _qc
 from . import validate as _validate
 from . import reader as _reader
+from . import store as _store
 from .parameters import (
     _FLIPPR_ION_COLUMNS,
     _FLIPPR_PROTEIN_COLUMNS,
@@ -33,12 +42,14 @@ class Process:
         trp_ctrl: Optional[str] = None,
         trp_test: Optional[str] = None,
         trp_n_rep: Optional[replicate] = None,
+        store: Optional[_store.ResultStore] = None,
     ) -> None:
         """docstring"""
 
         self._rcParams: dict[str, Any] = rcParams
         self._method: str = method
         self._pid: str = pid
+        self._store: Optional[_store.ResultStore] = store
 
         self._lip_path: Path = lip_path
         self._lip_ctrl_name: str = lip_ctrl
@@ -79,8 +90,25 @@ class Process:
                 self._trp_test_n_rep
             ) = self._create_replicate_variables(trp_ctrl,  trp_test, trp_n_rep)
 
-    def run(self):
-        return Result(self)
+        _validate._validate_process_columns(
+            self._lip_path,
+            self._trp_path,
+            self._method,
+            self._ion_columns,
+            ["Protein ID"] + self._ctrl_trp_int_cols + self._test_trp_int_cols if self._is_trp_norm else None,
+        )
+
+    def run(self, monitor: Optional[_progress._Monitor] = None) -> Result:
+        monitor = monitor if monitor is not None else _progress._Monitor(self._pid)
+
+        monitor.check()
+        monitor.event("process_started")
+
+        result = Result(self, monitor)
+
+        monitor.event("process_finished", rows=result._ion.height)
+
+        return result
     
     def _create_replicate_variables(self, ctrl: str, test: str, rep: replicate) -> tuple[list[str], list[str], int, int]:
         ctrl_rep_list: list[str]
@@ -164,14 +192,24 @@ class Process:
 class Result:
     """Organizes a FLiPPR Result"""
 
-    def __init__(self, cls: Process,) -> None:
+    _DERIVED_TABLES: list[str] = ["modified_peptide", "peptide", "cut_site", "protein_summary", "residue_profile"]
+
+    def __init__(self, cls: Process, monitor: Optional[_progress._Monitor] = None) -> None:
         """doctstring"""
 
+        monitor = monitor if monitor is not None else _progress._Monitor(cls._pid)
+
         self._fc: str = "FC"
         self._rcParams: dict[str, Any] = cls._rcParams
+        self._pid: str = cls._pid
+
+        # Tables live in the (study-wide) store, entries are released with the `Result`
+        self._store: _store.ResultStore = cls._store if cls._store is not None else _store.ResultStore(cls._rcParams)
+        self._namespace: str = self._store._namespace(cls._pid)
+        weakref.finalize(self, self._store._discard_namespace, self._namespace)
+        self._indices: dict[str, _index._ProteinIndex] = {}
         
         self.trp_args: Optional[dict[str, Any]] = None
-        self._trp_norm: Optional[pl.DataFrame] = None
 
         self.args: dict[str, Any] = {
             "ctrl_name":    cls._lip_ctrl_name, 
@@ -183,13 +221,37 @@ class Result:
             "rcParams":     cls._rcParams
         }
         
-        self._ion = _reader._read_ion(cls._lip_path, cls._method)
-        self._ion = self._ion.select(cls._ion_columns)
-        self._ion = self.run(self._ion, self.args)
-        self._ion = self.clean_up(self._ion, self.args)
+        ion = monitor.stage(
+            "ion", "read", lambda: _read_ions(self._store, cls._lip_path, cls._method, cls._ion_columns, self._rcParams, self.args)
+        )
+
+        n_shards = self._rcParams.get("run.n_shards", 1)
+        if n_shards > 1:
+            # The moderated T-test prior borrows variances across proteins, it is fitted once on the whole table
+            shard_args = {**self.args, "moderated_prior": _functions._moderated_prior(ion, **self.args)}
+
+            # Ion stats are independent and the FDR is per protein, so shards are split on `Protein ID`
+            ion = monitor.stage("ion", "shards", lambda: _parallel._map_shards(
+                ion,
+                "Protein ID",
+                _run_shard,
+                n_shards,
+                self._rcParams.get("run.n_workers", None),
+                self._rcParams.get("run.shared_dir", None),
+                monitor,
+                args=shard_args,
+                fc=self._fc,
+            ))
+            ion = ion.sort(by=["Protein ID", "P-value"], maintain_order=True)
+            # Protein indices in `Cut Site Key` are local to each shard
+            ion = _functions._add_cut_sites(ion)
+        else:
+            ion = self.run(ion, self.args, monitor)
+            ion = monitor.stage("ion", "clean_up", lambda: self.clean_up(ion, self.args))
 
         if cls._is_trp_norm:
             assert cls._trp_path is not None
+            trp_path = cls._trp_path
 
             self.trp_args = {
                 "ctrl_name":    cls._trp_ctrl_name,
@@ -201,35 +263,49 @@ class Result:
                 "rcParams":     cls._rcParams
             }
 
-            self._trp_norm = _reader._read_trp(cls._trp_path, cls._method)
-            self._trp_norm = self.run(self._trp_norm, self.trp_args)
-            self._ion = _functions._normalize_ratios(self._ion, self._trp_norm, cls._rcParams)
+            trp_norm = monitor.stage("trp", "read", lambda: _read_raw(self._store, "trp", trp_path, cls._method, self._rcParams))
+            trp_norm = self.run(trp_norm, self.trp_args, monitor, "trp")
             self._fc = "Normalized FC" # Generated after running `._normalize_ratios()`
-            self._ion = _functions._log2(self._ion, self._fc)
-            
+            ion = monitor.stage(
+                "ion", "normalize", lambda: _functions._log2(_functions._normalize_ratios(ion, trp_norm, cls._rcParams), self._fc)
+            )
 
+            self._trp_norm = trp_norm
 
-    def run(self, df: pl.DataFrame, args: dict) -> pl.DataFrame:
-        # Can be performed on ion, mod_pep, pep, or protein
-        df = _functions._cull_intensities(df, **args)
-        df = _functions._add_alt_hypothesis(df, **args)
-        df = _functions._impute_aon_intensities(df, **args)
-        df = _functions._add_ttest(df, **args)
-        df = _functions._add_fdr(df, **args)
-        df = _functions._add_ratio(df, **args)
-        df = _functions._log2(df, self._fc)
-        df = _functions._neg_log10(df, "P-value")
-        df = _functions._neg_log10(df, "Adj. P-value")
+        self._ion = ion
 
-        return df
+    @property
+    def _ion(self) -> pl.DataFrame:
+        return self._store.get((self._namespace, "ion"))
+
+    @_ion.setter
+    def _ion(self, ion: pl.DataFrame) -> None:
+        # Ions cannot be recomputed (AON imputation is random), so they are spilled when evicted
+        self._store.put((self._namespace, "ion"), ion, spill=True)
+
+        for table in self._DERIVED_TABLES:
+            self._store.discard((self._namespace, table))
+
+        self._indices = {}
+
+    @property
+    def _trp_norm(self) -> Optional[pl.DataFrame]:
+        return self._store.get_optional((self._namespace, "trp_norm"))
+
+    @_trp_norm.setter
+    def _trp_norm(self, trp_norm: Optional[pl.DataFrame]) -> None:
+        if trp_norm is None:
+            self._store.discard((self._namespace, "trp_norm"))
+        else:
+            self._store.put((self._namespace, "trp_norm"), trp_norm, spill=True)
+
+    def run(self, df: pl.DataFrame, args: dict, monitor: Optional[_progress._Monitor] = None, table: str = "ion") -> pl.DataFrame:
+        # Can be performed on ion, mod_pep, pep, or protein
+        return _run(df, args, self._fc, monitor, table)
 
     def clean_up(self, df: pl.DataFrame, args: dict) -> pl.DataFrame:
         # Only meant to be performed on the lip ions
-        df = _functions._add_start_end_aa(df, **args)
-        df = _functions._add_half_trpytic(df, **args)
-        df = _functions._add_cut_sites(df, **args)
-
-        return df
+        return _clean_up(df, args)
 
     
     @property
@@ -245,34 +321,196 @@ class Result:
         """
             ion dataframe
         """
-        return self._ion
+        # `Cut Site` strings are built on access instead of being held next to the ions
+        return _format_ions(self._ion)
     
     @ion.setter
     def ion(self, ion: pl.DataFrame) -> None:
         """
             ion setter
         """
-        self._ion = ion
+        # Public ions carry the `Cut Site` strings, the packed key used for grouping is rebuilt from the ions
+        self._ion = _functions._add_cut_sites(ion.drop(["Cut Site Key", "Cut Site", "Cut Site ID"], strict=False))
     
     @property
     def trp_protein(self) -> pl.DataFrame | None:
         return self._trp_norm
 
-    @cached_property
+    @property
     def modified_peptide(self) -> pl.DataFrame:
-        return _combine.combine_by(self.ion, by="MODIFIED PEPTIDE", fc=self._fc)
+        return self._store.get(
+            (self._namespace, "modified_peptide"),
+            lambda: _combine.combine_by(self._ion, by="MODIFIED PEPTIDE", fc=self._fc)
+        )
 
-    @cached_property
+    @property
     def peptide(self) -> pl.DataFrame:
-        return _combine.combine_by(self.ion, by="PEPTIDE", fc=self._fc)
+        return self._store.get(
+            (self._namespace, "peptide"),
+            lambda: _combine.combine_by(self._ion, by="PEPTIDE", fc=self._fc)
+        )
 
-    @cached_property
+    @property
     def cut_site(self) -> pl.DataFrame:
-        return _combine.combine_by(self.ion, by="CUT SITE", fc=self._fc)
+        return self._store.get(
+            (self._namespace, "cut_site"),
+            lambda: _combine.combine_by(self._ion, by="CUT SITE", fc=self._fc)
+        )
 
-    @cached_property
+    @property
     def protein_summary(self) -> pl.DataFrame:
-        self._proteins = self.ion.group_by("Protein ID", maintain_order=True).agg(
+        return self._store.get((self._namespace, "protein_summary"), self._protein_summary)
+
+    def residue_profile(self, path: Optional[str | Path] = None) -> pl.DataFrame:
+        """
+            Per residue significance profiles of every protein, built from the `Start`/`End` intervals of the ions.
+            One row per protein with list columns indexed by residue (position `i` is residue `i + 1`, up to the last covered residue `Length`):
+            the maximum absolute log2 fold change, the minimum P-value and adjusted P-value of the ions covering each residue, and `No. of Ions`.
+
+            Args:
+                path (str | Path, optional): Also write the profiles to this parquet file.
+
+            Examples:
+                Profiles for structure mapping
+                >>> result.residue_profile("residue_profile.parquet")
+        """
+
+        profile = self._store.get(
+            (self._namespace, "residue_profile"),
+            lambda: _combine._residue_profile(self._ion, self._fc)
+        )
+
+        if path is not None:
+            profile.write_parquet(path)
+
+        return profile
+
+    def query(
+        self,
+        level: str = "ion",
+        protein: Optional[str | list[str]] = None,
+        top: Optional[int] = None,
+        by: Optional[str] = None,
+        descending: bool = False,
+    ) -> pl.DataFrame:
+        """
+            Select the rows of a result table by `Protein ID` and/or the `top` rows ranked on the `by` column.
+            Tables are indexed on `Protein ID` on first use and rank orders are kept per column,
+            so repeated lookups and top-k selections do not scan or sort the table.
+
+            Args:
+                level (str): `ion`, `modified peptide`, `peptide`, `cut site` or `protein`. Defaults to `ion`.
+                protein (str | list[str], optional): Protein ID(s) to select.
+                top (int, optional): Number of rows to return, ranked on `by`.
+                by (str, optional): Column used to rank rows for `top`. Defaults to `P-value`, required at the `protein` level.
+                descending (bool): Rank from the largest value of `by`. Defaults to `False`.
+
+            Examples:
+                All cut sites of a protein
+                >>> result.query("cut site", protein="P0A6F5")
+
+                Top 100 cut sites by significance
+                >>> result.query("cut site", top=100)
+        """
+
+        level, df = self._level_table(level, ["ION", "MODIFIED PEPTIDE", "PEPTIDE", "CUT SITE", "PROTEIN"])
+
+        if level not in self._indices:
+            self._indices[level] = _index._ProteinIndex(df)
+        index = self._indices[level]
+
+        if protein is not None:
+            df = index.lookup(df, [protein] if isinstance(protein, str) else protein)
+
+        if top is not None:
+            if by is None:
+                if level == "PROTEIN":
+                    raise ValueError(
+                        '`by` is required with `top` at the "protein" level, which has no P-value. '
+                        'Set `by` to a column of the protein summary, e.g. "No. of Significant Cut Sites (Adj. P-value)" with `descending=True`.'
+                    )
+                by = "P-value"
+
+            if by not in df.columns:
+                raise ValueError(f'`by` was provided: "{by}". "{by}" is not a column of the {level.lower()} table.')
+
+            if protein is None:
+                df = index.top(df, top, by, descending)
+            else:
+                df = (
+                    df.top_k(top, by=by) if descending else df.bottom_k(top, by=by)
+                ).sort(by, descending=descending, nulls_last=True)
+
+        if level == "ION":
+            df = _format_ions(df)
+
+        return df
+
+    def volcano(
+        self,
+        level: str = "cut site",
+        bins: int | tuple[int, int] = (100, 100),
+        pvalue: str = "P-value",
+    ) -> tuple[pl.DataFrame, pl.DataFrame]:
+        """
+            Volcano plot data for very large results: a 2-D density grid of every row, plus the rows above the significance thresholds.
+            The grid bins `Log2 FC` (x) against `-Log10 P-value` or `-Log10 Adj. P-value` (y) and only non-empty bins are returned,
+            with their edges and `Count`. Rows are significant with the `protein.fc_sig_thresh` and `protein.pval_sig_thresh`
+            (or `protein.adj_pval_sig_thresh`) rcParams, as in `protein_summary`.
+
+            Args:
+                level (str): `ion`, `modified peptide`, `peptide` or `cut site`. Defaults to `cut site`.
+                bins (int | tuple[int, int]): Number of bins along x and y. Defaults to `(100, 100)`.
+                pvalue (str): `P-value` or `Adj. P-value`. Defaults to `P-value`.
+
+            Examples:
+                >>> grid, points = result.volcano("ion", bins=200)
+        """
+
+        level, df = self._level_table(level, ["ION", "MODIFIED PEPTIDE", "PEPTIDE", "CUT SITE"])
+
+        if pvalue not in ["P-value", "Adj. P-value"]:
+            raise ValueError(f'`pvalue` was provided: "{pvalue}". "{pvalue}" is not recognized. Set `pvalue` to "P-value" or "Adj. P-value".')
+
+        nx, ny = (bins, bins) if isinstance(bins, int) else bins
+        if nx < 1 or ny < 1:
+            raise ValueError(f'`bins` was provided: "{bins}". Set `bins` to positive integers.')
+
+        grid, points = _combine._volcano(df, f"Log2 {self._fc}", pvalue, nx, ny, self._rcParams)
+
+        if level == "ION":
+            points = _format_ions(points)
+
+        return grid, points
+
+    def _level_table(self, level: str, levels: list[str]) -> tuple[str, pl.DataFrame]:
+        name = level
+        level = level.upper()
+        tables = {
+            "ION": lambda: self._ion, # formatted by the callers on the rows they return
+            "MODIFIED PEPTIDE": lambda: self.modified_peptide,
+            "PEPTIDE": lambda: self.peptide,
+            "CUT SITE": lambda: self.cut_site,
+            "PROTEIN": lambda: self.protein_summary,
+        }
+
+        if level not in levels:
+            raise ValueError(
+                f'`level` was provided: "{name}". "{name}" is not recognized. Set `level` to one of: '
+                + ", ".join([f'"{name.lower()}"' for name in levels])
+            )
+
+        return level, tables[level]()
+
+    @property
+    def memory_usage(self) -> pl.DataFrame:
+        """
+            Size in bytes of the tables held in memory by this result, tables spilled to disk or evicted report `0`.
+        """
+        return self._store._usage(self._namespace).drop("Namespace")
+
+    def _protein_summary(self) -> pl.DataFrame:
+        proteins = self._ion.group_by("Protein ID", maintain_order=True).agg(
             pl.col(_FLIPPR_PROTEIN_SUMMARY_COLUMNS).first()
         )
 
@@ -282,11 +520,242 @@ class Result:
 
         __cut = _combine.summary_by(self.cut_site, by="Cut Sites", fc=self._fc, rcParams=self._rcParams)
 
-        self._proteins = (
-            self._proteins
+        proteins = (
+            proteins
             .join(__mod, on="Protein ID")
             .join(__pep, on="Protein ID")
             .join(__cut, on="Protein ID")
         )
 
-        return self._proteins
+        return proteins
+
+
+class DoseResponse:
+    """Organizes a FLiPPR dose-response fit across LiP conditions"""
+
+    def __init__(
+        self,
+        rcParams: dict[str, Any],
+        lip_path: Path,
+        method: str,
+        ctrl: str,
+        doses: dict[str, float],
+        n_rep: int,
+        model: str = "sigmoid",
+        store: Optional[_store.ResultStore] = None,
+    ) -> None:
+        """docstring"""
+
+        self.min_doses: int = _validate._validate_dose_response(doses, n_rep, model, rcParams.get("dose.min_doses"))
+        _validate._validate_replicate(n_rep)
+
+        self._rcParams: dict[str, Any] = rcParams
+        self.model: str = model
+        self.ctrl_name: str = ctrl
+        self.doses: dict[str, float] = dict(doses)
+
+        self._ctrl_ints: list[str] = [f"{ctrl}_{i+1} Intensity" for i in range(n_rep)]
+        self._dose_ints: dict[str, list[str]] = {
+            dose: [f"{dose}_{i+1} Intensity" for i in range(n_rep)] for dose in doses
+        }
+        self._fc_cols: list[str] = [f"Log2 FC {dose}" for dose in doses]
+
+        ion_columns = _FLIPPR_ION_COLUMNS + self._ctrl_ints + [col for ints in self._dose_ints.values() for col in ints]
+        _validate._validate_process_columns(lip_path, None, method, ion_columns, None)
+
+        self.args: dict[str, Any] = {
+            "ctrl_ints":    self._ctrl_ints,
+            "dose_ints":    self._dose_ints,
+            "rcParams":     rcParams
+        }
+
+        self._ion = _read_ions(store if store is not None else _store.ResultStore(rcParams), lip_path, method, ion_columns, rcParams)
+        self._ion = _dose._add_dose_fc(self._ion, **self.args)
+        self._ion = _clean_up(self._ion, self.args)
+        self._ion = self._ion.drop(ion_columns[len(_FLIPPR_ION_COLUMNS):])
+
+    def _fit(self, df: pl.DataFrame) -> pl.DataFrame:
+        return _dose._add_dose_fit(
+            df,
+            self._fc_cols,
+            list(self.doses.values()),
+            self.model,
+            self.min_doses,
+        )
+
+    @cached_property
+    def ion(self) -> pl.DataFrame:
+        return self._fit(_format_ions(self._ion))
+
+    @cached_property
+    def modified_peptide(self) -> pl.DataFrame:
+        return self._fit(_dose._combine_dose_fc(self._ion, "MODIFIED PEPTIDE", self._fc_cols))
+
+    @cached_property
+    def peptide(self) -> pl.DataFrame:
+        return self._fit(_dose._combine_dose_fc(self._ion, "PEPTIDE", self._fc_cols))
+
+    @cached_property
+    def cut_site(self) -> pl.DataFrame:
+        return self._fit(_dose._combine_dose_fc(self._ion, "CUT SITE", self._fc_cols))
+
+
+class QualityControl:
+    """Organizes replicate quality control of a FragPipe output"""
+
+    def __init__(self, df: pl.DataFrame, samples: dict[str, str], conditions: dict[str, str]) -> None:
+        """docstring"""
+
+        self._samples: dict[str, str] = samples
+        self._conditions: dict[str, str] = conditions
+        self._df: pl.DataFrame = df.select(samples.values())
+
+    @cached_property
+    def correlation(self) -> pl.DataFrame:
+        """
+            Pairwise Pearson correlation matrix of the log2 intensities between samples.
+        """
+        return _qc._sample_correlation(self._df, self._samples)
+
+    @cached_property
+    def missingness(self) -> pl.DataFrame:
+        """
+            Number and fraction of missing intensities per sample.
+        """
+        return _qc._sample_missingness(self._df, self._samples, self._conditions)
+
+    @cached_property
+    def cv(self) -> pl.DataFrame:
+        """
+            Distribution of the replicate coefficients of variation per condition.
+        """
+        return _qc._condition_cv(self._df, self._samples, self._conditions)
+
+    @cached_property
+    def intensity(self) -> pl.DataFrame:
+        """
+            Distribution of the log2 intensities per sample.
+        """
+        return _qc._sample_intensity(self._df, self._samples, self._conditions)
+
+
+def _read_raw(store: _store.ResultStore, kind: str, path: Path, method: str, rcParams: dict[str, Any]) -> pl.DataFrame:
+    # Parsed FragPipe tables are shared by every process and QC of a study through its store
+    intensity_dtype = rcParams.get("data.intensity_dtype", "float64")
+    layout = rcParams.get("data.ion_layout", "dense")
+
+    if layout not in ["dense", "sparse"]:
+        raise ValueError(
+            f'`data.ion_layout` was provided: "{layout}". "{layout}" is not recognized. Set `data.ion_layout` to "dense" or "sparse".'
+        )
+
+    match kind:
+        case "ion":
+            read = _reader._read_ion_sparse if layout == "sparse" else _reader._read_ion
+            kind = f"{kind}:{layout}"
+        case "trp":
+            read = _reader._read_trp
+        case _:
+            raise ValueError("Input error.")
+
+    return store.get(
+        ("__raw__", f"{kind}:{method}:{intensity_dtype}:{path}"),
+        lambda: read(path, method, intensity_dtype)
+    )
+
+
+def _read_ions(store: _store.ResultStore,
+               path: Path,
+               method: str,
+               columns: Optional[list[str]],
+               rcParams: dict[str, Any],
+               args: Optional[dict[str, Any]] = None,
+) -> pl.DataFrame:
+    """
+    Dense ion table of `columns` (every column if `None`).
+    With the process `args`, the zero counts (`{name} ZC`) are popcounts of the `Presence` bitmask parsed once per study and
+    the zero count cull is applied before the columns are selected, or densified with `data.ion_layout` "sparse".
+
+    """
+
+    ion = _read_raw(store, "ion", path, method, rcParams)
+    sparse = rcParams.get("data.ion_layout", "dense") == "sparse"
+
+    if args is None:
+        if sparse:
+            return _reader._densify(ion, columns)
+
+        return ion if columns is None else ion.select(columns)
+
+    samples = _reader._presence_samples(ion)
+    ctrl_zc, test_zc = f"{args['ctrl_name']} ZC", f"{args['test_name']} ZC"
+
+    zero_count = [
+        _reader._presence_zero_count(samples, args["ctrl_ints"], args["ctrl_n_rep"]).alias(ctrl_zc),
+        _reader._presence_zero_count(samples, args["test_ints"], args["test_n_rep"]).alias(test_zc),
+    ]
+    keep = _functions._cull_expr(
+        pl.col(ctrl_zc),
+        pl.col(test_zc),
+        args["ctrl_n_rep"],
+        args["test_n_rep"],
+        args["rcParams"].get("ion.missing_intensity_thresh", 1),
+    )
+
+    columns = (columns if columns is not None else [col for col in ion.columns if col != "Intensities"]) + [ctrl_zc, test_zc]
+
+    if sparse:
+        return _reader._densify(ion.with_columns(zero_count).filter(keep), columns)
+
+    return ion.select([pl.col(col) for col in columns if col not in (ctrl_zc, test_zc)] + zero_count).filter(keep).select(columns)
+
+
+# Pipeline stages of `_run()` in order, `fn(df, args, fc)`, reported by name to the progress callback of `Study().run()`
+_RUN_STAGES: list[tuple[str, Callable[[pl.DataFrame, dict, str], pl.DataFrame]]] = [
+    ("cull",            lambda df, args, fc: _functions._cull_intensities(df, **args)),
+    ("alt_hypothesis",  lambda df, args, fc: _functions._add_alt_hypothesis(df, **args)),
+    ("impute",          lambda df, args, fc: _functions._impute_aon_intensities(df, **args)),
+    ("ttest",           lambda df, args, fc: _functions._add_ttest(df, **args)),
+    ("pool_aon",        lambda df, args, fc: _functions._pool_aon_imputations(df, **args)),
+    ("fdr",             lambda df, args, fc: _functions._add_fdr(df, **args)),
+    ("ratio",           lambda df, args, fc: _functions._log2(_functions._add_ratio(df, **args), fc)),
+    ("log10",           lambda df, args, fc: _functions._neg_log10(_functions._neg_log10(df, "P-value"), "Adj. P-value")),
+]
+
+
+def _run(df: pl.DataFrame,
+         args: dict,
+         fc: str,
+         monitor: Optional[_progress._Monitor] = None,
+         table: str = "ion",
+) -> pl.DataFrame:
+    # Cancellation is checked between stages
+    monitor = monitor if monitor is not None else _progress._Monitor()
+
+    for stage, fn in _RUN_STAGES:
+        df = monitor.stage(table, stage, lambda: fn(df, args, fc))
+
+    return df
+
+
+def _format_ions(df: pl.DataFrame) -> pl.DataFrame:
+    # Public ion tables carry the `Cut Site` strings, the packed `Cut Site Key` is internal
+    return _functions._format_cut_sites(df).drop("Cut Site Key")
+
+
+def _clean_up(df: pl.DataFrame, args: dict) -> pl.DataFrame:
+    df = _functions._add_start_end_aa(df, **args)
+    df = _functions._add_half_trpytic(df, **args)
+    df = _functions._add_cut_sites(df, **args)
+
+    return df
+
+
+def _run_shard(df: pl.DataFrame, args: dict, fc: str, seed: int) -> pl.DataFrame:
+    # Executed in a worker process by `parallel._map_shards()`
+    np.random.seed(seed)
+
+    df = _run(df, args, fc)
+    df = _clean_up(df, args)
+
+    return df
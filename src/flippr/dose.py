@@ -0,0 +1,201 @@
+import numpy as np
+import polars as pl
+import scipy as sp
+
+from .combine import COMB_NAME_COLUMN
+from .functions import _add_fdr, _format_cut_sites
+from .parameters import _FLIPPR_COMBINE_KEY, _FLIPPR_CUT_SITE_FORMAT_COLUMNS
+
+# Rows fitted per batch, bounds the (rows x candidate curves) work arrays
+_CHUNK_SIZE = 8192
+
+
+def _add_dose_fc(df: pl.DataFrame,
+                 ctrl_ints: list[str],
+                 dose_ints: dict[str, list[str]],
+                 rcParams: dict,
+                 **kwargs
+) -> pl.DataFrame:
+    """
+    Add the `Log2 FC {dose}` of every dose condition against the control for each ion.
+    Conditions with more than `ion.missing_intensity_thresh` zero-intensity replicates are left null.
+
+    """
+
+    max_missing = rcParams.get("ion.missing_intensity_thresh", 1)
+
+    def __mean(ints: list[str]) -> pl.Expr:
+        # Mean of the non-zero replicates, null if too many are missing
+        values = pl.concat_list(ints).list.eval(pl.element().filter(pl.element().gt(0)))
+        return (
+            pl.when(pl.concat_list(ints).list.count_matches(0).le(max_missing))
+            .then(values.list.mean())
+            .otherwise(pl.lit(None))
+        )
+
+    df = \
+    df.with_columns(
+        __mean(ctrl_ints).alias("__ctrl_mean__")
+    ).filter(# Every curve is relative to the control
+        pl.col("__ctrl_mean__").is_not_null()
+    ).with_columns(
+        (__mean(ints) / pl.col("__ctrl_mean__")).log(base=2).alias(f"Log2 FC {dose}")
+        for dose, ints in dose_ints.items()
+    ).drop("__ctrl_mean__")
+
+    return df
+
+
+def _combine_dose_fc(df: pl.DataFrame, by: str, fc_cols: list[str]) -> pl.DataFrame:
+    """
+    Median `Log2 FC {dose}` of the ions in each modified peptide, peptide or cut site.
+
+    """
+
+    combined = (
+        df.group_by(["Protein ID", COMB_NAME_COLUMN[by]], maintain_order=True).agg(
+            pl.col(_FLIPPR_COMBINE_KEY[by]).first(),
+            pl.col(fc_cols).median(),
+        )
+    )
+
+    if by == "CUT SITE":
+        combined = _format_cut_sites(combined).select(
+            "Protein ID",
+            "Cut Site ID",
+            "Cut Site",
+            pl.exclude(["Protein ID", "Cut Site ID", "Cut Site", "Cut Site Key"] + _FLIPPR_CUT_SITE_FORMAT_COLUMNS),
+        )
+
+    return combined
+
+
+def _add_dose_fit(df: pl.DataFrame, fc_cols: list[str], conc: list[float], model: str, min_doses: int) -> pl.DataFrame:
+    """
+    Fit a dose-response `model` to the `fc_cols` of every row at once and append the fitted parameters.
+    Rows with fewer than `min_doses` quantified doses are kept without a fit, their P-value is null and skipped by the FDR.
+
+    """
+
+    x = np.log10(np.asarray(conc, dtype=np.float64))
+    y = df.select(fc_cols).to_numpy().astype(np.float64)
+
+    w = np.isfinite(y).astype(np.float64)
+    y = np.where(w > 0, y, 0.0)
+    ok = w.sum(axis=1) >= min_doses
+
+    match model:
+        case "sigmoid":
+            params = _fit_sigmoid(x, y, w)
+        case "log-linear":
+            params = _fit_log_linear(x, y, w)
+        case _:
+            raise ValueError(
+                f'`model` was provided: "{model}". "{model}" is not recognized. Set `model` to "sigmoid" or "log-linear".'
+            )
+
+    params = {name: np.where(ok, values, np.nan) for name, values in params.items()}
+
+    df = \
+    df.hstack(
+        [pl.Series(name, values, dtype=pl.Float64, nan_to_null=True) for name, values in params.items()]
+    )
+
+    # Benjamini-Hochberg within each protein as for the pairwise processes
+    df = _add_fdr(df)
+
+    df = df.with_columns(
+        -pl.col("P-value").log10().alias("-Log10 P-value"),
+        -pl.col("Adj. P-value").log10().alias("-Log10 Adj. P-value"),
+    )
+
+    return df
+
+
+def _fit_log_linear(x: np.ndarray, y: np.ndarray, w: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Weighted least squares of `y = Intercept + Slope * log10(dose)` for every row, `w` masks missing points.
+
+    """
+
+    n = w.sum(axis=1)
+    sx = w @ x
+    sxx = w @ x**2
+    sy = (w * y).sum(axis=1)
+    sxy = (w * y) @ x
+    syy = (w * y**2).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sxx_c = sxx - sx**2 / n
+        slope = (sxy - sx * sy / n) / sxx_c
+        intercept = (sy - slope * sx) / n
+
+        sst = syy - sy**2 / n
+        sse = np.maximum(sst - slope**2 * sxx_c, 0.0)
+        r2 = 1 - sse / sst
+
+        dof = n - 2
+        t = slope / np.sqrt(sse / dof / sxx_c)
+        pval = np.where(dof > 0, 2 * sp.stats.t.sf(np.abs(t), np.maximum(dof, 1)), np.nan)
+
+    return {
+        "Intercept": intercept,
+        "Slope": slope,
+        "R2": r2,
+        "P-value": pval,
+    }
+
+
+def _fit_sigmoid(x: np.ndarray, y: np.ndarray, w: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Fit `y = Top / (1 + 10^(Hill * (Log EC50 - log10(dose))))` for every row by variable projection.
+    `Top` is linear given (`Log EC50`, `Hill`), so it is solved in closed form for a grid of candidate curves
+    and the best candidate per row is selected with matrix products, without per-row optimization.
+
+    """
+
+    span = x.max() - x.min()
+    log_ec50 = np.linspace(x.min() - 0.25 * span, x.max() + 0.25 * span, 81)
+    hill = np.array([0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0])
+
+    grid_ec50, grid_hill = (g.ravel() for g in np.meshgrid(log_ec50, hill))
+    g = 1 / (1 + 10 ** (grid_hill[:, None] * (grid_ec50[:, None] - x[None, :]))) # (candidates, doses)
+
+    n = w.sum(axis=1)
+    sy = (w * y).sum(axis=1)
+    syy = (w * y**2).sum(axis=1)
+
+    top = np.empty(y.shape[0])
+    best = np.empty(y.shape[0], dtype=np.int64)
+    sse = np.empty(y.shape[0])
+
+    for i in range(0, y.shape[0], _CHUNK_SIZE):
+        chunk = slice(i, i + _CHUNK_SIZE)
+
+        num = (w[chunk] * y[chunk]) @ g.T
+        den = w[chunk] @ (g**2).T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fit = np.where(den > 0, num**2 / den, 0.0)
+
+        best[chunk] = fit.argmax(axis=1)
+        rows = np.arange(best[chunk].size)
+        top[chunk] = num[rows, best[chunk]] / den[rows, best[chunk]]
+        sse[chunk] = np.maximum(syy[chunk] - fit[rows, best[chunk]], 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sst = syy - sy**2 / n
+        r2 = 1 - sse / sst
+
+        # F-test of the curve (Top, Log EC50, Hill) against no response (Top = 0)
+        dof = n - 3
+        f = ((syy - sse) / 3) / (sse / dof)
+        pval = np.where(dof > 0, sp.stats.f.sf(f, 3, np.maximum(dof, 1)), np.nan)
+
+    return {
+        "Top": top,
+        "Log EC50": grid_ec50[best],
+        "EC50": 10 ** grid_ec50[best],
+        "Hill": grid_hill[best],
+        "R2": r2,
+        "P-value": pval,
+    }
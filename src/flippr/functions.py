@@ -1,7 +1,15 @@
+from typing import Any, Optional
+
 import numpy as np
 import polars as pl
 import scipy as sp
 
+from .parameters import _PROTEASE_RULES
+
+# Bit layout of `Cut Site Key`: [protein index: 22 | site start: 20 | site end: 20 | span: 1]
+_CUT_SITE_PROTEIN_SHIFT = 41
+_CUT_SITE_START_SHIFT = 21
+_CUT_SITE_END_SHIFT = 1
 
 def _cull_intensities(df: pl.DataFrame,
                       ctrl_name: str,
@@ -16,15 +24,16 @@ def _cull_intensities(df: pl.DataFrame,
 
     max_missing = rcParams.get("ion.missing_intensity_thresh", 1)
 
-    df = \
-    df.with_columns(# Count the number of zeros intensity replicates
+    zero_count = [# Count the number of zeros intensity replicates, unless counted from the `Presence` bitmask
         pl.concat_list(ctrl_ints).list.count_matches(0).alias(f"{ctrl_name} ZC"),
         pl.concat_list(test_ints).list.count_matches(0).alias(f"{test_name} ZC"),
+    ]
+
+    df = \
+    df.with_columns(
+        expr for expr in zero_count if expr.meta.output_name() not in df.columns
     ).filter(# Cull based on zero count (ZC)
-          (pl.col(f"{ctrl_name} ZC").le(max_missing) & pl.col(f"{test_name} ZC").eq(0))
-        | (pl.col(f"{ctrl_name} ZC").eq(0)           & pl.col(f"{test_name} ZC").le(max_missing))
-        | (pl.col(f"{ctrl_name} ZC").eq(ctrl_n_rep)  & pl.col(f"{test_name} ZC").eq(0))
-        | (pl.col(f"{ctrl_name} ZC").eq(0)           & pl.col(f"{test_name} ZC").eq(test_n_rep))
+        _cull_expr(pl.col(f"{ctrl_name} ZC"), pl.col(f"{test_name} ZC"), ctrl_n_rep, test_n_rep, max_missing)
     ).with_columns(# Replace zero values remaining with null
         pl.col(ctrl_ints).replace(0.0, None),
         pl.col(test_ints).replace(0.0, None)
@@ -33,6 +42,16 @@ def _cull_intensities(df: pl.DataFrame,
     return df
 
 
+def _cull_expr(ctrl_zc: pl.Expr, test_zc: pl.Expr, ctrl_n_rep: int, test_n_rep: int, max_missing: int) -> pl.Expr:
+    # Rows with at most `max_missing` zeros in one condition and none in the other, or all-or-nothing (AON)
+    return (
+          (ctrl_zc.le(max_missing) & test_zc.eq(0))
+        | (ctrl_zc.eq(0)           & test_zc.le(max_missing))
+        | (ctrl_zc.eq(ctrl_n_rep)  & test_zc.eq(0))
+        | (ctrl_zc.eq(0)           & test_zc.eq(test_n_rep))
+    )
+
+
 def _add_alt_hypothesis(df: pl.DataFrame,
                         ctrl_name: str,
                         test_name: str,
@@ -69,8 +88,10 @@ def _impute_aon_intensities(df: pl.DataFrame,
     # Add imputation variables
     loc = rcParams.get("ion.aon_impute_loc", 1e4)
     scale = rcParams.get("ion.aon_impute_scale", 1e3)
-    ctrl_imp_df = pl.from_numpy(np.random.normal(loc=loc, scale=scale, size=(df.height, ctrl_n_rep)), schema=["CTRL_IMP"])
-    test_imp_df = pl.from_numpy(np.random.normal(loc=loc, scale=scale, size=(df.height, test_n_rep)), schema=["TEST_IMP"])
+    # Draws are stored with the intensity dtype so imputation does not promote `data.intensity_dtype` "float32"
+    dtype = np.float32 if df.schema[ctrl_ints[0]] == pl.Float32 else np.float64
+    ctrl_imp_df = pl.from_numpy(np.random.normal(loc=loc, scale=scale, size=(df.height, ctrl_n_rep)).astype(dtype), schema=["CTRL_IMP"])
+    test_imp_df = pl.from_numpy(np.random.normal(loc=loc, scale=scale, size=(df.height, test_n_rep)).astype(dtype), schema=["TEST_IMP"])
     df = df.hstack(ctrl_imp_df).hstack(test_imp_df)
 
     df = \
@@ -99,9 +120,13 @@ def _impute_aon_intensities(df: pl.DataFrame,
 def _add_ttest(df: pl.DataFrame,
                ctrl_name: str,
                test_name: str,
+               rcParams: dict,
+               moderated_prior: Optional[tuple[float, float]] = None,
                **kwargs
 ) -> pl.DataFrame:
 
+    ttest_type = rcParams.get("ttest.type", "welch")
+
     df = \
     df.with_columns(# Prepare the descriptive stats for `.ttest_ind_from_stats()`
         pl.col(f"{ctrl_name} Intensity").list.mean().alias(f"{ctrl_name} Mean"),
@@ -109,20 +134,22 @@ def _add_ttest(df: pl.DataFrame,
 
         pl.col(f"{test_name} Intensity").list.mean().alias(f"{test_name} Mean"),
         pl.col(f"{test_name} Intensity").list.std().alias(f"{test_name} Std"),
-    ).with_columns(
-        pl.struct(# Create struct with `.ttest_ind_from_stats()` var names
-            mean1=pl.col(f"{ctrl_name} Mean"),
-            std1=pl.col(f"{ctrl_name} Std"),
-            nobs1=pl.col(f"{ctrl_name} Intensity").list.len(),
-            mean2=pl.col(f"{test_name} Mean"),
-            std2=pl.col(f"{test_name} Std"),
-            nobs2=pl.col(f"{test_name} Intensity").list.len(),
-            alternative=pl.col("Alternative Hypothesis")
-        ).map_elements(# Perform T-test
-            lambda x: list(sp.stats.ttest_ind_from_stats(**x, equal_var=False)),
-            return_dtype=pl.List(pl.Float64)
-        ).alias("Stats")
-    ).with_columns(# Seperate out T-test vars
+    )
+
+    match ttest_type:
+        case "welch":
+            df = _welch_ttest(df, ctrl_name, test_name)
+
+        case "moderated":
+            df = _moderated_ttest(df, ctrl_name, test_name, moderated_prior)
+
+        case _:
+            raise ValueError(
+                f'`ttest.type` was provided: "{ttest_type}". "{ttest_type}" is not recognized. Set `ttest.type` to "welch" or "moderated".'
+            )
+
+    df = \
+    df.with_columns(# Seperate out T-test vars
         pl.col("Stats").list.first().alias("T-test"),
         pl.col("Stats").list.last().alias("P-value"),
     )
@@ -130,27 +157,416 @@ def _add_ttest(df: pl.DataFrame,
     return df
 
 
+def _welch_ttest(df: pl.DataFrame, ctrl_name: str, test_name: str) -> pl.DataFrame:
+    """
+    Welch T-test computed for all rows at once, matching `sp.stats.ttest_ind_from_stats(..., equal_var=False)` per row up to rounding.
+    Rows with fewer than two intensities in a condition have no standard deviation and cannot be tested, their T-test and
+    P-value are null so the FDR and the combined P-values skip them.
+
+    """
+
+    stats = df.select(
+        pl.col(f"{ctrl_name} Mean").cast(pl.Float64).alias("m1"),
+        pl.col(f"{ctrl_name} Std").cast(pl.Float64).alias("s1"),
+        pl.col(f"{ctrl_name} Intensity").list.len().cast(pl.Float64).alias("n1"),
+        pl.col(f"{test_name} Mean").cast(pl.Float64).alias("m2"),
+        pl.col(f"{test_name} Std").cast(pl.Float64).alias("s2"),
+        pl.col(f"{test_name} Intensity").list.len().cast(pl.Float64).alias("n2"),
+        pl.col("Alternative Hypothesis").alias("alt"),
+    )
+
+    m1, s1, n1 = (stats[c].to_numpy() for c in ("m1", "s1", "n1"))
+    m2, s2, n2 = (stats[c].to_numpy() for c in ("m2", "s2", "n2"))
+    alt = stats["alt"].to_numpy()
+
+    # Welch-Satterthwaite degrees of freedom, undefined when both variances are zero
+    vn1 = s1**2 / n1
+    vn2 = s2**2 / n2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dof = (vn1 + vn2)**2 / (vn1**2 / (n1 - 1) + vn2**2 / (n2 - 1))
+        dof = np.where(np.isnan(dof), 1.0, dof)
+
+        t = (m1 - m2) / np.sqrt(vn1 + vn2)
+
+    pval = np.where(
+        alt == "less",
+        sp.special.stdtr(dof, t),
+        np.where(
+            alt == "greater",
+            sp.special.stdtr(dof, -t),
+            2 * sp.special.stdtr(dof, -np.abs(t)),
+        ),
+    )
+
+    untested = pl.lit(pl.Series((n1 < 2) | (n2 < 2)))
+
+    df = df.with_columns(
+        pl.concat_list(
+            pl.when(untested).then(None).otherwise(pl.lit(pl.Series(t, dtype=pl.Float64))),
+            pl.when(untested).then(None).otherwise(pl.lit(pl.Series(pval, dtype=pl.Float64))),
+        ).alias("Stats")
+    )
+
+    return df
+
+
+def _moderated_ttest(df: pl.DataFrame,
+                     ctrl_name: str,
+                     test_name: str,
+                     prior: Optional[tuple[float, float]] = None,
+) -> pl.DataFrame:
+    """
+    Empirical Bayes moderated T-test (Smyth, 2004) computed for all rows at once on log2 intensities.
+    The pooled variances are shrunk towards a prior variance estimated from the rows of `df` that are not all-or-nothing
+    (AON), since imputed intensities carry no information on the replicate variance, unless the `prior` (`d0`, `s0^2`) is
+    given, as for shards whose prior is fitted on the whole table by `_moderated_prior()`.
+
+    """
+
+    m1, s1, n1, m2, s2, n2, alt = _log2_stats(df, pl.col(f"{ctrl_name} Intensity"), pl.col(f"{test_name} Intensity"))
+    dof, var = _pooled_variance(s1, n1, s2, n2)
+
+    if prior is None:
+        fit = alt == "two-sided"
+        prior = _fit_f_dist(var[fit], dof[fit])
+    d0, _ = prior
+
+    post = _posterior_variance(var, dof, prior)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (m1 - m2) / np.sqrt(post * (1 / n1 + 1 / n2))
+
+    total_dof = d0 + dof
+
+    pval = np.where(
+        alt == "less",
+        sp.stats.t.cdf(t, total_dof),
+        np.where(
+            alt == "greater",
+            sp.stats.t.sf(t, total_dof),
+            2 * sp.stats.t.sf(np.abs(t), total_dof),
+        ),
+    )
+
+    df = df.with_columns(
+        pl.concat_list(
+            pl.lit(pl.Series(t, dtype=pl.Float64)),
+            pl.lit(pl.Series(pval, dtype=pl.Float64)),
+        ).alias("Stats")
+    )
+
+    return df
+
+
+def _moderated_prior(df: pl.DataFrame,
+                     ctrl_name: str,
+                     test_name: str,
+                     ctrl_ints: list[str],
+                     test_ints: list[str],
+                     ctrl_n_rep: int,
+                     test_n_rep: int,
+                     rcParams: dict,
+                     **kwargs
+) -> Optional[tuple[float, float]]:
+    """
+    Prior (`d0`, `s0^2`) of `_moderated_ttest()` fitted on the whole ion table before it is split into shards, so the
+    moderated statistics do not depend on `run.n_shards`. The prior is fitted on the rows that are not AON, whose intensities
+    are never imputed, so it is the prior of an unsharded run. `None` unless `ttest.type` is "moderated".
+
+    """
+
+    if rcParams.get("ttest.type", "welch") != "moderated":
+        return None
+
+    args: dict[str, Any] = {
+        "ctrl_name": ctrl_name, "test_name": test_name, "ctrl_ints": ctrl_ints, "test_ints": test_ints,
+        "ctrl_n_rep": ctrl_n_rep, "test_n_rep": test_n_rep, "rcParams": rcParams,
+    }
+
+    df = \
+    _add_alt_hypothesis(_cull_intensities(df, **args), **args).filter(
+        pl.col("Alternative Hypothesis").eq("two-sided")
+    )
+
+    # Intensity lists as built by `_impute_aon_intensities()` for the rows it does not impute
+    _, s1, n1, _, s2, n2, _ = _log2_stats(
+        df, pl.concat_list(ctrl_ints).list.drop_nulls(), pl.concat_list(test_ints).list.drop_nulls()
+    )
+    dof, var = _pooled_variance(s1, n1, s2, n2)
+
+    return _fit_f_dist(var, dof)
+
+
+def _log2_stats(df: pl.DataFrame, ctrl: pl.Expr, test: pl.Expr) -> tuple[np.ndarray, ...]:
+    # Variance shrinkage assumes a roughly constant variance on the log scale, raw intensity variances span orders of magnitude
+    ctrl_log2 = ctrl.list.eval(pl.element().cast(pl.Float64).log(2))
+    test_log2 = test.list.eval(pl.element().cast(pl.Float64).log(2))
+
+    stats = df.select(
+        ctrl_log2.list.mean().alias("m1"),
+        ctrl_log2.list.std().alias("s1"),
+        ctrl.list.len().cast(pl.Float64).alias("n1"),
+        test_log2.list.mean().alias("m2"),
+        test_log2.list.std().alias("s2"),
+        test.list.len().cast(pl.Float64).alias("n2"),
+        pl.col("Alternative Hypothesis").alias("alt"),
+    )
+
+    return tuple(stats[c].to_numpy() for c in ("m1", "s1", "n1", "m2", "s2", "n2", "alt"))
+
+
+def _pooled_variance(s1: np.ndarray, n1: np.ndarray, s2: np.ndarray, n2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Residual degrees of freedom and pooled sample variance per row
+    dof = n1 + n2 - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ss = np.nan_to_num((n1 - 1) * s1**2) + np.nan_to_num((n2 - 1) * s2**2)
+        var = np.where(dof > 0, ss / dof, np.nan)
+
+    return dof, var
+
+
+def _posterior_variance(var: np.ndarray, dof: np.ndarray, prior: tuple[float, float]) -> np.ndarray:
+    # Posterior variance, rows without residual df fall back to the prior
+    d0, var0 = prior
+    if np.isinf(d0):
+        return np.full_like(var, var0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (d0 * var0 + np.where(dof > 0, dof * var, 0.0)) / (d0 + dof)
+
+
+def _fit_f_dist(var: np.ndarray, dof: np.ndarray) -> tuple[float, float]:
+    """
+    Moment estimation of the scaled F-distribution prior (`d0`, `s0^2`) from sample variances, as in limma's `fitFDist`.
+    Returns `(0.0, 0.0)` when too few variances are available, which reduces to an ordinary pooled T-test.
+
+    """
+
+    ok = np.isfinite(var) & (var >= 0) & (dof > 0)
+    if ok.sum() < 2:
+        return 0.0, 0.0
+
+    # Exactly zero variances are offset away from zero as in limma
+    x = var[ok]
+    median = np.median(x)
+    x = np.maximum(x, 1e-5 * (median if median > 0 else 1.0))
+
+    z = np.log(x)
+    half_dof = dof[ok] / 2
+    e = z - sp.special.digamma(half_dof) + np.log(half_dof)
+
+    e_mean = e.mean()
+    e_var = e.var(ddof=1) - sp.special.polygamma(1, half_dof).mean()
+
+    if e_var > 0:
+        d0 = 2 * _trigamma_inverse(e_var)
+        var0 = np.exp(e_mean + sp.special.digamma(d0 / 2) - np.log(d0 / 2))
+    else:
+        # Pooled variance, the maximum likelihood scale when the prior degrees of freedom are infinite
+        d0 = np.inf
+        var0 = x.mean()
+
+    return float(d0), float(var0)
+
+
+def _trigamma_inverse(x: float) -> float:
+    """
+    Newton iteration for the inverse of the trigamma function.
+
+    """
+
+    if x > 1e7:
+        return 1 / np.sqrt(x)
+
+    if x < 1e-6:
+        return 1 / x
+
+    y = 0.5 + 1 / x
+    for _ in range(50):
+        tri = sp.special.polygamma(1, y)
+        dif = float(tri * (1 - tri / x) / sp.special.polygamma(2, y))
+        y += dif
+        if -dif / y < 1e-8:
+            break
+
+    return float(y)
+
+
+def _pool_aon_imputations(df: pl.DataFrame,
+                          ctrl_name: str,
+                          test_name: str,
+                          ctrl_n_rep: int,
+                          test_n_rep: int,
+                          rcParams: dict,
+                          moderated_prior: Optional[tuple[float, float]] = None,
+                          **kwargs
+) -> pl.DataFrame:
+    """
+    Multiple imputation of all-or-nothing (AON) ions when `ion.aon_impute_type` is "multiple".
+    `ion.aon_impute_draws` imputations of the missing condition are drawn for every AON ion and the resulting T-tests of
+    `ttest.type` are computed as one (ions x draws x replicates) batch, then pooled with Rubin's rules (Barnard-Rubin
+    degrees of freedom). Moderated T-tests are shrunk towards the prior of `_moderated_ttest()`, their complete-data
+    degrees of freedom include the prior degrees of freedom. A single imputation reduces to the complete-data T-test.
+    The single draw of `_impute_aon_intensities()` is replaced by the pooled means, standard deviations and statistics.
+
+    """
+
+    impute_type = rcParams.get("ion.aon_impute_type", "gaussian")
+
+    match impute_type:
+        case "gaussian":
+            return df
+
+        case "multiple":
+            pass
+
+        case _:
+            raise ValueError(
+                f'`ion.aon_impute_type` was provided: "{impute_type}". "{impute_type}" is not recognized. Set `ion.aon_impute_type` to "gaussian" or "multiple".'
+            )
+
+    n_draws = rcParams.get("ion.aon_impute_draws", 20)
+    if not isinstance(n_draws, int) or n_draws < 1:
+        raise ValueError(
+            f'`ion.aon_impute_draws` was provided: "{n_draws}". Set `ion.aon_impute_draws` to an integer greater than or equal to `1`.'
+        )
+
+    ttest_type = rcParams.get("ttest.type", "welch")
+
+    loc = rcParams.get("ion.aon_impute_loc", 1e4)
+    scale = rcParams.get("ion.aon_impute_scale", 1e3)
+
+    alt = df["Alternative Hypothesis"].to_numpy()
+    less, greater = alt == "less", alt == "greater" # control, respectively test, intensities are imputed
+    aon = less | greater
+    if not aon.any():
+        return df
+
+    def __moments(x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return x.mean(axis=-1), x.var(axis=-1, ddof=1)
+
+    def __observed(name: str, n_rep: int) -> np.ndarray:
+        # Replicates after `_impute_aon_intensities()` broadcast over the draws, (ions, 1, replicates)
+        obs = df.filter(pl.lit(pl.Series(aon))).select(pl.col(f"{name} Intensity").list.to_array(n_rep)).to_series().to_numpy()
+        return obs.astype(np.float64)[:, None, :]
+
+    m = int(aon.sum())
+    ctrl_imp = np.random.normal(loc=loc, scale=scale, size=(m, n_draws, ctrl_n_rep))
+    test_imp = np.random.normal(loc=loc, scale=scale, size=(m, n_draws, test_n_rep))
+
+    # `less` rows only impute the control, `greater` rows only the test
+    ctrl = np.where(less[aon][:, None, None], ctrl_imp, __observed(ctrl_name, ctrl_n_rep))
+    test = np.where(greater[aon][:, None, None], test_imp, __observed(test_name, test_n_rep))
+
+    m1, v1 = __moments(ctrl)
+    m2, v2 = __moments(test)
+    n1, n2 = float(ctrl_n_rep), float(test_n_rep)
+
+    # Complete-data estimate (mean difference), its variance and degrees of freedom per draw, (ions, draws)
+    match ttest_type:
+        case "welch":
+            q = m1 - m2
+            u = v1 / n1 + v2 / n2
+            with np.errstate(divide="ignore", invalid="ignore"):
+                dof_com = u**2 / ((v1 / n1)**2 / (n1 - 1) + (v2 / n2)**2 / (n2 - 1))
+
+        case "moderated":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lm1, lv1 = __moments(np.log2(ctrl))
+                lm2, lv2 = __moments(np.log2(test))
+            res_dof, var = _pooled_variance(np.sqrt(lv1), np.full_like(lv1, n1), np.sqrt(lv2), np.full_like(lv2, n2))
+
+            if moderated_prior is None:
+                # Fitted on the rows that are not AON as in `_moderated_ttest()`, their intensities are the same in every draw
+                _, s1, r1, _, s2, r2, fit_alt = _log2_stats(df, pl.col(f"{ctrl_name} Intensity"), pl.col(f"{test_name} Intensity"))
+                fit_dof, fit_var = _pooled_variance(s1, r1, s2, r2)
+                fit = fit_alt == "two-sided"
+                moderated_prior = _fit_f_dist(fit_var[fit], fit_dof[fit])
+
+            q = lm1 - lm2
+            u = _posterior_variance(var, res_dof, moderated_prior) * (1 / n1 + 1 / n2)
+            dof_com = moderated_prior[0] + res_dof
+
+        case _:
+            raise ValueError(
+                f'`ttest.type` was provided: "{ttest_type}". "{ttest_type}" is not recognized. Set `ttest.type` to "welch" or "moderated".'
+            )
+
+    # Rubin's rules
+    q_bar = q.mean(axis=1)
+    u_bar = u.mean(axis=1)
+    b = q.var(axis=1, ddof=1) if n_draws > 1 else np.zeros_like(q_bar)
+    total = u_bar + (1 + 1 / n_draws) * b
+    dof_com = dof_com.mean(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = q_bar / np.sqrt(total)
+
+        if n_draws > 1:
+            # Barnard-Rubin small sample degrees of freedom, an infinite prior dof leaves the between-imputation dof
+            lam = (1 + 1 / n_draws) * b / total
+            dof_old = (n_draws - 1) / lam**2
+            dof_obs = np.where(np.isinf(dof_com), np.inf, (dof_com + 1) / (dof_com + 3) * dof_com * (1 - lam))
+            dof = 1 / (1 / dof_old + 1 / dof_obs)
+        else:
+            dof = dof_com
+
+    pval = np.where(
+        less[aon],
+        sp.stats.t.cdf(t, dof),
+        sp.stats.t.sf(t, dof),
+    )
+
+    def __scatter(values: np.ndarray) -> pl.Series:
+        out = np.full(df.height, np.nan)
+        out[aon] = values
+        return pl.Series(out, dtype=pl.Float64)
+
+    # Pooled descriptive stats keep the dtype of the single draw
+    pooled = {
+        f"{ctrl_name} Mean": m1.mean(axis=1),
+        f"{ctrl_name} Std": np.sqrt(v1.mean(axis=1)),
+        f"{test_name} Mean": m2.mean(axis=1),
+        f"{test_name} Std": np.sqrt(v2.mean(axis=1)),
+        "T-test": t,
+        "P-value": pval,
+    }
+
+    mask = pl.lit(pl.Series(aon))
+    df = df.with_columns(
+        pl.when(mask).then(pl.lit(__scatter(values)).cast(df.schema[col])).otherwise(pl.col(col)).alias(col)
+        for col, values in pooled.items()
+    ).with_columns(
+        pl.when(mask).then(pl.concat_list("T-test", "P-value")).otherwise(pl.col("Stats")).alias("Stats")
+    )
+
+    return df
+
+
 def _add_fdr(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
 
     # Sort on P-value
     df = df.sort(by=["Protein ID", "P-value"], descending=[False, False])
 
-    tmp_pval_df = (
-        df.group_by(by="Protein ID", maintain_order=True)
-        .agg(
-            pl.col("P-value")
-        ).with_columns(
-            pl.col("P-value").map_elements(
-                lambda x: sp.stats.false_discovery_control(x),
-                return_dtype=pl.List(pl.Float64)
-            ).alias("Adj. P-value")
-        ).explode("Adj. P-value").select("Adj. P-value")
-    )
+    # Benjamini-Hochberg within each protein as in `sp.stats.false_discovery_control()`, rows without a P-value are skipped
+    valid = (pl.col("P-value").is_not_null() & pl.col("P-value").is_not_nan()).fill_null(False)
 
-    df = df.hstack(
-        tmp_pval_df
+    df = \
+    df.with_columns(# Rank of each valid P-value and number of valid P-values within its protein, windows cannot be nested
+        valid.cast(pl.UInt32).cum_sum().over("Protein ID").alias("BH Rank"),
+        valid.cast(pl.UInt32).sum().over("Protein ID").alias("BH N"),
     )
 
+    scaled = pl.when(valid).then(pl.col("P-value") * (pl.col("BH N").cast(pl.Float64) / pl.col("BH Rank").cast(pl.Float64)))
+
+    df = \
+    df.with_columns(
+        pl.when(valid)
+        .then(scaled.reverse().cum_min().reverse().over("Protein ID").clip(0.0, 1.0))
+        .otherwise(pl.col("P-value"))
+        .cast(pl.Float64)
+        .alias("Adj. P-value")
+    ).drop(["BH Rank", "BH N"])
+
     return df
 
 
@@ -217,45 +633,11 @@ def _add_start_end_aa(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
     return df
 
 
-def _add_half_trpytic(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
+def _add_half_trpytic(df: pl.DataFrame, rcParams: dict, **kwargs) -> pl.DataFrame:
 
     df = \
     df.with_columns(
-        pl.when(# [K/R/-].~~~~~(K/R).[X]
-            pl.col("Prev AA").is_in(["K", "R", "-"])
-            & pl.col("End AA").is_in(["K", "R"])
-            & ~pl.col("Next AA").is_in(["-"]))
-        .then(pl.lit("FULL_TRP"))
-        .when(# [K/R/-].~~~~~(X).[-]
-            pl.col("Prev AA").is_in(["K", "R"])
-            & pl.col("Next AA").is_in(["-"]))
-        .then(pl.lit("FULL_TRP"))
-        .when(# [M].2~~~~~(K/R).[X]
-            pl.col("Prev AA").is_in(["M"])
-            & pl.col("Start").eq(2)
-            & pl.col("End AA").is_in(["K", "R"]))
-        .then(pl.lit("FULL_TRP"))
-        .when(# [K/R/-].~~~~~(X).[X]
-            pl.col("Prev AA").is_in(["K", "R", "-"])
-            & ~pl.col("End AA").is_in(["K", "R"])
-            & ~pl.col("Next AA").is_in(["-"]))
-        .then(pl.lit("C_SEMI"))
-        .when(# [M].2~~~~~(X).[X]
-            pl.col("Prev AA").is_in(["M"])
-            & pl.col("Start").eq(2)
-            & ~pl.col("End AA").is_in(["K", "R"]))
-        .then(pl.lit("C_SEMI"))
-        .when(# [X].~~~~~(K/R).[X]
-            ~pl.col("Prev AA").is_in(["K", "R", "-"])
-            & pl.col("End AA").is_in(["K", "R"])
-            & ~pl.col("Next AA").is_in(["-"]))
-        .then(pl.lit("N_SEMI"))
-        .when(# [X].~~~~~(X).[-]
-            ~pl.col("Prev AA").is_in(["K", "R", "-"])
-            & pl.col("Next AA").is_in(["-"]))
-        .then(pl.lit("N_SEMI"))
-        .otherwise(pl.lit(None))
-        .alias("Cleavage Type")
+        _cleavage_type_expr(rcParams.get("protease", "stricttrypsin")).alias("Cleavage Type")
     ).filter(# Filter out over-digested peptides
         ~pl.col("Cleavage Type").is_null()
     ).with_columns(# Fill in `Half Tryptic`
@@ -265,8 +647,102 @@ def _add_half_trpytic(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
     return df
 
 
+def _cleavage_type_expr(protease: str) -> pl.Expr:
+    """
+    Compile a `_PROTEASE_RULES` entry into a single expression.
+    Five termini flags are packed into a 5-bit code that is mapped to its `Cleavage Type` through a lookup table.
+
+    """
+
+    if protease not in _PROTEASE_RULES:
+        raise ValueError(
+            f'`protease` was provided: "{protease}". "{protease}" is not recognized. Set `protease` to one of: '
+            + ", ".join([f'"{name}"' for name in _PROTEASE_RULES])
+        )
+
+    rule = _PROTEASE_RULES[protease]
+    cleave: list[str] = rule["cleave"]
+    block: list[str] = rule["block"]
+
+    # [X].~~~~~(X).[X]
+    n_spec = pl.col("Prev AA").is_in(cleave) & ~pl.col("Start AA").is_in(block)
+    n_term = pl.col("Prev AA").eq("-")
+    n_met = pl.col("Prev AA").eq("M") & pl.col("Start").eq(2) & pl.lit(rule["n_term_met"])
+    c_spec = pl.col("End AA").is_in(cleave) & ~pl.col("Next AA").is_in(block)
+    c_term = pl.col("Next AA").eq("-")
+
+    code = (
+        n_spec.cast(pl.UInt8)
+        + n_term.cast(pl.UInt8) * 2
+        + n_met.cast(pl.UInt8) * 4
+        + c_spec.cast(pl.UInt8) * 8
+        + c_term.cast(pl.UInt8) * 16
+    )
+
+    table = {
+        i: cleavage for i in range(32)
+        if (cleavage := _classify_cleavage(*(bool(i >> bit & 1) for bit in range(5)))) is not None
+    }
+
+    return code.replace_strict(
+        list(table.keys()),
+        list(table.values()),
+        default=None,
+        return_dtype=pl.String
+    )
+
+
+def _classify_cleavage(n_spec: bool, n_term: bool, n_met: bool, c_spec: bool, c_term: bool) -> str | None:
+    if (n_spec or n_term) and c_spec and not c_term:   # [K/R/-].~~~~~(K/R).[X]
+        return "FULL_TRP"
+    if n_spec and c_term:                               # [K/R].~~~~~(X).[-]
+        return "FULL_TRP"
+    if n_met and c_spec:                                # [M].2~~~~~(K/R).[X]
+        return "FULL_TRP"
+    if (n_spec or n_term) and not c_spec and not c_term:# [K/R/-].~~~~~(X).[X]
+        return "C_SEMI"
+    if n_met and not c_spec:                            # [M].2~~~~~(X).[X]
+        return "C_SEMI"
+    if not (n_spec or n_term) and c_spec and not c_term:# [X].~~~~~(K/R).[X]
+        return "N_SEMI"
+    if not (n_spec or n_term) and c_term:               # [X].~~~~~(X).[-]
+        return "N_SEMI"
+
+    return None
+
+
 def _add_cut_sites(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
 
+    df = \
+    df.with_columns(# Position of the cut site, spans are stored as (first residue, last residue)
+        pl.when(pl.col("Cleavage Type").eq("C_SEMI"))
+        .then(pl.col("End") + 1)
+        .when(pl.col("Cleavage Type").eq("N_SEMI"))
+        .then(pl.col("Start"))
+        .when((pl.col("Cleavage Type").eq("FULL_TRP")) & (pl.col("Prev AA").ne("-")))
+        .then(pl.col("Start") - 1)
+        .otherwise(pl.col("Start"))
+        .cast(pl.UInt64)
+        .alias("__site_start__"),
+        pl.when(pl.col("Cleavage Type").eq("FULL_TRP"))
+        .then(pl.col("End"))
+        .otherwise(pl.lit(0))
+        .cast(pl.UInt64)
+        .alias("__site_end__"),
+    ).with_columns(# Pack (protein index, start, end, span) into a single integer key for grouping and joining
+        (
+            (pl.col("Protein ID").rank("dense").cast(pl.UInt64) - 1) * pl.lit(1 << _CUT_SITE_PROTEIN_SHIFT, dtype=pl.UInt64)
+            + pl.col("__site_start__") * pl.lit(1 << _CUT_SITE_START_SHIFT, dtype=pl.UInt64)
+            + pl.col("__site_end__") * pl.lit(1 << _CUT_SITE_END_SHIFT, dtype=pl.UInt64)
+            + pl.col("Cleavage Type").eq("FULL_TRP").cast(pl.UInt64)
+        ).alias("Cut Site Key")
+    ).drop(["__site_start__", "__site_end__"])
+
+    return df
+
+
+def _format_cut_sites(df: pl.DataFrame, **kwargs) -> pl.DataFrame:
+
     df = \
     df.with_columns(# Adding unique identifier for all `Cleavage Type`
         pl.when(pl.col("Cleavage Type").eq("C_SEMI"))
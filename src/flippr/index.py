@@ -0,0 +1,59 @@
+from typing import Optional
+
+import numpy as np
+import polars as pl
+
+
+class _ProteinIndex:
+    """
+    Row index of a result table on `Protein ID` with lazily precomputed rank orders.
+    Only offsets and orders are kept, the table itself is passed to every lookup so it can live in the `ResultStore`.
+
+    """
+
+    def __init__(self, df: pl.DataFrame) -> None:
+        # Rows of a protein are contiguous in FLiPPR tables, otherwise lookups go through a sorting permutation
+        self._order: Optional[np.ndarray] = None
+        if df["Protein ID"].rle_id().n_unique() != df["Protein ID"].n_unique():
+            self._order = (
+                df.select(pl.int_range(pl.len(), dtype=pl.UInt32).sort_by("Protein ID", maintain_order=True))
+                .to_series()
+                .to_numpy()
+            )
+            df = df[self._order]
+
+        runs = (
+            df.select(pl.col("Protein ID"))
+            .with_row_index("offset")
+            .group_by("Protein ID", maintain_order=True)
+            .agg(pl.col("offset").first(), pl.len().alias("length"))
+        )
+
+        self._offsets: dict[str, tuple[int, int]] = {
+            pid: (offset, length) for pid, offset, length in runs.iter_rows()
+        }
+        self._ranks: dict[tuple[str, bool], np.ndarray] = {}
+
+    def lookup(self, df: pl.DataFrame, proteins: list[str]) -> pl.DataFrame:
+        slices = []
+        for pid in proteins:
+            if pid not in self._offsets:
+                continue
+
+            offset, length = self._offsets[pid]
+            if self._order is None:
+                slices.append(df.slice(offset, length))
+            else:
+                slices.append(df[self._order[offset:offset + length]])
+
+        if not slices:
+            return df.clear()
+
+        return pl.concat(slices, how="vertical")
+
+    def top(self, df: pl.DataFrame, k: int, by: str, descending: bool) -> pl.DataFrame:
+        key = (by, descending)
+        if key not in self._ranks:
+            self._ranks[key] = df[by].arg_sort(descending=descending, nulls_last=True).to_numpy()
+
+        return df[self._ranks[key][:k]]
@@ -0,0 +1,147 @@
+from collections.abc import Mapping, Sequence
+from typing import TYPE_CHECKING
+
+import numpy as np
+import polars as pl
+import scipy as sp
+
+from .functions import _neg_log10
+
+if TYPE_CHECKING:
+    from .datatypes import Result
+
+# Columns identifying a row of each combined table across results
+_META_KEY: dict[str, list[str]] = {
+    "CUT SITE": ["Protein ID", "Cut Site ID"],
+    "PEPTIDE": ["Protein ID", "Peptide Sequence"],
+    "MODIFIED PEPTIDE": ["Protein ID", "Modified Sequence"],
+}
+
+_META_TABLE: dict[str, str] = {
+    "CUT SITE": "cut_site",
+    "PEPTIDE": "peptide",
+    "MODIFIED PEPTIDE": "modified_peptide",
+}
+
+_META_METHODS: list[str] = ["stouffer", "fisher"]
+
+
+def meta_analysis(results: "Mapping[str, Result] | Sequence[Result]",
+                  level: str = "cut site",
+                  method: str = "stouffer",
+                  min_studies: int = 1,
+) -> pl.DataFrame:
+    """
+    Combine the fold changes and P-values of the same cut sites or peptides across any number of FLiPPR Results,
+    e.g. the same LiP experiment repeated across batches or sites, each analyzed as its own `Study`.
+
+    Rows are aligned on a 64-bit hash of their key columns (`Protein ID` with `Cut Site ID`, `Peptide Sequence` or
+    `Modified Sequence`). Every result is stacked into a single long table that is combined in one grouped pass, so the
+    cost grows linearly with the number of results.
+
+    - `Log2 FC` and `Log2 FC Std` : mean and standard deviation of the per-result log2 fold changes
+    - `P-value` : `stouffer` (default) combines signed Z-scores so results with opposite fold changes cancel out; `fisher` ignores the direction
+    - `Adj. P-value` : Benjamini-Hochberg correction across all combined rows
+    - `Log2 FC {name}`, `P-value {name}` : values of each result, null when the row was not quantified
+
+    Args:
+        results (Mapping[str, Result] | Sequence[Result]): Results to combine, names are used as column suffixes (positions for sequences).
+        level (str): `cut site`, `peptide` or `modified peptide`. Defaults to `cut site`.
+        method (str): `stouffer` or `fisher`. Defaults to `stouffer`.
+        min_studies (int): Minimum number of results a row must be quantified in. Defaults to `1`.
+
+    Examples:
+        Cut sites reproduced across three sites
+        >>> flippr.meta_analysis({"A": study_a.results["drug"], "B": study_b.results["drug"], "C": study_c.results["drug"]}, min_studies=2)
+
+    """
+
+    name = level
+    level = level.upper()
+    if level not in _META_KEY:
+        raise ValueError(
+            f'`level` was provided: "{name}". "{name}" is not recognized. Set `level` to one of: '
+            + ", ".join([f'"{key.lower()}"' for key in _META_KEY])
+        )
+
+    if method not in _META_METHODS:
+        raise ValueError(
+            f'`method` was provided: "{method}". "{method}" is not recognized. Set `method` to "stouffer" or "fisher".'
+        )
+
+    if not isinstance(results, Mapping):
+        results = {str(i): result for i, result in enumerate(results)}
+
+    if len(results) == 0:
+        raise ValueError("`results` is empty. Provide at least one FLiPPR Result.")
+
+    keys = _META_KEY[level]
+
+    long, annots = [], []
+    for study, result in results.items():
+        df = getattr(result, _META_TABLE[level])
+        fc = result._fc
+
+        df = df.with_columns(pl.struct(keys).hash(seed=0).alias("__key__"))
+
+        stats = ["P-value", "Adj. P-value", "CV", fc, f"Log2 {fc}", "-Log10 P-value", "-Log10 Adj. P-value"]
+        annots.append(df.select(pl.exclude(stats)))
+
+        long.append(
+            df.select(
+                "__key__",
+                pl.lit(study, dtype=pl.String).alias("Study"),
+                pl.col(f"Log2 {fc}").cast(pl.Float64).alias("Log2 FC"),
+                pl.col("P-value").cast(pl.Float64),
+            )
+        )
+
+    long = pl.concat(long, how="vertical").filter(pl.col("P-value").is_finite() & pl.col("Log2 FC").is_finite())
+
+    # Annotations of the first result quantifying each row
+    annot = pl.concat(annots, how="diagonal_relaxed").unique("__key__", keep="first", maintain_order=True)
+
+    pval = np.clip(long["P-value"].to_numpy(), np.finfo(np.float64).tiny, 1.0)
+    match method:
+        case "stouffer":
+            # Two-sided P-values to signed Z-scores
+            stat = sp.stats.norm.isf(pval / 2) * np.sign(long["Log2 FC"].to_numpy())
+        case "fisher":
+            stat = -2 * np.log(pval)
+
+    combined = (
+        long.with_columns(pl.Series("__stat__", stat))
+        .group_by("__key__")
+        .agg(
+            pl.len().alias("No. of Studies"),
+            pl.col("Log2 FC").mean(),
+            pl.col("Log2 FC").std().alias("Log2 FC Std"),
+            pl.col("__stat__").sum(),
+        )
+        .filter(pl.col("No. of Studies").ge(min_studies))
+    )
+
+    stat = combined["__stat__"].to_numpy()
+    n = combined["No. of Studies"].to_numpy()
+    match method:
+        case "stouffer":
+            pval = 2 * sp.stats.norm.sf(np.abs(stat / np.sqrt(n)))
+        case "fisher":
+            pval = sp.stats.chi2.sf(stat, 2 * n)
+
+    combined = combined.drop("__stat__").with_columns(
+        pl.Series("P-value", pval, dtype=pl.Float64),
+        pl.Series("Adj. P-value", sp.stats.false_discovery_control(pval) if len(pval) else pval, dtype=pl.Float64),
+    )
+    combined = _neg_log10(combined, "P-value")
+    combined = _neg_log10(combined, "Adj. P-value")
+
+    # Per result values in one pivot rather than one join per result
+    wide = long.pivot(on="Study", index="__key__", values=["Log2 FC", "P-value"], separator=" ")
+
+    return (
+        annot.join(combined, on="__key__", how="inner")
+        .join(wide, on="__key__", how="left")
+        .drop("__key__")
+        .sort(["Protein ID", "P-value"], maintain_order=True)
+    )
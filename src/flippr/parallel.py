@@ -0,0 +1,120 @@
+import os
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import polars as pl
+
+from . import progress as _progress
+
+
+def _partition(df: pl.DataFrame, on: str, n_shards: int) -> tuple[pl.DataFrame, list[tuple[int, int]]]:
+    """
+    Hash-partition `df` into at most `n_shards` shards so that all rows sharing a value of `on` land in the same shard.
+    Rows are reordered so every shard is a contiguous block, returned as `(offset, length)` pairs.
+
+    """
+
+    df = (
+        df.with_columns((pl.col(on).hash(seed=0) % n_shards).alias("__shard__"))
+        .sort("__shard__", maintain_order=True)
+    )
+
+    lengths = df.group_by("__shard__", maintain_order=True).len()["len"].to_list()
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).tolist()
+
+    return df.drop("__shard__"), list(zip(offsets, lengths))
+
+
+def _shared_dir(shared_dir: Optional[str] = None) -> Optional[str]:
+    """
+    Directory for tables handed to worker processes, `/dev/shm` (RAM backed) when available.
+
+    """
+
+    if shared_dir is not None:
+        return shared_dir
+
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+
+    return None
+
+
+def _map_shards(df: pl.DataFrame,
+                on: str,
+                fn: Callable[..., pl.DataFrame],
+                n_shards: int,
+                n_workers: Optional[int] = None,
+                shared_dir: Optional[str] = None,
+                monitor: Optional[_progress._Monitor] = None,
+                **kwargs: Any
+) -> pl.DataFrame:
+    """
+    Run `fn(shard, seed=..., **kwargs)` on every hash partition of `df` in separate worker processes and concatenate the output.
+    `fn` must be importable at module level. Each shard receives its own seed drawn from `numpy.random` so results remain
+    reproducible with `numpy.random.seed()` in the parent process.
+
+    `df` is written once as an uncompressed Arrow IPC file in `shared_dir` and each worker memory-maps its own slice, so
+    nothing proportional to the table size is pickled. Worker output is handed back the same way.
+
+    `monitor` receives a `shard_finished` event per completed shard, and cancellation is checked as shards complete:
+    shards that have not started are cancelled and running shards are awaited before raising.
+
+    """
+
+    df, bounds = _partition(df, on, n_shards)
+    seeds = np.random.randint(0, 2**32 - 1, size=len(bounds))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(bounds)))
+
+    with tempfile.TemporaryDirectory(prefix="flippr-", dir=_shared_dir(shared_dir)) as tmp:
+        src = Path(tmp).joinpath("input.arrow")
+        df.write_ipc(src, compression="uncompressed")
+        del df
+
+        # Polars is multi-threaded, forking a process that has already initialized its thread pool can deadlock
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(
+                    _attach_shard, fn, src, offset, length, Path(tmp).joinpath(f"output.{i}.arrow"), seed=int(seed), **kwargs
+                )
+                for i, ((offset, length), seed) in enumerate(zip(bounds, seeds))
+            ]
+            monitor = monitor if monitor is not None else _progress._Monitor()
+
+            try:
+                for n, future in enumerate(as_completed(futures), 1):
+                    rows = pl.scan_ipc(future.result()).select(pl.len()).collect().item()
+                    monitor.event("shard_finished", shard=n, n_shards=len(futures), rows=rows)
+                    monitor.check()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            # Shards are concatenated in partition order whatever order they complete in
+            out = [future.result() for future in futures]
+
+        # copy out of the mapped files before they are removed
+        return pl.concat([pl.read_ipc(path) for path in out], how="vertical", rechunk=True)
+
+
+def _attach_shard(fn: Callable[..., pl.DataFrame],
+                  src: Path,
+                  offset: int,
+                  length: int,
+                  dst: Path,
+                  **kwargs: Any
+) -> Path:
+    # Executed in a worker process, `scan_ipc` maps `src` so only the slice is touched
+    shard = pl.scan_ipc(src).slice(offset, length).collect()
+
+    fn(shard, **kwargs).write_ipc(dst, compression="uncompressed")
+
+    return dst
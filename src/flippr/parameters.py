@@ -1,24 +1,78 @@
 from typing import Any
 
+import polars as pl
+
 rcParams: dict[str, Any] = {
     "ion.missing_intensity_thresh": 1,
-    "ion.aon_impute_type": "gaussian", # unused for now
+    "ion.aon_impute_type": "gaussian", # "gaussian" (single draw) or "multiple"
+    "ion.aon_impute_draws": 20, # number of imputations when `ion.aon_impute_type` is "multiple"
     "ion.aon_impute_loc": 1e4,
     "ion.aon_impute_scale": 1e3,
+    "ttest.type": "welch", # "welch" or "moderated"
     "trp_protein.intensity_value": "MaxLFQ Intensity", # unused for dia methods
     "trp_protein.fc_sig_tresh": 1.0,
     "trp_protein.pval_sig_tresh": 0.01,
     "protein.fc_sig_thresh": 1.0,
     "protein.pval_sig_thresh": 0.01,
     "protein.adj_pval_sig_thresh": 0.05,
+    "protease": "stricttrypsin", # key of `_PROTEASE_RULES` used to classify `Cleavage Type`
+    "dose.min_doses": None, # minimum number of quantified doses to fit a dose-response curve, defaults to the model minimum
+    "data.intensity_dtype": "float64", # "float64" or "float32"
+    "data.ion_layout": "dense", # "dense" or "sparse" (only quantified ion intensities are held)
+    "store.memory_budget": None, # bytes held in memory by study results, `None` is unbounded
+    "store.eviction": "recompute", # "recompute" or "spill" derived tables
+    "store.spill_dir": None, # defaults to the system temporary directory
+    "run.n_shards": 1, # >1 splits the ions by `Protein ID` across worker processes
+    "run.n_workers": None, # defaults to `os.cpu_count()`
+    "run.shared_dir": None, # defaults to `/dev/shm` when available
+    "server.max_studies": 4, # studies (and their parsed FragPipe tables) kept in memory by `flippr.serve()`
+    "server.max_concurrent": 2, # processes run at the same time by `flippr.serve()`
+    "server.queue_timeout": 600.0, # seconds a request waits for a free slot before it is rejected
+    "server.output_root": None, # directory the `output_dir` of requests must be inside, `None` disables parquet exports
+}
+
+# Pipeline stage first affected by each rcParams key in `Study().sweep()`; stages are computed in this order and
+# a stage is shared by every grid point with the same values of its own and upstream keys
+_SWEEP_STAGE_ORDER: list[str] = ["ion", "normalize", "summary"]
+
+_SWEEP_STAGES: dict[str, str] = {
+    "ion.missing_intensity_thresh": "ion",
+    "ion.aon_impute_type": "ion",
+    "ion.aon_impute_draws": "ion",
+    "ion.aon_impute_loc": "ion",
+    "ion.aon_impute_scale": "ion",
+    "ttest.type": "ion",
+    "protease": "ion",
+    "data.intensity_dtype": "ion",
+    "data.ion_layout": "ion",
+    "trp_protein.fc_sig_tresh": "normalize",
+    "trp_protein.pval_sig_tresh": "normalize",
+    "protein.fc_sig_thresh": "summary",
+    "protein.pval_sig_thresh": "summary",
+    "protein.adj_pval_sig_thresh": "summary",
 }
 
+# `Result` tables that can be requested from `flippr.serve()`
+_SERVER_TABLES: list[str] = [
+    "ion",
+    "modified_peptide",
+    "peptide",
+    "cut_site",
+    "protein_summary",
+    "trp_protein",
+    "residue_profile",
+]
+
 _DDA_FP_FILES: list[str] = [
     "combined_ion.tsv",
     "combined_protein.tsv",
     "experiment_annotation.tsv",
 ]
 
+# compressed variants accepted for every FragPipe output file, in lookup order
+# only headers are streamed, the polars CSV reader decompresses the whole file in memory before parsing it
+_FP_COMPRESSION_SUFFIXES: list[str] = ["", ".gz", ".zst"]
+
 _DDA_FP_CONSTANT_ION_COLUMNS: list[str] = [
     "Peptide Sequence",
     "Modified Sequence",
@@ -77,6 +131,23 @@ _DIA_FP_FILES: list[str] = [
     "experiment_annotation.tsv",
 ]
 
+# Long DIA-NN report, used instead of the two DIA-NN matrices of `_DIA_FP_FILES` when present
+_DIA_DIANN_REPORT: str = "dia-quant-output/report.parquet"
+
+# Matrices rebuilt from `_DIA_DIANN_REPORT`: the quantity pivoted by `Run` and the q-values filtered as in the DIA-NN matrices
+_DIA_DIANN_REPORT_QVALUE: float = 0.01
+
+_DIA_DIANN_REPORT_MATRICES: dict[str, dict[str, Any]] = {
+    "dia_precursor": {
+        "quantity": "Precursor.Normalised",
+        "qvalues": ["Q.Value", "Lib.Q.Value", "Lib.PG.Q.Value"],
+    },
+    "dia_protein": {
+        "quantity": "PG.MaxLFQ",
+        "qvalues": ["PG.Q.Value", "Lib.PG.Q.Value"],
+    },
+}
+
 _DIA_FP_CONSTANT_ION_COLUMNS: list[str] = [
     "Protein ID",
     "Peptide Sequence",
@@ -127,6 +198,102 @@ _DIA_RENAME_DIANN_PROTEIN: dict[str, str] = {
     "First.Protein.Description": "Protein Description",
 }
 
+_INTENSITY_DTYPES: dict[str, type[pl.DataType]] = {
+    "float32": pl.Float32,
+    "float64": pl.Float64,
+}
+
+# Column dtypes pinned by the readers, columns not listed here are read as `String` without inference.
+# Intensity columns are resolved separately and read with `data.intensity_dtype`.
+_FP_SCHEMAS: dict[str, dict[str, dict[str, type[pl.DataType]]]] = {
+    "dda_ion": {
+        "constant": {
+            "Peptide Sequence": pl.String,
+            "Modified Sequence": pl.String,
+            "Prev AA": pl.String,
+            "Next AA": pl.String,
+            "Start": pl.Int64,
+            "End": pl.Int64,
+            "Peptide Length": pl.Int64,
+            "M/Z": pl.Float64,
+            "Charge": pl.Int64,
+            "Compensation Voltage": pl.String,
+            "Assigned Modifications": pl.String,
+            "Protein": pl.String,
+            "Protein ID": pl.String,
+            "Entry Name": pl.String,
+            "Gene": pl.String,
+            "Protein Description": pl.String,
+            "Mapped Genes": pl.String,
+            "Mapped Proteins": pl.String,
+        },
+        "variable": {
+            "Spectral Count": pl.Int64,
+            "Apex Retention Time": pl.Float64,
+            "Match Type": pl.String,
+        },
+    },
+    "dda_protein": {
+        "constant": {
+            "Protein": pl.String,
+            "Protein ID": pl.String,
+            "Entry Name": pl.String,
+            "Gene": pl.String,
+            "Protein Length": pl.Int64,
+            "Organism": pl.String,
+            "Protein Existence": pl.String,
+            "Description": pl.String,
+            "Protein Probability": pl.Float64,
+            "Top Peptide Probability": pl.Float64,
+            "Combined Total Peptides": pl.Int64,
+            "Combined Spectral Count": pl.Int64,
+            "Combined Unique Spectral Count": pl.Int64,
+            "Combined Total Spectral Count": pl.Int64,
+        },
+        "variable": {
+            "Spectral Count": pl.Int64,
+        },
+    },
+    "dia_ion": {
+        "constant": {
+            "Protein ID": pl.String,
+            "Peptide Sequence": pl.String,
+            "Prev AA": pl.String,
+            "Next AA": pl.String,
+            "Protein Start": pl.Int64,
+            "Protein End": pl.Int64,
+        },
+        "variable": {},
+    },
+    "dia_precursor": {
+        "constant": {
+            "Protein.Group": pl.String,
+            "Protein.Ids": pl.String,
+            "Protein.Names": pl.String,
+            "Genes": pl.String,
+            "First.Protein.Description": pl.String,
+            "Proteotypic": pl.Int64,
+            "Stripped.Sequence": pl.String,
+            "Modified.Sequence": pl.String,
+            "Precursor.Charge": pl.Int64,
+            "Precursor.Id": pl.String,
+        },
+        "variable": {},
+    },
+    "dia_protein": {
+        "constant": {
+            "Protein.Group": pl.String,
+            "Protein.Ids": pl.String,
+            "Protein.Names": pl.String,
+            "Genes": pl.String,
+            "First.Protein.Description": pl.String,
+            "N.Sequences": pl.Int64,
+            "N.Proteotypic.Sequences": pl.Int64,
+        },
+        "variable": {},
+    },
+}
+
 _FLIPPR_ION_COLUMNS: list[str] = [
     "Protein ID",
     "Gene",
@@ -152,13 +319,23 @@ _FLIPPR_PROTEIN_SUMMARY_COLUMNS: list[str] = [
     "Entry Name",
 ]
 
+# Needed to build the `Cut Site` strings after grouping on `Cut Site Key`
+_FLIPPR_CUT_SITE_FORMAT_COLUMNS: list[str] = [
+    "Cleavage Type",
+    "Prev AA",
+    "Start AA",
+    "End AA",
+    "Next AA",
+    "Start",
+    "End",
+]
+
 _FLIPPR_CUT_SITE_COLUMNS: list[str] = [
-    "Cut Site",
     "Gene",
     "Entry Name",
     "Protein Description",
     "Half Tryptic",
-]
+] + _FLIPPR_CUT_SITE_FORMAT_COLUMNS
 
 _FLIPPR_PEPTIDE_COLUMNS: list[str] = [
     "Prev AA",
@@ -180,6 +357,23 @@ _FLIPPR_COMBINE_KEY: dict[str, list[str]] = {
     "MODIFIED PEPTIDE": _FLIPPR_PEPTIDE_COLUMNS,
 }
 
+# Specific protease used with PK in the LiP experiment, named as in FragPipe/MSFragger.
+# `cleave`: residues cut on their C-terminal side; `block`: residues that prevent cleavage when they follow the cut;
+# `n_term_met`: peptides starting after a cleaved initiator Met count as specific at the N-terminus.
+_PROTEASE_RULES: dict[str, dict[str, Any]] = {
+    "stricttrypsin": {"cleave": ["K", "R"], "block": [], "n_term_met": True},
+    "trypsin": {"cleave": ["K", "R"], "block": ["P"], "n_term_met": True},
+    "lysc": {"cleave": ["K"], "block": ["P"], "n_term_met": True},
+    "argc": {"cleave": ["R"], "block": ["P"], "n_term_met": True},
+    "gluc": {"cleave": ["D", "E"], "block": ["P"], "n_term_met": True},
+}
+
+# Fewest quantified doses each `Study().dose_response()` model is fitted on: the fitted parameters plus one residual degree of freedom
+_DOSE_MODEL_MIN_DOSES: dict[str, int] = {
+    "sigmoid": 4,
+    "log-linear": 3,
+}
+
 # Thank you Holehouse lab!
 _STANDARD_AA_CONVERSION: dict[str, str] = {
     "B": "N",
@@ -0,0 +1,191 @@
+from collections.abc import Sequence
+from typing import Any, Optional
+
+import numpy as np
+import polars as pl
+import scipy as sp
+
+from . import datatypes as _types
+from .parameters import rcParams as _rcParams
+
+
+def simulate_power(n_reps: Sequence[int] = (2, 3, 4, 5, 6),
+                   effect_sizes: Sequence[float] = (1.0, 1.5, 2.0, 3.0),
+                   n_sims: int = 1000,
+                   n_ions: int = 10,
+                   changed_fraction: float = 0.2,
+                   cv: float = 0.2,
+                   intensity_loc: float = 20.0,
+                   intensity_scale: float = 2.0,
+                   missing_loc: float = 16.0,
+                   missing_scale: float = 1.0,
+                   missing_rate: float = 0.01,
+                   seed: Optional[int] = None,
+                   rcParams: Optional[dict[str, Any]] = None,
+) -> pl.DataFrame:
+    """
+    Monte Carlo power analysis to plan the number of replicates of a LiP experiment before acquiring it.
+
+    Each simulated dataset is one protein with `n_ions` ions, of which a `changed_fraction` are shifted up or down by the
+    effect size (log2 FC) in the test condition. Ion log2 intensities are normally distributed around `intensity_loc`
+    with replicate noise set by `cv`, and intensities are missing at random with probability `missing_rate` or, more
+    often, when they are low (logistic in log2 intensity, 50% missing at `missing_loc`), which produces AON ions as in
+    real data. Every dataset of a replicate count is stacked into one table and passed once through the same cull, AON
+    imputation, T-test and per-protein FDR stages as `Study().run()`, with the pipeline settings of `rcParams`.
+
+    Ions are significant with the `protein.fc_sig_thresh` and `protein.pval_sig_thresh` (or `protein.adj_pval_sig_thresh`)
+    rcParams, as in `Result().protein_summary`.
+
+    - `Power (P-value)`, `Power (Adj. P-value)` : fraction of changed ions found significant
+    - `False Positive Rate (P-value)`, `False Positive Rate (Adj. P-value)` : fraction of unchanged ions found significant
+    - `Protein Power (Adj. P-value)` : fraction of datasets with at least one significant changed ion
+    - `Fraction of Quantified Ions` : fraction of ions kept by the cull with a valid P-value
+
+    Args:
+        n_reps (Sequence[int]): Numbers of replicates per condition to evaluate. Defaults to `(2, 3, 4, 5, 6)`.
+        effect_sizes (Sequence[float]): Absolute log2 FC of the changed ions. Defaults to `(1.0, 1.5, 2.0, 3.0)`.
+        n_sims (int): Number of simulated datasets per replicate count and effect size. Defaults to `1000`.
+        n_ions (int): Number of ions per dataset. Defaults to `10`.
+        changed_fraction (float): Fraction of the ions of each dataset carrying the effect. Defaults to `0.2`.
+        cv (float): Replicate coefficient of variation of the intensities, see `QualityControl().cv`. Defaults to `0.2`.
+        intensity_loc (float): Mean log2 ion intensity. Defaults to `20.0`.
+        intensity_scale (float): Standard deviation of the log2 ion intensities, see `QualityControl().intensity`. Defaults to `2.0`.
+        missing_loc (float): Log2 intensity at which half the values are missing. Defaults to `16.0`.
+        missing_scale (float): Width of the logistic intensity-dependent missingness in log2 units. Defaults to `1.0`.
+        missing_rate (float): Probability of a value missing regardless of its intensity. Defaults to `0.01`.
+        seed (int, optional): Seed of the simulation and of the AON imputation. Defaults to None.
+        rcParams (dict, optional): Pipeline settings, defaults to `flippr.rcParams`.
+
+    Examples:
+        Power of 3 to 6 replicates to detect 2-fold and 4-fold changes with a noisier instrument
+        >>> flippr.simulate_power(n_reps=[3, 4, 5, 6], effect_sizes=[1.0, 2.0], cv=0.3)
+
+    """
+
+    rcParams = _rcParams if rcParams is None else rcParams
+
+    for n in n_reps:
+        if not isinstance(n, (int, np.integer)) or n < 2:
+            raise ValueError(f'`n_reps` was provided: "{n}". Replicate values must be integers greater than or equal to `2`.')
+
+    if n_sims < 1 or n_ions < 1:
+        raise ValueError("`n_sims` and `n_ions` must be greater than or equal to `1`.")
+
+    if not 0 < changed_fraction <= 1:
+        raise ValueError(f'`changed_fraction` was provided: "{changed_fraction}". Set `changed_fraction` between `0` (exclusive) and `1`.')
+
+    rng = np.random.default_rng(seed)
+    state = np.random.get_state()
+    if seed is not None:
+        # AON imputation draws from the global numpy generator
+        np.random.seed(seed)
+
+    try:
+        power = [
+            _simulate(int(n), np.asarray(effect_sizes, dtype=np.float64), n_sims, n_ions, changed_fraction, cv,
+                      intensity_loc, intensity_scale, missing_loc, missing_scale, missing_rate, rng, rcParams)
+            for n in n_reps
+        ]
+    finally:
+        if seed is not None:
+            np.random.set_state(state)
+
+    return pl.concat(power, how="vertical").sort(["No. of Replicates", "Effect Size"], maintain_order=True)
+
+
+def _simulate(n_rep: int,
+              effect_sizes: np.ndarray,
+              n_sims: int,
+              n_ions: int,
+              changed_fraction: float,
+              cv: float,
+              intensity_loc: float,
+              intensity_scale: float,
+              missing_loc: float,
+              missing_scale: float,
+              missing_rate: float,
+              rng: np.random.Generator,
+              rcParams: dict[str, Any],
+) -> pl.DataFrame:
+    """
+    Simulate and run every dataset of one replicate count as a single table.
+    Datasets are `Protein ID` groups so the per-protein FDR of `_add_fdr()` is computed within each dataset.
+
+    """
+
+    n_datasets = len(effect_sizes) * n_sims
+    n_changed = max(1, round(changed_fraction * n_ions))
+    height = n_datasets * n_ions
+
+    dataset = np.repeat(np.arange(n_datasets, dtype=np.uint32), n_ions)
+    changed = np.tile(np.arange(n_ions) < n_changed, n_datasets)
+    effect = np.repeat(effect_sizes, n_sims * n_ions)
+
+    # Log-normal replicate noise with the requested coefficient of variation, in log2 units
+    noise = np.sqrt(np.log1p(cv**2)) / np.log(2)
+    mu = rng.normal(intensity_loc, intensity_scale, size=(height, 1))
+    shift = np.where(changed, effect * rng.choice([-1.0, 1.0], size=height), 0.0)[:, None]
+
+    ctrl = mu + rng.normal(0.0, noise, size=(height, n_rep))
+    test = mu + shift + rng.normal(0.0, noise, size=(height, n_rep))
+
+    dtype = np.dtype(rcParams.get("data.intensity_dtype", "float64"))
+
+    def __observe(log2: np.ndarray) -> np.ndarray:
+        # Missing at random plus missing not at random for low intensities, missing values are zeros as in FragPipe
+        p_missing = missing_rate + (1 - missing_rate) * sp.special.expit((missing_loc - log2) / missing_scale)
+        return np.where(rng.random(log2.shape) < p_missing, 0.0, np.exp2(log2)).astype(dtype)
+
+    ctrl_ints = [f"Ctrl {i + 1} Intensity" for i in range(n_rep)]
+    test_ints = [f"Test {i + 1} Intensity" for i in range(n_rep)]
+
+    df = pl.DataFrame({
+        "Protein ID": dataset,
+        "Effect Size": effect,
+        "Changed": changed,
+    }).hstack(
+        pl.from_numpy(__observe(ctrl), schema=ctrl_ints)
+    ).hstack(
+        pl.from_numpy(__observe(test), schema=test_ints)
+    )
+
+    args = {
+        "ctrl_name":    "Ctrl",
+        "test_name":    "Test",
+        "ctrl_ints":    ctrl_ints,
+        "test_ints":    test_ints,
+        "ctrl_n_rep":   n_rep,
+        "test_n_rep":   n_rep,
+        "rcParams":     rcParams,
+    }
+
+    df = _types._run(df, args, "FC")
+
+    fc_sig = rcParams.get("protein.fc_sig_thresh", 1.0)
+    pv_sig = rcParams.get("protein.pval_sig_thresh", 0.01)
+    apv_sig = rcParams.get("protein.adj_pval_sig_thresh", 0.05)
+
+    sig = pl.col("Log2 FC").abs().ge(fc_sig) & pl.col("P-value").le(pv_sig)
+    sigsig = pl.col("Log2 FC").abs().ge(fc_sig) & pl.col("Adj. P-value").le(apv_sig)
+
+    n_null = n_sims * (n_ions - n_changed)
+
+    power = (
+        df.group_by("Effect Size")
+        .agg(
+            (sig & pl.col("Changed")).sum().truediv(n_sims * n_changed).alias("Power (P-value)"),
+            (sigsig & pl.col("Changed")).sum().truediv(n_sims * n_changed).alias("Power (Adj. P-value)"),
+            (sig & ~pl.col("Changed")).sum().truediv(n_null if n_null else None).alias("False Positive Rate (P-value)"),
+            (sigsig & ~pl.col("Changed")).sum().truediv(n_null if n_null else None).alias("False Positive Rate (Adj. P-value)"),
+            pl.col("Protein ID").filter(sigsig & pl.col("Changed")).n_unique().truediv(n_sims).alias("Protein Power (Adj. P-value)"),
+            pl.col("P-value").is_not_nan().sum().truediv(n_sims * n_ions).alias("Fraction of Quantified Ions"),
+        )
+    )
+
+    # Effect sizes without any quantified ion are reported with zero power
+    return (
+        pl.DataFrame({"Effect Size": effect_sizes})
+        .join(power, on="Effect Size", how="left")
+        .with_columns(pl.exclude("Effect Size", "False Positive Rate (P-value)", "False Positive Rate (Adj. P-value)").fill_null(0.0))
+        .select(pl.lit(n_rep, dtype=pl.Int64).alias("No. of Replicates"), pl.all())
+    )
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+from typing import Any, Callable, Optional
+
+import polars as pl
+
+# Receives every progress event of `Study().run()` as a dictionary, see `Study().run()`
+ProgressCallback = Callable[[dict[str, Any]], None]
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation of `Study().run()` and `Study().arun()`.
+    The running study checks the token between pipeline stages and shards, and raises `concurrent.futures.CancelledError`
+    at the first check after `cancel()` is called. The token can be cancelled from any thread.
+
+    Examples:
+        Abort a run from another thread
+        >>> token = flippr.CancellationToken()
+        >>> threading.Timer(60, token.cancel).start()
+        >>> study.run(cancel=token)
+
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise CancelledError("The run was cancelled.")
+
+
+class _Monitor:
+    """Progress events and cancellation checks of a single process"""
+
+    def __init__(self,
+                 pid: Optional[str] = None,
+                 progress: Optional[ProgressCallback] = None,
+                 tokens: Optional[list[Optional[CancellationToken]]] = None,
+    ) -> None:
+        self._pid = pid
+        self._progress = progress
+        self._tokens = [token for token in tokens or [] if token is not None]
+
+    def event(self, event: str, **fields: Any) -> None:
+        if self._progress is not None:
+            self._progress({"event": event, "process": self._pid, **fields})
+
+    def check(self) -> None:
+        for token in self._tokens:
+            token.raise_if_cancelled()
+
+    def stage(self, table: str, stage: str, fn: Callable[[], pl.DataFrame]) -> pl.DataFrame:
+        # Cancellation is checked before every stage, a running stage always completes
+        self.check()
+        self.event("stage_started", table=table, stage=stage)
+
+        start = time.perf_counter()
+        df = fn()
+
+        self.event("stage_finished", table=table, stage=stage, rows=df.height, seconds=time.perf_counter() - start)
+
+        return df
@@ -0,0 +1,146 @@
+import numpy as np
+import polars as pl
+
+# Rows accumulated per batch for the correlation matrix products
+_CHUNK_SIZE = 65536
+
+_QUANTILES: dict[str, float] = {
+    "Q1": 0.25,
+    "Median": 0.5,
+    "Q3": 0.75,
+    "Q90": 0.9,
+}
+
+
+def _sample_correlation(df: pl.DataFrame, samples: dict[str, str]) -> pl.DataFrame:
+    """
+    Pairwise Pearson correlation of the log2 intensities between every pair of samples, using the rows quantified in both.
+    `samples` maps sample names to their intensity columns. All pairs are accumulated at once with masked matrix products.
+
+    """
+
+    names = list(samples)
+    m = len(names)
+
+    n = np.zeros((m, m))
+    sx = np.zeros((m, m))
+    sxx = np.zeros((m, m))
+    sxy = np.zeros((m, m))
+
+    for i in range(0, df.height, _CHUNK_SIZE):
+        x = df.slice(i, _CHUNK_SIZE).select(samples.values()).to_numpy().astype(np.float64)
+
+        mask = np.isfinite(x) & (x > 0)
+        x = np.where(mask, np.log2(np.where(mask, x, 1.0)), 0.0)
+        w = mask.astype(np.float64)
+
+        n += w.T @ w
+        sx += x.T @ w       # sx[i, j]: sum of sample i over rows where j is also quantified
+        sxx += (x**2).T @ w
+        sxy += x.T @ x
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = n * sxy - sx * sx.T
+        var = n * sxx - sx**2
+        corr = cov / np.sqrt(var * var.T)
+
+    return pl.DataFrame(
+        {"Sample": names} | {name: corr[:, j] for j, name in enumerate(names)}
+    ).fill_nan(None)
+
+
+def _sample_missingness(df: pl.DataFrame, samples: dict[str, str], conditions: dict[str, str]) -> pl.DataFrame:
+    """
+    Number and fraction of rows without an intensity (null or zero) in every sample.
+
+    """
+
+    missing = df.select(
+        (pl.col(col).is_null() | pl.col(col).eq(0)).sum().alias(name) for name, col in samples.items()
+    ).row(0)
+
+    return pl.DataFrame(
+        {
+            "Sample": list(samples),
+            "Condition": [conditions[name] for name in samples],
+            "Missing": list(missing),
+        },
+        schema_overrides={"Missing": pl.UInt32},
+    ).with_columns(
+        (pl.col("Missing") / df.height).alias("Missing Fraction")
+    )
+
+
+def _sample_intensity(df: pl.DataFrame, samples: dict[str, str], conditions: dict[str, str]) -> pl.DataFrame:
+    """
+    Distribution of the log2 intensities of every sample, missing values excluded.
+
+    """
+
+    def __log2(col: str) -> pl.Expr:
+        return pl.col(col).filter(pl.col(col).gt(0)).cast(pl.Float64).log(base=2)
+
+    stats = df.select(
+        [__log2(col).count().alias(f"{name}|N") for name, col in samples.items()]
+        + [__log2(col).mean().alias(f"{name}|Mean") for name, col in samples.items()]
+        + [__log2(col).min().alias(f"{name}|Min") for name, col in samples.items()]
+        + [
+            __log2(col).quantile(q).alias(f"{name}|{stat}")
+            for stat, q in _QUANTILES.items() for name, col in samples.items()
+        ]
+        + [__log2(col).max().alias(f"{name}|Max") for name, col in samples.items()]
+    ).row(0, named=True)
+
+    stat_names = ["N", "Mean", "Min"] + list(_QUANTILES) + ["Max"]
+
+    return pl.DataFrame(
+        {
+            "Sample": list(samples),
+            "Condition": [conditions[name] for name in samples],
+        }
+        | {stat: [stats[f"{name}|{stat}"] for name in samples] for stat in stat_names}
+    )
+
+
+def _condition_cv(df: pl.DataFrame, samples: dict[str, str], conditions: dict[str, str]) -> pl.DataFrame:
+    """
+    Distribution of the per-row coefficient of variation of the replicates in every condition.
+    Rows need at least two quantified replicates in a condition.
+
+    """
+
+    groups: dict[str, list[str]] = {}
+    for name, col in samples.items():
+        groups.setdefault(conditions[name], []).append(col)
+
+    cvs = df.select(
+        pl.concat_list(cols)
+        .list.eval(pl.element().filter(pl.element().gt(0)).cast(pl.Float64))
+        .alias(condition)
+        for condition, cols in groups.items()
+    ).select(
+        pl.when(pl.col(condition).list.len().ge(2))
+        .then(pl.col(condition).list.std() / pl.col(condition).list.mean())
+        .otherwise(pl.lit(None))
+        .alias(condition)
+        for condition in groups
+    )
+
+    stats = cvs.select(
+        [pl.col(condition).count().alias(f"{condition}|N") for condition in groups]
+        + [pl.col(condition).mean().alias(f"{condition}|Mean") for condition in groups]
+        + [
+            pl.col(condition).quantile(q).alias(f"{condition}|{stat}")
+            for stat, q in _QUANTILES.items() for condition in groups
+        ]
+    ).row(0, named=True)
+
+    stat_names = ["N", "Mean"] + list(_QUANTILES)
+
+    return pl.DataFrame(
+        {
+            "Condition": list(groups),
+            "Replicates": [len(cols) for cols in groups.values()],
+        }
+        | {stat: [stats[f"{condition}|{stat}"] for condition in groups] for stat in stat_names}
+    )
@@ -1,9 +1,18 @@
+import gzip
 import polars as pl
-import polars.selectors as cs
-from typing import Any
+import zstandard
+from typing import IO, Any, Optional, cast
 from pathlib import Path
 
 from .parameters import (
+    _FP_SCHEMAS,
+    _FP_COMPRESSION_SUFFIXES,
+    _INTENSITY_DTYPES,
+    _DDA_FP_FILES,
+    _DIA_FP_FILES,
+    _DIA_DIANN_REPORT,
+    _DIA_DIANN_REPORT_QVALUE,
+    _DIA_DIANN_REPORT_MATRICES,
     _DIA_FP_CONSTANT_ION_COLUMNS,
     _DIA_RENAME_FP_ION,
     _DIA_RENAME_DIANN_ION,
@@ -11,53 +20,470 @@ from .parameters import (
 )
 
 
-def _read_ion(path: Path, method: str) -> pl.DataFrame:
+def _read_ion(path: Path, method: str, intensity_dtype: str = "float64") -> pl.DataFrame:
     match method:
         case "dda":
-            dda_ion_df = pl.read_csv(path.joinpath("combined_ion.tsv"), separator="\t")
-            dda_ion_df = dda_ion_df.with_columns(cs.contains("Intensity").fill_null(strategy="zero"))
+            dda_ion_df = _scan_fragpipe(_resolve_fp_file(path, _DDA_FP_FILES[0]), "dda_ion", intensity_dtype).collect()
 
-            return dda_ion_df
+            return _add_presence(dda_ion_df)
         
         case "dia":
             annot = _read_experiment_annotation(path)
 
-            dia_ion_df = pl.read_csv(path.joinpath("dia-quant-output/report.pr_matrix.tsv"), separator="\t")
-            fp_ion_df = pl.read_csv(path.joinpath("ion.tsv"), separator="\t").select(_DIA_FP_CONSTANT_ION_COLUMNS)
+            report = _dia_report(path)
+            if report is not None:
+                dia_ion_df = _pivot_diann_report(report, "dia_precursor", intensity_dtype, annot)
+            else:
+                dia_ion_df = _scan_fragpipe(_resolve_fp_file(path, _DIA_FP_FILES[1]), "dia_precursor", intensity_dtype, annot).collect()
+            fp_ion_df = _scan_fragpipe(_resolve_fp_file(path, _DIA_FP_FILES[0]), "dia_ion", intensity_dtype).select(_DIA_FP_CONSTANT_ION_COLUMNS).collect()
 
             dia_ion_df = _rename_dia_columns(dia_ion_df, annot)
             dia_ion_df = _add_dia_ion_data(dia_ion_df, fp_ion_df)
-            dia_ion_df = dia_ion_df.with_columns(cs.contains("Intensity").fill_null(strategy="zero"))
 
-            return dia_ion_df
+            return _add_presence(dia_ion_df)
         
         case _:
             raise ValueError("Input error.")
         
-def _read_trp(path: Path, method: str) -> pl.DataFrame:
+def _read_ion_sparse(path: Path, method: str, intensity_dtype: str = "float64") -> pl.DataFrame:
+    """
+    `_read_ion()` in the sparse layout of `data.ion_layout` "sparse", for highly missing (DIA) intensity matrices.
+    Every ion keeps its constant columns and an `Intensities` list with one `{"Sample", "Intensity"}` struct per non-zero
+    intensity, `Sample` being an Enum of the intensity column names. The dense matrix is never materialized: the TSV
+    matrices are streamed and the DIA-NN report is grouped from its long layout. Use `_densify()` to select columns.
+
+    """
+
+    match method:
+        case "dda":
+            file = _resolve_fp_file(path, _DDA_FP_FILES[0])
+            intensity_cols = [col for col in _read_header(file) if _is_intensity_column(col)]
+
+            dda_ion_df = _sparsify(_scan_fragpipe(file, "dda_ion", intensity_dtype), intensity_cols).collect(engine="streaming")
+
+            return _add_presence(dda_ion_df)
+
+        case "dia":
+            annot = _read_experiment_annotation(path)
+
+            report = _dia_report(path)
+            if report is not None:
+                dia_ion_df = _sparse_diann_report(report, "dia_precursor", intensity_dtype, annot)
+            else:
+                file = _resolve_fp_file(path, _DIA_FP_FILES[1])
+                header = _read_header(file)
+                rename = _dia_rename_map(header, annot)
+                runs = list(_file_to_sample_name(annot))
+                intensity_cols = [rename.get(col, col) for col in header if _is_intensity_column(col, runs)]
+
+                dia_ion_df = _sparsify(
+                    _scan_fragpipe(file, "dia_precursor", intensity_dtype, annot).rename(rename), intensity_cols
+                ).collect(engine="streaming")
+            fp_ion_df = _scan_fragpipe(_resolve_fp_file(path, _DIA_FP_FILES[0]), "dia_ion", intensity_dtype).select(_DIA_FP_CONSTANT_ION_COLUMNS).collect()
+
+            dia_ion_df = _add_dia_ion_data(dia_ion_df, fp_ion_df)
+
+            return _add_presence(dia_ion_df)
+
+        case _:
+            raise ValueError("Input error.")
+
+def _sparsify(lf: pl.LazyFrame, intensity_cols: list[str]) -> pl.LazyFrame:
+    # Intensities are unpivoted to (row, sample, intensity) and the non-zero ones gathered back per row
+    sample = pl.Enum(intensity_cols)
+    lf = lf.with_row_index("__row__")
+
+    intensities = (
+        lf.select(["__row__"] + intensity_cols)
+        .unpivot(on=intensity_cols, index="__row__", variable_name="Sample", value_name="Intensity")
+        .filter(pl.col("Intensity").ne(0))
+        .with_columns(pl.col("Sample").cast(sample))
+        .group_by("__row__")
+        .agg(pl.struct("Sample", "Intensity").alias("Intensities"))
+    )
+
+    return (
+        lf.drop(intensity_cols)
+        .join(intensities, on="__row__", how="left", maintain_order="left")
+        .with_columns(pl.col("Intensities").fill_null([]))
+        .drop("__row__")
+    )
+
+def _densify(df: pl.DataFrame, columns: Optional[list[str]] = None, keep: Optional[pl.Expr] = None) -> pl.DataFrame:
+    """
+    Dense table of `columns` (every column if `None`) from a sparse ion table of `_read_ion_sparse()`, for the rows kept by `keep`.
+    Only the intensities of the requested samples are expanded, missing intensities are zero as in `_read_ion()`.
+
+    """
+
+    fields = _sparse_fields(df)
+    samples = cast(pl.Enum, fields["Sample"]).categories.to_list()
+
+    if columns is None:
+        columns = [col for col in df.columns if col != "Intensities"] + samples
+
+    requested = [col for col in columns if col in samples]
+
+    if keep is not None:
+        df = df.filter(keep)
+
+    df = df.with_row_index("__row__")
+
+    wide = (
+        df.select("__row__", "Intensities")
+        .explode("Intensities")
+        .unnest("Intensities")
+        .filter(pl.col("Sample").is_in(requested))
+        .with_columns(pl.col("Sample").cast(pl.String))
+        .pivot(on="Sample", index="__row__", values="Intensity")
+    )
+    # samples without any intensity in the kept rows have no pivoted column
+    wide = wide.select(["__row__"] + [pl.col(col) if col in wide.columns else pl.lit(None, dtype=fields["Intensity"]).alias(col) for col in requested])
+
+    return (
+        df.select(["__row__"] + [col for col in columns if col not in samples])
+        .join(wide, on="__row__", how="left", maintain_order="left")
+        .with_columns(pl.col(requested).fill_null(pl.lit(0.0, dtype=fields["Intensity"])))
+        .select(columns)
+    )
+
+def _sparse_fields(df: pl.DataFrame) -> dict[str, pl.DataType]:
+    # `Intensities` is a list of `{"Sample": Enum, "Intensity": float}` structs
+    intensities = cast(pl.Struct, cast(pl.List, df.schema["Intensities"]).inner)
+
+    return {field.name: cast(pl.DataType, field.dtype) for field in intensities.fields}
+
+def _presence_samples(df: pl.DataFrame) -> list[str]:
+    """
+    Intensity columns of a dense or sparse ion table, in the bit order of its `Presence` column.
+
+    """
+
+    if "Intensities" in df.columns:
+        return cast(pl.Enum, _sparse_fields(df)["Sample"]).categories.to_list()
+
+    return [col for col in df.columns if _is_intensity_column(col)]
+
+def _add_presence(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Add `Presence`, the packed bitmask of the non-zero intensities of every ion across all runs: bit `i % 64` of word
+    `i // 64` is set when the `i`-th column of `_presence_samples()` is quantified.
+    Computed once when the table is parsed, the zero counts of any contrast are then popcounts (`_presence_zero_count()`).
+
+    """
+
+    samples = _presence_samples(df)
+    n_words = max(1, -(-len(samples) // 64))
+
+    if "Intensities" in df.columns:
+        index = pl.element().struct.field("Sample").to_physical()
+        words = [
+            pl.col("Intensities").list.eval(
+                pl.lit(2, dtype=pl.UInt64).pow(index.filter(index.floordiv(64).eq(w)).mod(64).cast(pl.UInt32))
+            ).list.sum().cast(pl.UInt64)
+            for w in range(n_words)
+        ]
+    else:
+        words = [
+            pl.sum_horizontal(
+                [pl.col(col).ne(0).cast(pl.UInt64) * pl.lit(1 << (i % 64), dtype=pl.UInt64) for i, col in enumerate(samples) if i // 64 == w]
+                + [pl.lit(0, dtype=pl.UInt64)]
+            )
+            for w in range(n_words)
+        ]
+
+    return df.with_columns(pl.concat_arr(words).alias("Presence"))
+
+def _presence_zero_count(samples: list[str], cols: list[str], n_rep: int) -> pl.Expr:
+    """
+    Number of zero intensities among `cols` of every row, from the `Presence` bitmask of a table with `samples`.
+
+    """
+
+    masks = [0] * max(1, -(-len(samples) // 64))
+    for col in cols:
+        i = samples.index(col)
+        masks[i // 64] |= 1 << (i % 64)
+
+    present = pl.sum_horizontal(
+        pl.col("Presence").arr.get(w).and_(pl.lit(mask, dtype=pl.UInt64)).bitwise_count_ones()
+        for w, mask in enumerate(masks) if mask
+    )
+
+    return (pl.lit(n_rep, dtype=pl.Int64) - present.cast(pl.Int64)).cast(pl.UInt32)
+
+def _read_trp(path: Path, method: str, intensity_dtype: str = "float64") -> pl.DataFrame:
     match method:
         case "dda":
-            dda_trp_df = pl.read_csv(path.joinpath("combined_protein.tsv"), separator="\t")
-            dda_trp_df = dda_trp_df.with_columns(cs.contains("Intensity").fill_null(strategy="zero"))
+            dda_trp_df = _scan_fragpipe(_resolve_fp_file(path, _DDA_FP_FILES[1]), "dda_protein", intensity_dtype).collect()
 
             return dda_trp_df
         
         case "dia":
             annot = _read_experiment_annotation(path)
 
-            dia_trp_df = pl.read_csv(path.joinpath("dia-quant-output/report.pg_matrix.tsv"), separator="\t")
+            report = _dia_report(path)
+            if report is not None:
+                dia_trp_df = _pivot_diann_report(report, "dia_protein", intensity_dtype, annot)
+            else:
+                dia_trp_df = _scan_fragpipe(_resolve_fp_file(path, _DIA_FP_FILES[2]), "dia_protein", intensity_dtype, annot).collect()
 
             dia_trp_df = _rename_dia_columns(dia_trp_df, annot, "trp")
-            dia_trp_df = dia_trp_df.with_columns(cs.contains("Intensity").fill_null(strategy="zero"))
 
             return dia_trp_df
         
         case _:
             raise ValueError("Input error.")
 
+def _scan_fragpipe(file: Path, fmt: str, intensity_dtype: str, annot: Optional[dict[str, dict[str, str]]] = None) -> pl.LazyFrame:
+    """
+    Lazily scan a FragPipe/DIA-NN table with the dtypes pinned by `_FP_SCHEMAS[fmt]` and no schema inference.
+    Intensity columns (by name, or by run file name when `annot` is given) are decoded with `intensity_dtype` and missing values as zero.
+
+    """
+
+    if intensity_dtype not in _INTENSITY_DTYPES:
+        raise ValueError(
+            f'`data.intensity_dtype` was provided: "{intensity_dtype}". "{intensity_dtype}" is not recognized. Set `data.intensity_dtype` to "float64" or "float32".'
+        )
+
+    schema = _FP_SCHEMAS[fmt]
+    intensity = _INTENSITY_DTYPES[intensity_dtype]
+    runs = list(_file_to_sample_name(annot)) if annot is not None else []
+
+    overrides: dict[str, Any] = {}
+    intensity_cols: list[str] = []
+    for col in _read_header(file):
+        if col in schema["constant"]:
+            overrides[col] = schema["constant"][col]
+
+        elif _is_intensity_column(col, runs):
+            overrides[col] = intensity
+            intensity_cols.append(col)
+
+        else:
+            for suffix, dtype in schema["variable"].items():
+                if col.endswith(suffix):
+                    overrides[col] = dtype
+                    break
+
+    return (
+        pl.scan_csv(file, separator="\t", infer_schema=False, schema_overrides=overrides)
+        .with_columns(pl.col(intensity_cols).fill_null(pl.lit(0.0, dtype=intensity)))
+    )
+
+def _is_intensity_column(col: str, runs: Optional[list[str]] = None) -> bool:
+    return "Intensity" in col or any(run in col for run in runs or [])
+
+def _resolve_fp_file(path: Path, file: str) -> Path:
+    """
+    Locate `file` in the FragPipe output directory `path`, accepting the compressed variants in `_FP_COMPRESSION_SUFFIXES`.
+    The plain path is returned if no variant exists.
+
+    """
+
+    for suffix in _FP_COMPRESSION_SUFFIXES:
+        candidate = path.joinpath(file + suffix)
+        if candidate.exists():
+            return candidate
+
+    return path.joinpath(file)
+
+def _dia_report(path: Path) -> Optional[Path]:
+    """
+    The DIA-NN `report.parquet` of a FragPipe DIA output directory, `None` if only the TSV matrices were written.
+
+    """
+
+    report = path.joinpath(_DIA_DIANN_REPORT)
+
+    return report if report.exists() else None
+
+def _pivot_diann_report(file: Path, fmt: str, intensity_dtype: str, annot: dict[str, dict[str, str]]) -> pl.DataFrame:
+    """
+    Rebuild a DIA-NN matrix (`fmt` is "dia_precursor" or "dia_protein") from the long `report.parquet`.
+    The scan only reads the identifier, `Run`, quantity and q-value columns, keeps rows at `_DIA_DIANN_REPORT_QVALUE` as DIA-NN
+    does for its matrices, and pivots the runs into one column per run file, sorted on the identifier columns.
+    Runs of `annot` without any row are zero.
+
+    """
+
+    long, constant, quantity = _scan_diann_report(file, fmt, intensity_dtype)
+    intensity = _INTENSITY_DTYPES[intensity_dtype]
+
+    # the report is laid out by run, rows are sorted so the matrix does not depend on its layout
+    df = (
+        _match_diann_runs(long.collect(), file, annot)
+        .pivot(on="Run", index=constant, values=quantity, aggregate_function="first")
+        .sort(constant, nulls_last=True)
+    )
+
+    runs = [col for col in df.columns if col not in constant]
+    missing = [run for run in _file_to_sample_name(annot) if run not in runs]
+
+    return df.with_columns(
+        pl.col(runs).cast(intensity).fill_null(pl.lit(0.0, dtype=intensity)),
+        *[pl.lit(0.0, dtype=intensity).alias(run) for run in missing],
+    )
+
+def _sparse_diann_report(file: Path, fmt: str, intensity_dtype: str, annot: dict[str, dict[str, str]]) -> pl.DataFrame:
+    """
+    `_pivot_diann_report()` in the sparse layout of `_read_ion_sparse()`, grouped from the long report without a pivot.
+    Columns are renamed as `_rename_dia_columns()` does; `Sample` includes the runs of `annot` without any row.
+
+    """
+
+    long, constant, quantity = _scan_diann_report(file, fmt, intensity_dtype)
+    intensity = _INTENSITY_DTYPES[intensity_dtype]
+
+    rows = _match_diann_runs(long.unique(constant + ["Run"], keep="first", maintain_order=True).collect(), file, annot)
+
+    runs: list[str] = list(_file_to_sample_name(annot)) + [run for run in rows["Run"].unique(maintain_order=True).to_list() if run not in _file_to_sample_name(annot)]
+    rename = _dia_rename_map(runs + constant, annot)
+    sample = pl.Enum(list(dict.fromkeys(rename.get(run, run) for run in runs)))
+
+    return (
+        rows.group_by(constant, maintain_order=True)
+        .agg(
+            pl.struct(
+                pl.col("Run").replace_strict({run: rename.get(run, run) for run in runs}, return_dtype=sample).alias("Sample"),
+                pl.col(quantity).cast(intensity).alias("Intensity"),
+            ).filter(pl.col(quantity).is_not_null() & pl.col(quantity).ne(0)).alias("Intensities")
+        )
+        .sort(constant, nulls_last=True)
+        .rename({col: rename[col] for col in constant if col in rename})
+    )
+
+def _match_diann_runs(long: pl.DataFrame, file: Path, annot: dict[str, dict[str, str]]) -> pl.DataFrame:
+    """
+    Replace the `Run` names of the report with the run files of `annot`. FragPipe annotates the full path of every run
+    while DIA-NN reports its file name only, both are matched on the file stem.
+
+    """
+
+    files = {_run_stem(run): run for run in annot}
+    runs = {run: files[_run_stem(run)] for run in long["Run"].unique().to_list() if _run_stem(run) in files}
+
+    if not runs:
+        raise ValueError(
+            f'No run of "{file}" is annotated in experiment_annotation.tsv. Runs of the report: {sorted(long["Run"].unique().to_list())}. Annotated runs: {list(annot)}.'
+        )
+
+    return long.with_columns(pl.col("Run").replace(runs))
+
+def _run_stem(run: str) -> str:
+    # Windows paths are annotated with backslashes
+    return run.replace("\\", "/").split("/").pop().split(".").pop(0)
+
+def _scan_diann_report(file: Path, fmt: str, intensity_dtype: str) -> tuple[pl.LazyFrame, list[str], str]:
+    """
+    Long rows of the report kept for the `fmt` matrix, with the identifier columns and the name of the quantity column.
+
+    """
+
+    if intensity_dtype not in _INTENSITY_DTYPES:
+        raise ValueError(
+            f'`data.intensity_dtype` was provided: "{intensity_dtype}". "{intensity_dtype}" is not recognized. Set `data.intensity_dtype` to "float64" or "float32".'
+        )
+
+    matrix = _DIA_DIANN_REPORT_MATRICES[fmt]
+
+    report_cols = pl.scan_parquet(file).collect_schema().names()
+    constant = {col: dtype for col, dtype in _FP_SCHEMAS[fmt]["constant"].items() if col in report_cols}
+    qvalues = [col for col in matrix["qvalues"] if col in report_cols]
+
+    long = (
+        pl.scan_parquet(file)
+        .select(list(constant) + ["Run", matrix["quantity"]] + qvalues)
+        .filter(pl.all_horizontal([pl.col(col).le(_DIA_DIANN_REPORT_QVALUE) for col in qvalues] + [pl.lit(True)]))
+        .with_columns(
+            pl.col(col).cast(dtype) for col, dtype in constant.items()
+        )
+    )
+
+    return long, list(constant), matrix["quantity"]
+
+def _diann_report_header(file: Path, fmt: str, annot: dict[str, dict[str, str]]) -> list[str]:
+    """
+    Column names produced by `_pivot_diann_report()` for the runs of `annot`, from the parquet schema only.
+
+    """
+
+    report_cols = pl.scan_parquet(file).collect_schema().names()
+
+    return [col for col in _FP_SCHEMAS[fmt]["constant"] if col in report_cols] + list(_file_to_sample_name(annot))
+
+def _read_header(file: Path) -> list[str]:
+    # Compressed files are streamed up to the end of the header line, the polars CSV reader would inflate them whole
+    with _open_text(file) as f:
+        header = f.readline()
+
+    return header.rstrip("\r\n").split("\t")
+
+def _open_text(file: Path) -> IO[str]:
+    match file.suffix:
+        case ".gz":
+            return gzip.open(file, "rt")
+        case ".zst":
+            return zstandard.open(file, "rt")
+        case _:
+            return open(file, "r")
+
+def _ion_header(path: Path, method: str) -> list[str]:
+    """
+    Column names produced by `_read_ion()`, resolved from the file headers only.
+
+    """
+
+    match method:
+        case "dda":
+            return _read_header(_resolve_fp_file(path, _DDA_FP_FILES[0]))
+
+        case "dia":
+            annot = _read_experiment_annotation(path)
+
+            report = _dia_report(path)
+            if report is not None:
+                dia_cols = _diann_report_header(report, "dia_precursor", annot)
+            else:
+                dia_cols = _read_header(_resolve_fp_file(path, _DIA_FP_FILES[1]))
+            dia_cols = [_dia_rename_map(dia_cols, annot).get(col, col) for col in dia_cols]
+
+            fp_cols = _read_header(_resolve_fp_file(path, _DIA_FP_FILES[0]))
+            fp_cols = [_DIA_RENAME_FP_ION.get(col, col) for col in _DIA_FP_CONSTANT_ION_COLUMNS if col in fp_cols]
+
+            return dia_cols + [col for col in fp_cols if col not in dia_cols]
+
+        case _:
+            raise ValueError("Input error.")
+
+def _trp_header(path: Path, method: str) -> list[str]:
+    """
+    Column names produced by `_read_trp()`, resolved from the file headers only.
+
+    """
+
+    match method:
+        case "dda":
+            return _read_header(_resolve_fp_file(path, _DDA_FP_FILES[1]))
+
+        case "dia":
+            annot = _read_experiment_annotation(path)
+
+            report = _dia_report(path)
+            if report is not None:
+                dia_cols = _diann_report_header(report, "dia_protein", annot)
+            else:
+                dia_cols = _read_header(_resolve_fp_file(path, _DIA_FP_FILES[2]))
+
+            return [_dia_rename_map(dia_cols, annot, "trp").get(col, col) for col in dia_cols]
+
+        case _:
+            raise ValueError("Input error.")
+
 def _read_experiment_annotation(path: Path) -> dict[str, dict[str, str]]:
     df = pl.read_csv(
-        path.joinpath("experiment_annotation.tsv"), 
+        _resolve_fp_file(path, "experiment_annotation.tsv"),
         separator="\t"
     )
 
@@ -80,11 +506,12 @@ def _file_to_sample_name(annot: dict[str, dict[str, str]]) -> dict[str, str]:
     return {file: data.get("Sample Name", "") for file, data in annot.items()}
 
 def _rename_dia_columns(df: pl.DataFrame, annot: dict[str, dict[str, str]], data_type: str = "ion") -> pl.DataFrame:
+    return df.rename(_dia_rename_map(df.columns, annot, data_type))
+
+def _dia_rename_map(cols: list[str], annot: dict[str, dict[str, str]], data_type: str = "ion") -> dict[str, str]:
     other_cols = _DIA_RENAME_DIANN_ION
     if data_type != "ion":
         other_cols =_DIA_RENAME_DIANN_PROTEIN
-    
-    cols = df.columns
 
     rename = {}
     for file, sample in _file_to_sample_name(annot).items():
@@ -92,7 +519,9 @@ def _rename_dia_columns(df: pl.DataFrame, annot: dict[str, dict[str, str]], data
             if file in col:
                 rename.update({col: f"{sample} Intensity"})
 
-    return df.rename(rename).rename(other_cols)
+    rename.update({col: other_cols[col] for col in cols if col in other_cols and col not in rename})
+
+    return rename
 
 def _add_dia_ion_data(dia_df: pl.DataFrame, ion_df: pl.DataFrame) -> pl.DataFrame:
         dia_df = dia_df.with_columns(
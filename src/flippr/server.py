@@ -0,0 +1,305 @@
+import ipaddress
+import json
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+from urllib.parse import urlsplit
+
+from . import datatypes as _types
+from . import validate as _validate
+from .parameters import rcParams as _rcParams
+
+if TYPE_CHECKING:
+    from . import Study
+
+# Study inputs: (lip, trp, method)
+_StudyKey = tuple[str, Optional[str], str]
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765) -> None:
+    """
+    Run a local analysis server that keeps studies and their parsed FragPipe tables in memory between requests,
+    so repeated contrasts on the same FragPipe outputs skip parsing and start-up. Blocks until interrupted.
+
+    Studies are kept for the `server.max_studies` most recently used inputs (the tables of each study are bounded by
+    `store.memory_budget`), at most `server.max_concurrent` processes run at the same time and requests waiting longer
+    than `server.queue_timeout` seconds for a free slot are rejected with `503`.
+
+    Endpoints (JSON):
+
+    - `POST /run` : `{"lip", "trp", "method", "processes": [{"pid", "lip_ctrl", "lip_test", "n_rep", "trp_ctrl", "trp_test", "trp_n_rep"}], "tables", "rcParams", "output_dir"}`
+      runs the processes and returns `{"results": {pid: {table: rows}}}`, or the paths of parquet files when `output_dir` is set
+    - `GET /studies` : studies held in memory and the bytes of their tables
+    - `DELETE /studies` : release every study
+
+    Requests must be sent to the bound address (`Host`), from no or a same-origin page (`Origin`), and `POST` bodies with
+    `Content-Type: application/json`, so web pages opened in a browser on the same machine cannot submit requests.
+
+    Args:
+        host (str): Interface to bind, the server has no authentication and should stay on the loopback interface. Defaults to `127.0.0.1`.
+        port (int): Port to listen on. Defaults to `8765`.
+
+    Examples:
+        Start the server, then submit contrasts from any client
+        >>> flippr.serve(port=8765)
+
+        >>> requests.post("http://127.0.0.1:8765/run", json={"lip": "LiP_LFQ", "processes": [{"pid": "drug", "lip_ctrl": "WT", "lip_test": "Drug", "n_rep": 3}]})
+
+    """
+
+    server = _make_server(host, port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _make_server(host: str, port: int) -> "_Server":
+    return _Server((host, port), _Handler)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], handler: type[BaseHTTPRequestHandler]) -> None:
+        super().__init__(address, handler)
+
+        self._lock = threading.Lock()
+        self._studies: OrderedDict[_StudyKey, "Study"] = OrderedDict()
+        self._study_locks: dict[_StudyKey, threading.Lock] = {}
+        self._slots = threading.BoundedSemaphore(_rcParams.get("server.max_concurrent", 2))
+
+    def study(self, lip: str, trp: Optional[str], method: str, rcParams: dict[str, Any]) -> "Study":
+        """
+        Return the study of the inputs, creating it if it is not held yet, with its FragPipe tables parsed once for the
+        parsing options of `rcParams`.
+
+        """
+
+        from . import Study
+
+        key = (str(Path(lip).resolve()), str(Path(trp).resolve()) if trp is not None else None, method)
+
+        with self._lock:
+            lock = self._study_locks.setdefault(key, threading.Lock())
+
+        # Requests for the same inputs wait for a single parse
+        with lock:
+            with self._lock:
+                study = self._studies.get(key)
+
+            if study is None:
+                study = Study(lip, trp, method)
+
+            # Tables already parsed with the same `data.*` rcParams are held by the study store
+            _types._read_raw(study._store, "ion", study.lip, study.method, rcParams)
+            if study.trp is not None:
+                _types._read_raw(study._store, "trp", study.trp, study.method, rcParams)
+
+            with self._lock:
+                self._studies[key] = study
+                self._studies.move_to_end(key)
+                # Least recently used studies are released first, running requests keep their reference
+                while len(self._studies) > max(1, _rcParams.get("server.max_studies", 4)):
+                    evicted, _ = self._studies.popitem(last=False)
+                    self._study_locks.pop(evicted, None)
+
+        return study
+
+    def run(self, request: dict[str, Any]) -> dict[str, Any]:
+        _validate._validate_server_request(request)
+
+        rcParams = {**_rcParams, **request.get("rcParams", {})}
+        study = self.study(request["lip"], request.get("trp"), request.get("method", "dda"), rcParams)
+        tables = request.get("tables", ["cut_site"])
+        output_dir = request.get("output_dir")
+
+        results: dict[str, dict[str, Any]] = {}
+        for process in request["processes"]:
+            proc = _types.Process(
+                rcParams,
+                study.lip,
+                study.trp,
+                study.method,
+                process["pid"],
+                process["lip_ctrl"],
+                process["lip_test"],
+                _replicate(process["n_rep"]),
+                process.get("trp_ctrl"),
+                process.get("trp_test"),
+                _replicate(process.get("trp_n_rep")),
+                study._store,
+            )
+
+            if not self._slots.acquire(timeout=_rcParams.get("server.queue_timeout", 600.0)):
+                raise TimeoutError("The server is busy. Retry later or increase `server.max_concurrent`.")
+
+            try:
+                result = proc.run()
+            finally:
+                self._slots.release()
+
+            results[process["pid"]] = {table: _export(result, table, output_dir) for table in tables}
+
+        return {"results": results}
+
+    def usage(self) -> list[dict[str, Any]]:
+        with self._lock:
+            studies = list(self._studies.items())
+
+        return [
+            {"lip": lip, "trp": trp, "method": method, "bytes": study._store.nbytes}
+            for (lip, trp, method), study in studies
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._studies.clear()
+            self._study_locks.clear()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self) -> None:
+        if (refused := self._refused()) is not None:
+            return self._send(*refused)
+
+        if self.path.rstrip("/") != "/studies":
+            return self._send(HTTPStatus.NOT_FOUND, {"error": f'"{self.path}" is not recognized.'})
+
+        self._send(HTTPStatus.OK, {"studies": self.server.usage()})
+
+    def do_DELETE(self) -> None:
+        if (refused := self._refused()) is not None:
+            return self._send(*refused)
+
+        if self.path.rstrip("/") != "/studies":
+            return self._send(HTTPStatus.NOT_FOUND, {"error": f'"{self.path}" is not recognized.'})
+
+        self.server.clear()
+        self._send(HTTPStatus.OK, {"studies": []})
+
+    def do_POST(self) -> None:
+        if (refused := self._refused(json_body=True)) is not None:
+            return self._send(*refused)
+
+        if self.path.rstrip("/") != "/run":
+            return self._send(HTTPStatus.NOT_FOUND, {"error": f'"{self.path}" is not recognized.'})
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            self._send(HTTPStatus.OK, self.server.run(request))
+        except TimeoutError as e:
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)})
+        except (json.JSONDecodeError, TypeError, ValueError, KeyError, FileNotFoundError) as e:
+            self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+
+    def _refused(self, json_body: bool = False) -> Optional[tuple[HTTPStatus, dict[str, Any]]]:
+        # Browsers send requests to the loopback interface on behalf of any page. A foreign name resolved to the bound address
+        # (DNS rebinding) is refused on `Host`, a cross-origin page on `Origin`, and a cross-origin form, which cannot set a
+        # JSON `Content-Type` without a CORS preflight the server never answers, on `Content-Type`
+        host, port = self.server.server_address[:2]
+        address = (str(host), int(port))
+
+        if not _is_bound_name(self.headers.get("Host"), address):
+            return HTTPStatus.FORBIDDEN, {"error": f'The request was sent to "{self.headers.get("Host")}". Send requests to the bound address.'}
+
+        origin = self.headers.get("Origin")
+        if origin is not None and (urlsplit(origin).scheme != "http" or not _is_bound_name(urlsplit(origin).netloc, address)):
+            return HTTPStatus.FORBIDDEN, {"error": f'The request was sent from "{origin}". Cross-origin requests are not accepted.'}
+
+        content_type = self.headers.get("Content-Type", "")
+        if json_body and content_type.split(";")[0].strip().lower() != "application/json":
+            return HTTPStatus.UNSUPPORTED_MEDIA_TYPE, {"error": f'The request was sent with `Content-Type` "{content_type}". Send a JSON body with `Content-Type: application/json`.'}
+
+        return None
+
+    def _send(self, status: HTTPStatus, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Requests are not logged to stderr
+        pass
+
+
+def _is_bound_name(netloc: Optional[str], address: tuple[str, int]) -> bool:
+    """
+    Whether the `Host` or `Origin` authority `netloc` names the bound `address`: the bound host itself, `localhost` and the
+    loopback addresses for a loopback bind, and any address literal for a wildcard bind. Other names are refused since they
+    can be resolved to the bound address by anyone.
+
+    """
+
+    if not netloc:
+        return False
+
+    try:
+        url = urlsplit(f"//{netloc}")
+        name, port = url.hostname, url.port or 80
+    except ValueError:
+        return False
+
+    host, bound_port = address
+    if name is None or port != bound_port:
+        return False
+
+    ip, bound_ip = _ip_address(name), _ip_address(host)
+    if name == host.lower() or (ip is not None and ip == bound_ip):
+        return True
+
+    loopback = host.lower() == "localhost" or (bound_ip is not None and bound_ip.is_loopback)
+    unspecified = bound_ip is not None and bound_ip.is_unspecified
+
+    if name == "localhost" or (ip is not None and ip.is_loopback):
+        return loopback or unspecified
+
+    return ip is not None and unspecified
+
+def _ip_address(name: str) -> Optional[ipaddress.IPv4Address | ipaddress.IPv6Address]:
+    try:
+        return ipaddress.ip_address(name)
+    except ValueError:
+        return None
+
+
+def _replicate(n_rep: Any) -> Any:
+    # JSON arrays to the tuples accepted by `Study().add_process()`
+    if isinstance(n_rep, list):
+        return tuple(_replicate(n) for n in n_rep)
+
+    return n_rep
+
+
+def _export(result: "_types.Result", table: str, output_dir: Optional[str]) -> Any:
+    df = result.residue_profile() if table == "residue_profile" else getattr(result, table)
+
+    if df is None:
+        return None
+
+    if output_dir is None:
+        return json.loads(df.write_json())
+
+    path = Path(output_dir).joinpath(f"{result._pid}.{table}.parquet")
+    # `pid` is validated as a file name, the resolved path is checked as well since the request comes from a client
+    if not path.resolve().is_relative_to(Path(output_dir).resolve()):
+        raise ValueError(f'The "pid" was provided: "{result._pid}". Set "pid" to a name without path separators.')
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.write_parquet(path)
+
+    return str(path)
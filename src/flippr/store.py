@@ -0,0 +1,183 @@
+import itertools
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import polars as pl
+
+_NAMESPACE_IDS = itertools.count()
+
+
+class ResultStore:
+    """
+    Study-wide store for the tables held by each `Result`.
+    Tables are kept in memory up to `store.memory_budget` bytes; least recently used tables are then evicted.
+    Base tables (ions, TrP proteins) are always spilled to disk, derived tables are either recomputed on demand
+    (`store.eviction` = "recompute") or spilled as well ("spill").
+
+    """
+
+    def __init__(self, rcParams: dict[str, Any]) -> None:
+        self._rcParams: dict[str, Any] = rcParams
+        self._lock = threading.RLock()
+        self._spill_dir: Optional[tempfile.TemporaryDirectory] = None
+
+        # key -> {"df": DataFrame | None, "path": Path | None, "spill": bool, "size": int}
+        self._entries: OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+        # key -> recomputation in progress, awaited by every other thread requesting the key
+        self._inflight: dict[tuple[str, str], Future[pl.DataFrame]] = {}
+
+    def _namespace(self, pid: str) -> str:
+        return f"{pid}#{next(_NAMESPACE_IDS)}"
+
+    @property
+    def budget(self) -> Optional[int]:
+        return self._rcParams.get("store.memory_budget", None)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values() if entry["df"] is not None)
+
+    def put(self, key: tuple[str, str], df: pl.DataFrame, spill: bool = False) -> None:
+        """
+        Store `df` under `key`. `spill` marks tables that cannot be recomputed and must be written to disk when evicted.
+
+        """
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = {"df": df, "path": None, "spill": spill, "size": df.estimated_size()}
+            self._enforce_budget(keep=key)
+
+    def get(self, key: tuple[str, str], recompute: Optional[Callable[[], pl.DataFrame]] = None) -> pl.DataFrame:
+        """
+        Return the table stored under `key`, reloading it from disk or calling `recompute()` if it was evicted.
+        `recompute()` runs outside the lock and only once per key at a time, concurrent requests wait for its result.
+
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry["df"] is not None:
+                self._entries.move_to_end(key)
+                return entry["df"]
+
+            if entry is not None and entry["path"] is not None:
+                df = pl.read_ipc(entry["path"])
+                entry.update({"df": df, "size": df.estimated_size()})
+                self._entries.move_to_end(key)
+                self._enforce_budget(keep=key)
+                return df
+
+            future = self._inflight.get(key)
+            if future is None and recompute is None:
+                raise KeyError(f"`{key}` is not in the store and cannot be recomputed.")
+
+            owner = future is None
+            if future is None:
+                future = self._inflight[key] = Future()
+
+        if owner and recompute is not None:
+            return self._recompute(key, recompute, future)
+
+        return future.result()
+
+    def _recompute(self, key: tuple[str, str], recompute: Callable[[], pl.DataFrame], future: Future[pl.DataFrame]) -> pl.DataFrame:
+        try:
+            df = recompute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self.put(key, df)
+            del self._inflight[key]
+        future.set_result(df)
+
+        return df
+
+    def get_optional(self, key: tuple[str, str]) -> Optional[pl.DataFrame]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+        return self.get(key)
+
+    def discard(self, key: tuple[str, str]) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key: tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry["path"] is not None:
+            entry["path"].unlink(missing_ok=True)
+
+    def _discard_namespace(self, namespace: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == namespace]:
+                self._discard(key)
+
+    def _enforce_budget(self, keep: tuple[str, str]) -> None:
+        budget = self.budget
+        if budget is None:
+            return
+
+        eviction = self._rcParams.get("store.eviction", "recompute")
+        if eviction not in ["recompute", "spill"]:
+            raise ValueError(
+                f'`store.eviction` was provided: "{eviction}". "{eviction}" is not recognized. Set `store.eviction` to "recompute" or "spill".'
+            )
+
+        # Least recently used first, the table being accessed is never evicted
+        nbytes = self.nbytes
+        for key in list(self._entries):
+            if nbytes <= budget:
+                break
+
+            entry = self._entries[key]
+            if key == keep or entry["df"] is None:
+                continue
+
+            nbytes -= entry["size"]
+
+            if entry["spill"] or eviction == "spill":
+                if entry["path"] is None:
+                    entry["path"] = self._spill_path(key)
+                    entry["df"].write_ipc(entry["path"], compression="uncompressed")
+                entry["df"] = None
+            else:
+                del self._entries[key]
+
+    def _spill_path(self, key: tuple[str, str]) -> Path:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.TemporaryDirectory(
+                prefix="flippr_", dir=self._rcParams.get("store.spill_dir", None)
+            )
+
+        return Path(self._spill_dir.name).joinpath(f"{key[0]}.{key[1]}.arrow".replace("/", "_"))
+
+    def _usage(self, namespace: Optional[str] = None) -> pl.DataFrame:
+        with self._lock:
+            rows = [
+                (
+                    key[0],
+                    key[1],
+                    entry["size"] if entry["df"] is not None else 0,
+                    "memory" if entry["df"] is not None else "disk",
+                )
+                for key, entry in self._entries.items()
+                if namespace is None or key[0] == namespace
+            ]
+
+        return pl.DataFrame(
+            rows,
+            schema={"Namespace": pl.String, "Table": pl.String, "Bytes": pl.Int64, "State": pl.String},
+            orient="row",
+        )
@@ -0,0 +1,118 @@
+import copy
+import itertools
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+from typing import Any, Optional
+
+import polars as pl
+
+from . import combine as _combine
+from . import functions as _functions
+from . import datatypes as _types
+from .parameters import _SWEEP_STAGES, _SWEEP_STAGE_ORDER
+
+# Combined tables summarized at every grid point, as named in `Result().protein_summary`
+_SWEEP_LEVELS: dict[str, str] = {
+    "Modified Peptides": "MODIFIED PEPTIDE",
+    "Peptides": "PEPTIDE",
+    "Cut Sites": "CUT SITE",
+}
+
+_NORMALIZED_COLUMNS: list[str] = ["Normalization Factor", "Normalized FC", "Log2 Normalized FC"]
+
+
+def _sweep(processes: dict[str, "_types.Process"],
+           grid: dict[str, list[Any]],
+           rcParams: dict[str, Any],
+           executor: Optional[Executor] = None,
+) -> pl.DataFrame:
+    """
+    Evaluate every process over the cartesian product of `grid`.
+    Ion statistics are computed once per distinct value of the "ion" stage keys, TrP normalization and combined tables
+    once per distinct value of the "normalize" stage keys, and only the significance counts are repeated per grid point.
+
+    """
+
+    combos = {stage: _stage_combos(grid, stage) for stage in _SWEEP_STAGE_ORDER}
+
+    pool = executor if executor is not None else ThreadPoolExecutor(max_workers=rcParams.get("run.n_workers", None))
+
+    try:
+        upstream: dict[Future, tuple[str, dict[str, Any]]] = {
+            pool.submit(_sweep_ion, proc, {**rcParams, **ion}): (pid, ion)
+            for pid, proc in processes.items()
+            for ion in combos["ion"]
+        }
+
+        downstream: list[Future] = []
+        for future in as_completed(upstream):
+            pid, ion = upstream.pop(future)
+            result = future.result()
+
+            downstream.extend(
+                pool.submit(_sweep_downstream, pid, result, {**rcParams, **ion, **norm}, {**ion, **norm}, combos["summary"])
+                for norm in combos["normalize"]
+            )
+            del future, result
+
+        rows = [row for future in downstream for row in future.result()]
+
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+
+    return pl.DataFrame(rows).sort(["Process"] + list(grid), maintain_order=True)
+
+
+def _stage_combos(grid: dict[str, list[Any]], stage: str) -> list[dict[str, Any]]:
+    keys = [key for key in grid if _SWEEP_STAGES[key] == stage]
+
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[key] for key in keys])]
+
+
+def _sweep_ion(proc: "_types.Process", rcParams: dict[str, Any]) -> "_types.Result":
+    # A shallow copy shares the replicate columns and the study store (and its parsed tables) with `proc`
+    proc = copy.copy(proc)
+    proc._rcParams = rcParams
+
+    return proc.run()
+
+
+def _sweep_downstream(pid: str,
+                      result: "_types.Result",
+                      rcParams: dict[str, Any],
+                      params: dict[str, Any],
+                      summary_combos: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+
+    ion = result._ion
+    fc = result._fc
+
+    row: dict[str, Any] = {"No. of Ions": ion.height}
+
+    if fc == "Normalized FC":
+        assert result._trp_norm is not None
+        ion = _functions._normalize_ratios(ion.drop(_NORMALIZED_COLUMNS), result._trp_norm, rcParams)
+        ion = _functions._log2(ion, fc)
+
+        row["No. of Normalized Proteins"] = (
+            ion.filter(pl.col("Normalization Factor").gt(0))["Protein ID"].n_unique()
+        )
+
+    tables = {by: _combine.combine_by(ion, by=level, fc=fc) for by, level in _SWEEP_LEVELS.items()}
+
+    rows = []
+    for summary in summary_combos:
+        out = {"Process": pid, **params, **summary, **row}
+
+        for by, df in tables.items():
+            counts = _combine.summary_by(df, by=by, fc=fc, rcParams={**rcParams, **summary})
+            out.update(counts.drop("Protein ID").sum().row(0, named=True))
+
+            if by == "Cut Sites":
+                out["No. of Proteins with Significant Cut Sites (Adj. P-value)"] = (
+                    counts.filter(pl.col("No. of Significant Cut Sites (Adj. P-value)").gt(0)).height
+                )
+
+        rows.append(out)
+
+    return rows
@@ -1,8 +1,9 @@
 from pathlib import Path
 from warnings import warn
-from typing import Optional, Literal, cast
+from typing import Any, Optional, Literal, cast
 
-from .parameters import _DDA_FP_FILES, _DIA_FP_FILES
+from . import reader as _reader
+from .parameters import _DDA_FP_FILES, _DIA_FP_FILES, _DIA_DIANN_REPORT, _DOSE_MODEL_MIN_DOSES, _SWEEP_STAGES, _SERVER_TABLES, rcParams
 
 def _validate_study(
     lip: str | Path, 
@@ -71,19 +72,183 @@ def __validate_fragpipe_files(path: Path, method: str) -> None:
     """
 
     if method == "dda":
-        if not all([path.joinpath(f).exists() for f in _DDA_FP_FILES]):
+        if not all([_reader._resolve_fp_file(path, f).exists() for f in _DDA_FP_FILES]):
             raise FileNotFoundError(
-                f'Files not found in "{path}". The FragPipe output directory path should minimally contain: \n'
+                f'Files not found in "{path}". The FragPipe output directory path should minimally contain (optionally compressed as `.gz` or `.zst`): \n'
                 + "\t\n".join([f"`{f}`" for f in _DDA_FP_FILES])
             )
 
     if method == "dia":
-        if not all([path.joinpath(f).exists() for f in _DIA_FP_FILES]):
+        # the DIA-NN report replaces both DIA-NN matrices
+        files = _DIA_FP_FILES
+        if _reader._dia_report(path) is not None:
+            files = [f for f in _DIA_FP_FILES if not f.startswith("dia-quant-output/")]
+
+        if not all([_reader._resolve_fp_file(path, f).exists() for f in files]):
             raise FileNotFoundError(
-                f'Files not found in "{path}". The FragPipe output directory path should minimally contain: \n'
+                f'Files not found in "{path}". The FragPipe output directory path should minimally contain (optionally compressed as `.gz` or `.zst`): \n'
                 + "\t\n".join([f"`{f}`" for f in _DIA_FP_FILES])
+                + f"\nThe DIA-NN matrices can be replaced by `{_DIA_DIANN_REPORT}`."
+            )
+
+
+def _validate_process_columns(
+    lip: Path,
+    trp: Optional[Path],
+    method: str,
+    ion_columns: list[str],
+    trp_columns: Optional[list[str]],
+) -> None:
+    """
+    Validate that the FragPipe outputs contain every column required by a process before any data is loaded.
+    Only the header line of each file is read. All missing columns are reported together.
+
+    """
+
+    problems: list[str] = []
+
+    lip_header = set(_reader._ion_header(lip, method))
+    lip_missing = [col for col in ion_columns if col not in lip_header]
+    if lip_missing:
+        problems.append(
+            f'LiP output "{lip}" is missing: ' + ", ".join([f"`{col}`" for col in lip_missing])
+        )
+
+    if trp is not None and trp_columns is not None:
+        trp_header = set(_reader._trp_header(trp, method))
+        trp_missing = [col for col in trp_columns if col not in trp_header]
+        if trp_missing:
+            problems.append(
+                f'TrP output "{trp}" is missing: ' + ", ".join([f"`{col}`" for col in trp_missing])
+            )
+
+    if problems:
+        raise ValueError(
+            "Columns required by the process were not found. Check the sample names and replicates against `Study().samples`.\n"
+            + "\n".join([f"\t{problem}" for problem in problems])
+        )
+
+
+def _validate_sweep_grid(grid: dict[str, list]) -> None:
+    """
+    Validate the rcParams grid of a parameter sweep.
+
+    """
+
+    if not isinstance(grid, dict) or len(grid) == 0:
+        raise TypeError(
+            f'`grid` was provided with type `{type(grid)}`. Set `grid` to a non-empty `dict` of rcParams keys to lists of values.'
+        )
+
+    for key, values in grid.items():
+        if key not in _SWEEP_STAGES:
+            raise ValueError(
+                f'`grid` contains "{key}". "{key}" cannot be swept. Keys that can be swept are: '
+                + ", ".join([f'"{k}"' for k in _SWEEP_STAGES])
             )
 
+        if not isinstance(values, (list, tuple)) or len(values) == 0:
+            raise ValueError(f'`grid["{key}"]` was provided: "{values}". Set `grid["{key}"]` to a non-empty list of values.')
+
+
+def _validate_server_request(request: dict) -> None:
+    """
+    Validate the JSON body of a `flippr.serve()` run request.
+
+    """
+
+    if not isinstance(request, dict):
+        raise TypeError(f'The request was provided with type `{type(request)}`. Send a JSON object.')
+
+    if not isinstance(request.get("lip"), str):
+        raise ValueError('The request has no "lip". Set "lip" to the FragPipe LFQ output directory of the LiP experiment.')
+
+    processes = request.get("processes")
+    if not isinstance(processes, list) or len(processes) == 0:
+        raise ValueError('The request has no "processes". Set "processes" to a non-empty list of `Study().add_process()` arguments.')
+
+    for process in processes:
+        missing = [key for key in ["pid", "lip_ctrl", "lip_test", "n_rep"] if not isinstance(process, dict) or key not in process]
+        if missing:
+            raise ValueError(
+                f'A process was provided: "{process}". Processes must set '
+                + ", ".join([f'"{key}"' for key in missing])
+            )
+
+    pids = [process["pid"] for process in processes]
+    for pid in pids:
+        # Output files are named after the pid
+        if not isinstance(pid, str) or pid in ["", ".", ".."] or any(sep in pid for sep in ["/", "\\", "\0"]):
+            raise ValueError(f'"processes" contains "pid": "{pid}". Set "pid" to a name without path separators.')
+
+    if len(set(pids)) != len(pids):
+        raise ValueError(f'"processes" contains duplicated "pid": {pids}. Set a unique "pid" for every process.')
+
+    for table in request.get("tables", []):
+        if table not in _SERVER_TABLES:
+            raise ValueError(
+                f'"tables" contains "{table}". "{table}" is not recognized. Set "tables" to any of: '
+                + ", ".join([f'"{t}"' for t in _SERVER_TABLES])
+            )
+
+    for key in request.get("rcParams", {}):
+        # Server, store and worker settings are shared by every client of the server
+        if key not in rcParams or key.startswith(("server.", "store.", "run.")):
+            raise ValueError(f'"rcParams" contains "{key}". "{key}" is not a pipeline rcParams key.')
+
+    output_dir = request.get("output_dir")
+    if output_dir is not None:
+        output_root = rcParams["server.output_root"]
+        if output_root is None:
+            raise ValueError(
+                f'The request was provided "output_dir": "{output_dir}". Set `server.output_root` when starting '
+                'the server to export parquet files, or omit "output_dir" to receive JSON rows.'
+            )
+
+        # The resolved path is checked since the request comes from a client
+        if not isinstance(output_dir, str) or not Path(output_dir).resolve().is_relative_to(Path(output_root).resolve()):
+            raise ValueError(
+                f'The request was provided "output_dir": "{output_dir}". Set "output_dir" to a directory inside '
+                f'`server.output_root`: "{output_root}".'
+            )
+
+
+def _validate_dose_response(doses: dict[str, float], n_rep: Any, model: str, min_doses: Optional[int]) -> int:
+    """
+    Validate a dose-response design and return the number of quantified doses required to fit a curve.
+
+    """
+
+    if model not in _DOSE_MODEL_MIN_DOSES:
+        raise ValueError(
+            f'`model` was provided: "{model}". "{model}" is not recognized. Set `model` to "sigmoid" or "log-linear".'
+        )
+
+    if not isinstance(n_rep, int):
+        raise ValueError(
+            f'`n_rep` was provided: {n_rep}. Set `n_rep` to the number of replicates in every condition.'
+        )
+
+    if any(conc <= 0 for conc in doses.values()):
+        raise ValueError(f'`doses` was provided: {doses}. Dose concentrations must be positive.')
+
+    model_min = _DOSE_MODEL_MIN_DOSES[model]
+    if min_doses is None:
+        min_doses = model_min
+
+    if min_doses < model_min:
+        raise ValueError(
+            f'`dose.min_doses` was provided: "{min_doses}". The "{model}" model has no residual degree of freedom below {model_min} doses. '
+            f'Set `dose.min_doses` to `{model_min}` or more.'
+        )
+
+    if len(doses) < min_doses:
+        raise ValueError(
+            f'`doses` was provided: {doses}. The "{model}" model requires at least {min_doses} dose conditions to fit a curve.'
+        )
+
+    return min_doses
+
 
 def _validate_replicate(replicate: int | tuple[int, int] | tuple[tuple[int, ...], tuple[int, ...]]) -> Literal["int", "tuple", "tuple_tuple"] | None:
     """
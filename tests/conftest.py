@@ -0,0 +1,120 @@
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+
+CONDITIONS = ["WT", "Drug"]
+N_REP = 3
+
+
+def _write_dda(out: Path, n: int = 600, seed: int = 0, conditions: list[str] = CONDITIONS) -> Path:
+    """
+    Write a small synthetic FragPipe DDA LFQ output (`combined_ion.tsv`, `combined_protein.tsv` and
+    `experiment_annotation.tsv`) with `N_REP` replicates of each of `conditions` and 15% missing intensities.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    out.mkdir(parents=True, exist_ok=True)
+
+    n_prot = max(n // 20, 5)
+    prot = rng.integers(0, n_prot, n)
+    prot_len = rng.integers(200, 600, n_prot)
+    prot_seq = ["".join(rng.choice(list("ACDEFGHILMNPQSTVWYKRKRKR"), length)) for length in prot_len]
+
+    start = np.array([rng.integers(1, prot_len[p] - 25) for p in prot])
+    end = np.minimum(start + rng.integers(7, 25, n) - 1, prot_len[prot])
+    seqs = [prot_seq[p][s - 1:e] for p, s, e in zip(prot, start, end)]
+
+    ion = {
+        "Peptide Sequence": seqs,
+        "Modified Sequence": seqs,
+        "Prev AA": [prot_seq[p][s - 2] if s > 1 else "-" for p, s in zip(prot, start)],
+        "Next AA": [prot_seq[p][e] if e < prot_len[p] else "-" for p, e in zip(prot, end)],
+        "Start": start,
+        "End": end,
+        "Peptide Length": [len(s) for s in seqs],
+        "M/Z": rng.random(n) * 1000,
+        "Charge": rng.integers(1, 4, n),
+        "Compensation Voltage": [None] * n,
+        "Assigned Modifications": [""] * n,
+        "Protein": [f"sp|P{p:05d}|X" for p in prot],
+        "Protein ID": [f"P{p:05d}" for p in prot],
+        "Entry Name": [f"E{p}" for p in prot],
+        "Gene": [f"G{p}" for p in prot],
+        "Protein Description": ["d"] * n,
+        "Mapped Genes": [""] * n,
+        "Mapped Proteins": [""] * n,
+    }
+
+    pids = sorted(set(ion["Protein ID"]))
+    m = len(pids)
+    protein = {
+        "Protein": [f"sp|{p}|X" for p in pids],
+        "Protein ID": pids,
+        "Entry Name": [f"E{p}" for p in pids],
+        "Gene": [f"G{p}" for p in pids],
+        "Protein Length": rng.integers(100, 900, m),
+        "Organism": ["X"] * m,
+        "Protein Existence": ["1"] * m,
+        "Description": ["d"] * m,
+        "Protein Probability": rng.random(m),
+        "Top Peptide Probability": rng.random(m),
+        "Combined Total Peptides": rng.integers(1, 9, m),
+        "Combined Spectral Count": rng.integers(1, 9, m),
+        "Combined Unique Spectral Count": rng.integers(1, 9, m),
+        "Combined Total Spectral Count": rng.integers(1, 9, m),
+    }
+
+    ion_base = rng.lognormal(14, 1, n)
+    prot_base = rng.lognormal(16, 1, m)
+    annotation = []
+    for cond in conditions:
+        effect = rng.normal(0, 0.5, n) if cond != conditions[0] else 0.0
+        for rep in range(1, N_REP + 1):
+            sample = f"{cond}_{rep}"
+
+            intensity = ion_base * np.exp(effect + rng.normal(0, 0.2, n))
+            intensity[rng.random(n) < 0.15] = np.nan
+            ion[f"{sample} Spectral Count"] = rng.integers(0, 5, n)
+            ion[f"{sample} Apex Retention Time"] = rng.random(n)
+            ion[f"{sample} Intensity"] = intensity
+            ion[f"{sample} Match Type"] = ["MS/MS"] * n
+
+            intensity = prot_base * np.exp(rng.normal(0, 0.2, m))
+            intensity[rng.random(m) < 0.05] = np.nan
+            protein[f"{sample} Spectral Count"] = rng.integers(0, 5, m)
+            protein[f"{sample} Intensity"] = intensity
+            protein[f"{sample} MaxLFQ Intensity"] = intensity
+
+            annotation.append((f"/data/raw/{sample}.mzML", cond, sample, cond, rep))
+
+    pl.DataFrame(ion).fill_nan(None).write_csv(out.joinpath("combined_ion.tsv"), separator="\t")
+    pl.DataFrame(protein).fill_nan(None).write_csv(out.joinpath("combined_protein.tsv"), separator="\t")
+    pl.DataFrame(
+        annotation, schema=["file", "sample", "sample_name", "condition", "replicate"], orient="row"
+    ).write_csv(out.joinpath("experiment_annotation.tsv"), separator="\t")
+
+    return out
+
+
+@pytest.fixture(scope="session")
+def dda(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    return _write_dda(tmp_path_factory.mktemp("dda"))
+
+
+@pytest.fixture(autouse=True)
+def _seed() -> None:
+    # AON imputation draws from the global numpy generator
+    np.random.seed(0)
+
+
+@pytest.fixture(autouse=True)
+def _rc_params():
+    saved = dict(flippr.rcParams)
+    yield
+    flippr.rcParams.clear()
+    flippr.rcParams.update(saved)
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import flippr
+
+PROCESSES = {"a": ("WT", "Drug"), "b": ("Drug", "WT"), "c": ("WT", "Drug")}
+
+
+def _study(dda) -> flippr.Study:
+    study = flippr.Study(lip=dda)
+    for pid, (ctrl, test) in PROCESSES.items():
+        study.add_process(pid, ctrl, test, 3)
+
+    return study
+
+
+async def _collect(study: flippr.Study, **kwargs) -> dict:
+    return {pid: result async for pid, result in study.arun(**kwargs)}
+
+
+def test_arun_matches_run(dda):
+    # The global generator only draws AON imputations in process order with a single worker
+    expected = _study(dda).run()
+
+    np.random.seed(0)
+    study = _study(dda)
+    with ThreadPoolExecutor(1) as executor:
+        results = asyncio.run(_collect(study, executor=executor))
+
+    assert list(results) == list(PROCESSES)
+    assert study.results == results
+    for pid, result in results.items():
+        assert result.ion.equals(expected[pid].ion)
+        assert result.cut_site.equals(expected[pid].cut_site)
+
+
+def test_cancelling_the_consumer_stops_pending_processes(dda):
+    events: list[dict] = []
+    release = threading.Event()
+
+    def progress(event: dict) -> None:
+        events.append(event)
+        # Hold `b` before its first stage until the consumer is cancelled
+        if event["event"] == "process_started" and event["process"] == "b":
+            release.wait(10)
+
+    async def main(executor: ThreadPoolExecutor) -> None:
+        first = asyncio.Event()
+
+        async def consume() -> None:
+            agen = study.arun(executor=executor, progress=progress)
+            try:
+                async for _ in agen:
+                    first.set()
+                    await asyncio.sleep(3600)
+            finally:
+                await agen.aclose()
+
+        task = asyncio.create_task(consume())
+        await first.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+
+    study = _study(dda)
+    with ThreadPoolExecutor(2) as executor:
+        asyncio.run(main(executor))
+
+    started = [event["process"] for event in events if event["event"] == "process_started"]
+    finished = [event["process"] for event in events if event["event"] == "process_finished"]
+
+    # `b` was running and stops at its next stage, `c` is either cancelled in the queue or stopped as well
+    assert "b" in started
+    assert not [event for event in events if event["process"] == "b" and event["event"] == "stage_started"]
+    assert finished == ["a"]
+    assert list(study.results) == ["a"]
+
+
+def test_cancelled_token_raises_before_any_process(dda):
+    token = flippr.CancellationToken()
+    token.cancel()
+
+    with pytest.raises(CancelledError, match="cancelled"):
+        asyncio.run(_collect(_study(dda), cancel=token))
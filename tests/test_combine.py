@@ -0,0 +1,131 @@
+import numpy as np
+import polars as pl
+import pytest
+import scipy as sp
+
+import flippr
+from flippr import combine as _combine
+from flippr.parameters import _FLIPPR_PEPTIDE_COLUMNS
+
+
+def test_combine_skips_untested_ions():
+    # Two of the three ions of the peptide have a single intensity in a condition and no T-test
+    ion = pl.DataFrame({
+        "Protein ID": ["P1"] * 3,
+        "Peptide Sequence": ["AAK"] * 3,
+        "T-test": [None, 2.5, None],
+        "P-value": [None, 0.02, None],
+        "Adj. P-value": [None, 0.04, None],
+        "CV": [0.1, 0.2, 0.3],
+        "FC": [0.5, 2.0, 4.0],
+    }).with_columns(pl.lit("x").alias(col) for col in _FLIPPR_PEPTIDE_COLUMNS)
+
+    peptide = _combine.combine_by(ion, by="PEPTIDE", fc="FC")
+
+    assert peptide["P-value"].to_list() == pytest.approx([0.02])
+    assert peptide["Adj. P-value"].to_list() == pytest.approx([0.04])
+    assert peptide["FC"].to_list() == [2.0]
+
+
+def test_cut_sites_are_tested_with_single_replicate_ions(dda):
+    # Two replicates with `ion.missing_intensity_thresh` 1 keep ions with a single intensity, which have no Welch T-test
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", ((1, 2), (1, 2)))
+    result = study.run()["a"]
+
+    assert result.ion["P-value"].is_null().any()
+    assert not result.ion["P-value"].is_nan().any()
+    for table in (result.cut_site, result.peptide, result.modified_peptide):
+        assert table["P-value"].is_not_null().all() and not table["P-value"].is_nan().any()
+        assert table["Adj. P-value"].is_not_null().all() and not table["Adj. P-value"].is_nan().any()
+
+
+def test_fisher_pvalue_matches_scipy():
+    rng = np.random.default_rng(4)
+    pvalues = [rng.uniform(0.0, 1.0, size=n).tolist() for n in rng.integers(1, 12, size=200)] + [[1.0], [0.0, 0.5]]
+
+    df = pl.DataFrame({"P-value": pvalues}, schema={"P-value": pl.List(pl.Float64)})
+    combined = df.select(_combine._fisher_pvalue("P-value")).to_series().to_numpy()
+
+    np.testing.assert_allclose(combined, [sp.stats.combine_pvalues(p)[1] for p in pvalues], rtol=1e-12)
+
+
+def test_residue_profile_aggregates_covering_ions():
+    ions = pl.DataFrame({
+        "Protein ID": ["P1", "P1", "P1", "P2"],
+        "Start": [2, 4, None, 1],
+        "End": [5, 6, 3, 2],
+        "Log2 FC": [1.0, -3.0, 9.0, 0.5],
+        "P-value": [0.01, 0.2, 1e-9, 0.5],
+        "Adj. P-value": [0.02, 0.4, 1e-8, 0.5],
+    })
+
+    profile = _combine._residue_profile(ions, "FC")
+
+    assert profile["Protein ID"].to_list() == ["P1", "P2"]
+    p1 = profile.row(0, named=True)
+    # Residue 1 is not covered, 4 and 5 are covered by both ions, the ion without `Start` is left out
+    assert p1["Length"] == 6
+    assert p1["No. of Ions"] == [0, 1, 1, 2, 2, 1]
+    assert p1["Max Abs Log2 FC"] == [None, 1.0, 1.0, 3.0, 3.0, 3.0]
+    assert p1["Min P-value"] == [None, 0.01, 0.01, 0.01, 0.01, 0.2]
+    assert p1["Min Adj. P-value"] == [None, 0.02, 0.02, 0.02, 0.02, 0.4]
+    assert profile.row(1, named=True)["No. of Ions"] == [1, 1]
+
+
+def test_result_residue_profile_matches_the_ions(dda, tmp_path):
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    result = study.run()["a"]
+
+    path = tmp_path.joinpath("profile.parquet")
+    profile = result.residue_profile(path)
+    assert pl.read_parquet(path).equals(profile)
+
+    ion = result.ion
+    for row in profile.head(5).iter_rows(named=True):
+        ions = ion.filter(pl.col("Protein ID").eq(row["Protein ID"]))
+        assert row["Length"] == ions["End"].max()
+        for residue in [ions["Start"][0], ions["End"][0]]:
+            covering = ions.filter(pl.col("Start").le(residue) & pl.col("End").ge(residue))
+            assert row["No. of Ions"][residue - 1] == covering.height
+            assert row["Min P-value"][residue - 1] == covering["P-value"].min()
+
+
+def test_volcano_bins_every_row_and_selects_significant_points():
+    df = pl.DataFrame({
+        "Log2 FC": [-2.0, -1.0, 0.0, 1.0, 2.0, None, 0.5],
+        "P-value": [1e-3, 0.5, 0.1, 1e-4, 0.0, 0.01, 0.02],
+    }).with_columns(-pl.col("P-value").log10().alias("-Log10 P-value"))
+    rcParams = {"protein.fc_sig_thresh": 1.0, "protein.pval_sig_thresh": 0.01}
+
+    grid, points = _combine._volcano(df, "Log2 FC", "P-value", 4, 2, rcParams)
+
+    # The null fold change is not binned, the zero P-value falls in the top bin
+    assert grid["Count"].sum() == 6
+    assert grid["Log2 FC Low"].min() == -2.0 and grid["Log2 FC High"].max() == 2.0
+    assert grid["-Log10 P-value Low"].min() == 0.0 and grid["-Log10 P-value High"].max() == pytest.approx(4.0)
+    top = grid.filter(pl.col("-Log10 P-value Low").gt(0))
+    assert top["Count"].sum() == 3
+
+    assert points["Log2 FC"].to_list() == [-2.0, 1.0, 2.0]
+
+
+def test_result_volcano_matches_the_table(dda):
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    result = study.run()["a"]
+
+    for level, table in [("cut site", result.cut_site), ("ion", result.ion)]:
+        grid, points = result.volcano(level, bins=20, pvalue="Adj. P-value")
+        finite = table.filter(pl.col("Log2 FC").is_not_nan() & pl.col("-Log10 Adj. P-value").is_not_nan())
+
+        assert grid["Count"].sum() == finite.height
+        assert grid.height <= 400
+        assert points.equals(table.filter(pl.col("Log2 FC").abs().ge(1.0) & pl.col("Adj. P-value").le(0.05)))
+
+    with pytest.raises(ValueError, match='"Q-value" is not recognized'):
+        result.volcano(pvalue="Q-value")
+
+    with pytest.raises(ValueError, match="positive integers"):
+        result.volcano(bins=(0, 10))
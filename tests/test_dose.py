@@ -0,0 +1,87 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+from flippr import dose as _dose
+
+from .conftest import _write_dda
+
+CONC = [0.1, 1.0, 10.0, 100.0, 1000.0]
+FC_COLS = [f"Log2 FC D{i}" for i in range(len(CONC))]
+
+
+def _fc_frame(curves: list[list[float]], proteins: list[str]) -> pl.DataFrame:
+    return pl.DataFrame(
+        [[protein, *curve] for protein, curve in zip(proteins, curves)],
+        schema=["Protein ID", *FC_COLS], orient="row",
+    ).fill_nan(None)
+
+
+def test_log_linear_fit_recovers_the_slope():
+    x = np.log10(CONC)
+    noise = np.random.normal(0, 0.05, (3, len(CONC)))
+    curves = [0.5 + 1.2 * x + noise[0], -0.3 * x + noise[1], noise[2]]
+
+    df = _dose._add_dose_fit(_fc_frame(curves, ["P1", "P1", "P2"]), FC_COLS, CONC, "log-linear", 3)
+
+    assert df["Slope"].to_numpy() == pytest.approx([1.2, -0.3, 0.0], abs=0.1)
+    assert df["Intercept"][0] == pytest.approx(0.5, abs=0.1)
+    assert (df["P-value"][:2] < 1e-3).all()
+
+
+def test_sigmoid_fit_recovers_the_ec50():
+    x = np.log10(CONC)
+    curve = 2.0 / (1 + 10 ** (1.0 * (1.0 - x))) + np.random.normal(0, 0.02, len(CONC))
+
+    df = _dose._add_dose_fit(_fc_frame([curve], ["P1"]), FC_COLS, CONC, "sigmoid", 4)
+
+    assert df["Top"].item() == pytest.approx(2.0, abs=0.1)
+    assert df["Log EC50"].item() == pytest.approx(1.0, abs=0.1)
+    assert df["P-value"].item() < 1e-3
+
+
+def test_rows_below_min_doses_are_kept_and_skipped_by_the_fdr():
+    x = np.log10(CONC)
+    curves = [0.5 * x + 0.01 * np.arange(len(CONC)), [1.0, 2.0, np.nan, np.nan, np.nan], 0.2 * x + [0.1, -0.1, 0.1, -0.1, 0.1]]
+
+    df = _dose._add_dose_fit(_fc_frame(curves, ["P1", "P1", "P2"]), FC_COLS, CONC, "sigmoid", 4)
+
+    assert df.height == 3
+    unfit = df.filter(pl.col("Log2 FC D2").is_null())
+    assert unfit["P-value"].is_null().all() and unfit["Adj. P-value"].is_null().all()
+
+    # Benjamini-Hochberg is within each protein, a single fitted row of a protein is not adjusted
+    fitted = df.filter(pl.col("P-value").is_not_null())
+    assert fitted["Adj. P-value"].to_list() == fitted["P-value"].to_list()
+
+
+def test_dose_response_rejects_designs_without_enough_doses(dda):
+    study = flippr.Study(lip=dda)
+
+    # A sigmoid needs 4 doses for a residual degree of freedom
+    with pytest.raises(ValueError, match='"sigmoid" model requires at least 4 dose conditions'):
+        study.dose_response("WT", {"Drug": 1.0, "A": 10.0, "B": 100.0}, 3)
+
+    with pytest.raises(ValueError, match='"log-linear" model requires at least 3 dose conditions'):
+        study.dose_response("WT", {"Drug": 1.0}, 3, "log-linear")
+
+    flippr.rcParams["dose.min_doses"] = 3
+    with pytest.raises(ValueError, match="Set `dose.min_doses` to `4` or more"):
+        study.dose_response("WT", {"Drug": 1.0, "A": 10.0, "B": 100.0}, 3)
+
+    with pytest.raises(ValueError, match="`n_rep` was provided"):
+        study.dose_response("WT", {"Drug": 1.0, "A": 10.0, "B": 100.0}, (3, 3), "log-linear")
+
+
+@pytest.mark.parametrize("model, params", [("sigmoid", ["Top", "Log EC50", "EC50", "Hill"]), ("log-linear", ["Intercept", "Slope"])])
+def test_dose_response_fits_every_table(tmp_path, model, params):
+    doses = {f"D{i}": conc for i, conc in enumerate(CONC[:4])}
+    study = flippr.Study(lip=_write_dda(tmp_path, n=200, conditions=["Ctrl", *doses]))
+
+    dr = study.dose_response("Ctrl", doses, 3, model)
+
+    for df in [dr.ion, dr.peptide, dr.cut_site]:
+        assert set(params + ["R2", "P-value", "Adj. P-value"]) <= set(df.columns)
+        assert df["P-value"].is_not_null().any()
+        assert (df["Adj. P-value"].drop_nulls() >= df["P-value"].drop_nulls()).all()
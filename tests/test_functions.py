@@ -0,0 +1,267 @@
+import numpy as np
+import polars as pl
+import pytest
+import scipy as sp
+
+from flippr import functions as _functions
+
+
+def _ttest_frame(ctrl: list[list[float]], test: list[list[float]], alt: list[str]) -> pl.DataFrame:
+    return pl.DataFrame({
+        "Ctrl Intensity": ctrl,
+        "Test Intensity": test,
+        "Alternative Hypothesis": alt,
+    })
+
+
+def _t_and_p(df: pl.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    stats = _functions._moderated_ttest(df, "Ctrl", "Test")["Stats"]
+    return stats.list.first().to_numpy(), stats.list.last().to_numpy()
+
+
+# Sample variances on 4 df and the hyperparameters and posterior variances returned by limma's `squeezeVar()`
+# (legacy `fitFDist`, used by limma when every df is equal), computed with the InMoose port of limma 3.x
+LIMMA_VAR = np.array([
+    0.0352, 0.0142, 0.0416, 0.0083, 0.0234, 0.0709, 0.1568, 0.0718,
+    0.0368, 0.0169, 0.0067, 0.0249, 0.1197, 0.1349, 0.1682, 0.0124,
+])
+LIMMA_DF_PRIOR = 5.285654680158246
+LIMMA_VAR_PRIOR = 0.03943406622838851
+LIMMA_VAR_POST = np.array([
+    0.03761014906832615, 0.028563937153996327, 0.04036708984221714, 0.02602238237806557,
+    0.03252703951646463, 0.05298870932268686, 0.08999202377225503, 0.05337640411901527,
+    0.038299384261798894, 0.029727021542981586, 0.02533314718459282, 0.03317319751034533,
+    0.07401038272360567, 0.08055811706159678, 0.09490282452574836, 0.027788547561339486,
+])
+
+
+def test_fit_f_dist_matches_limma_squeeze_var():
+    dof = np.full(LIMMA_VAR.shape, 4.0)
+
+    d0, var0 = _functions._fit_f_dist(LIMMA_VAR, dof)
+    post = (d0 * var0 + dof * LIMMA_VAR) / (d0 + dof)
+
+    assert d0 == pytest.approx(LIMMA_DF_PRIOR, rel=1e-10)
+    assert var0 == pytest.approx(LIMMA_VAR_PRIOR, rel=1e-10)
+    np.testing.assert_allclose(post, LIMMA_VAR_POST, rtol=1e-10)
+
+
+def test_fit_f_dist_infinite_prior_df_uses_pooled_variance():
+    var = np.array([0.08, 0.081, 0.079, 0.0805, 0.0795])
+
+    d0, var0 = _functions._fit_f_dist(var, np.full(var.shape, 4.0))
+
+    assert np.isinf(d0)
+    assert var0 == pytest.approx(0.08, rel=1e-12)
+
+
+def test_moderated_ttest_is_invariant_to_intensity_scale():
+    rng = np.random.default_rng(0)
+    # Ions spanning 6 orders of magnitude with the same CV
+    base = np.exp2(rng.uniform(10, 30, size=(200, 1)))
+    ctrl = base * np.exp2(rng.normal(0.0, 0.3, size=(200, 3)))
+    test = base * np.exp2(rng.normal(0.5, 0.3, size=(200, 3)))
+    alt = ["two-sided"] * 200
+
+    t, p = _t_and_p(_ttest_frame(ctrl.tolist(), test.tolist(), alt))
+    t_scaled, p_scaled = _t_and_p(_ttest_frame((ctrl * 1e3).tolist(), (test * 1e3).tolist(), alt))
+
+    np.testing.assert_allclose(t, t_scaled, rtol=1e-9)
+    np.testing.assert_allclose(p, p_scaled, rtol=1e-9)
+
+
+def test_moderated_ttest_prior_excludes_aon_rows():
+    rng = np.random.default_rng(1)
+    base = np.exp2(rng.uniform(15, 25, size=(100, 1)))
+    ctrl = (base * np.exp2(rng.normal(0.0, 0.3, size=(100, 3)))).tolist()
+    test = (base * np.exp2(rng.normal(0.0, 0.3, size=(100, 3)))).tolist()
+
+    _, p = _t_and_p(_ttest_frame(ctrl, test, ["two-sided"] * 100))
+
+    # AON rows whose control is imputed far from the observed intensities and with a very different spread
+    imputed = rng.normal(1e4, 5e3, size=(20, 3)).clip(1.0).tolist()
+    observed = (np.exp2(rng.uniform(15, 25, size=(20, 1))) * np.exp2(rng.normal(0.0, 0.3, size=(20, 3)))).tolist()
+    _, p_aon = _t_and_p(_ttest_frame(ctrl + imputed, test + observed, ["two-sided"] * 100 + ["less"] * 20))
+
+    np.testing.assert_allclose(p_aon[:100], p, rtol=1e-12)
+
+
+def test_welch_ttest_matches_scipy():
+    rng = np.random.default_rng(2)
+    ctrl = rng.lognormal(14, 1, size=(50, 3))
+    test = rng.lognormal(14, 1, size=(50, 4))
+    alt = rng.choice(["two-sided", "less", "greater"], size=50)
+
+    df = _ttest_frame(ctrl.tolist(), test.tolist(), alt.tolist()).with_columns(
+        pl.col("Ctrl Intensity").list.mean().alias("Ctrl Mean"),
+        pl.col("Ctrl Intensity").list.std().alias("Ctrl Std"),
+        pl.col("Test Intensity").list.mean().alias("Test Mean"),
+        pl.col("Test Intensity").list.std().alias("Test Std"),
+    )
+    stats = _functions._welch_ttest(df, "Ctrl", "Test")["Stats"]
+
+    expected = [
+        sp.stats.ttest_ind_from_stats(c.mean(), c.std(ddof=1), 3, t.mean(), t.std(ddof=1), 4, equal_var=False, alternative=a)
+        for c, t, a in zip(ctrl, test, alt)
+    ]
+
+    np.testing.assert_allclose(stats.list.first().to_numpy(), [e[0] for e in expected], rtol=1e-12)
+    np.testing.assert_allclose(stats.list.last().to_numpy(), [e[1] for e in expected], rtol=1e-12)
+
+
+def test_add_fdr_matches_scipy_within_each_protein():
+    rng = np.random.default_rng(3)
+    pval = rng.uniform(0.0, 0.2, size=90)
+    pval[::7] = np.nan
+
+    df = pl.DataFrame({"Protein ID": rng.choice(["A", "B", "C"], size=90), "P-value": pval})
+    out = _functions._add_fdr(df)
+
+    for (pid,), group in out.group_by("Protein ID"):
+        valid = group.filter(pl.col("P-value").is_not_nan())
+        np.testing.assert_allclose(
+            valid["Adj. P-value"].to_numpy(), sp.stats.false_discovery_control(valid["P-value"].to_numpy()), rtol=1e-12
+        )
+        # Rows without a P-value are skipped and keep it
+        assert group.filter(pl.col("P-value").is_nan())["Adj. P-value"].is_nan().all()
+
+
+def _baseline_cleavage_type() -> pl.Expr:
+    # The hard-coded tryptic chain replaced by `_PROTEASE_RULES["stricttrypsin"]`
+    return (
+        pl.when(pl.col("Prev AA").is_in(["K", "R", "-"]) & pl.col("End AA").is_in(["K", "R"]) & ~pl.col("Next AA").is_in(["-"]))
+        .then(pl.lit("FULL_TRP"))
+        .when(pl.col("Prev AA").is_in(["K", "R"]) & pl.col("Next AA").is_in(["-"]))
+        .then(pl.lit("FULL_TRP"))
+        .when(pl.col("Prev AA").is_in(["M"]) & pl.col("Start").eq(2) & pl.col("End AA").is_in(["K", "R"]))
+        .then(pl.lit("FULL_TRP"))
+        .when(pl.col("Prev AA").is_in(["K", "R", "-"]) & ~pl.col("End AA").is_in(["K", "R"]) & ~pl.col("Next AA").is_in(["-"]))
+        .then(pl.lit("C_SEMI"))
+        .when(pl.col("Prev AA").is_in(["M"]) & pl.col("Start").eq(2) & ~pl.col("End AA").is_in(["K", "R"]))
+        .then(pl.lit("C_SEMI"))
+        .when(~pl.col("Prev AA").is_in(["K", "R", "-"]) & pl.col("End AA").is_in(["K", "R"]) & ~pl.col("Next AA").is_in(["-"]))
+        .then(pl.lit("N_SEMI"))
+        .when(~pl.col("Prev AA").is_in(["K", "R", "-"]) & pl.col("Next AA").is_in(["-"]))
+        .then(pl.lit("N_SEMI"))
+        .otherwise(pl.lit(None))
+    )
+
+
+def _termini() -> pl.DataFrame:
+    aa = ["K", "R", "D", "E", "P", "M", "A", "-"]
+    rows = [
+        (prev, start_aa, end_aa, next_aa, start)
+        for prev in aa for start_aa in ["P", "A"] for end_aa in aa[:-1] for next_aa in aa for start in [2, 10]
+    ]
+
+    return pl.DataFrame(rows, schema=["Prev AA", "Start AA", "End AA", "Next AA", "Start"], orient="row")
+
+
+def test_stricttrypsin_matches_the_hard_coded_rules():
+    df = _termini().with_columns(
+        _functions._cleavage_type_expr("stricttrypsin").alias("new"),
+        _baseline_cleavage_type().alias("old"),
+    )
+
+    assert df["new"].null_count() > 0
+    assert df.filter(pl.col("new").ne_missing(pl.col("old"))).is_empty()
+
+
+@pytest.mark.parametrize(
+    "protease, termini, cleavage",
+    [
+        ("trypsin", ("K", "A", "R", "A"), "FULL_TRP"),
+        # proline after the cut site blocks trypsin on either side
+        ("trypsin", ("K", "P", "R", "A"), "N_SEMI"),
+        ("trypsin", ("K", "A", "R", "P"), "C_SEMI"),
+        ("stricttrypsin", ("K", "A", "R", "P"), "FULL_TRP"),
+        ("lysc", ("K", "A", "K", "A"), "FULL_TRP"),
+        ("lysc", ("R", "A", "K", "A"), "N_SEMI"),
+        ("lysc", ("K", "A", "R", "A"), "C_SEMI"),
+        ("lysc", ("R", "A", "R", "A"), None),
+        ("gluc", ("E", "A", "D", "A"), "FULL_TRP"),
+        ("gluc", ("K", "A", "E", "-"), "N_SEMI"),
+        ("gluc", ("-", "A", "K", "A"), "C_SEMI"),
+    ],
+)
+def test_protease_rules_classify_cleavage(protease, termini, cleavage):
+    df = pl.DataFrame([(*termini, 10)], schema=["Prev AA", "Start AA", "End AA", "Next AA", "Start"], orient="row")
+
+    assert df.select(_functions._cleavage_type_expr(protease)).item() == cleavage
+
+
+def test_unknown_protease_raises():
+    with pytest.raises(ValueError, match='"chymotrypsin" is not recognized'):
+        _functions._cleavage_type_expr("chymotrypsin")
+
+
+def _aon_frame(n: int = 60, n_rep: int = 3) -> pl.DataFrame:
+    rng = np.random.default_rng(1)
+    base = rng.lognormal(14, 1, n)[:, None]
+    # Replicate variances spread around the prior so its degrees of freedom are finite
+    sd = rng.lognormal(-1.6, 0.6, n)[:, None]
+    alt = np.array(["two-sided", "less", "greater"])[rng.integers(0, 3, n)]
+
+    return pl.DataFrame({
+        "Ctrl Intensity": (base * rng.lognormal(0, sd, (n, n_rep))).tolist(),
+        "Test Intensity": (base * rng.lognormal(0.5, sd, (n, n_rep))).tolist(),
+        "Alternative Hypothesis": alt,
+    })
+
+
+@pytest.mark.parametrize("ttest_type", ["welch", "moderated"])
+def test_pooling_a_single_imputation_matches_the_single_draw(ttest_type):
+    rcParams = {"ttest.type": ttest_type, "ion.aon_impute_type": "multiple", "ion.aon_impute_draws": 1}
+    df = _aon_frame()
+
+    np.random.seed(3)
+    pooled = _functions._pool_aon_imputations(_functions._add_ttest(df, "Ctrl", "Test", rcParams), "Ctrl", "Test", 3, 3, rcParams)
+
+    # The same draws substituted in the intensity lists and tested once
+    alt = df["Alternative Hypothesis"].to_numpy()
+    aon = np.flatnonzero(alt != "two-sided")
+    np.random.seed(3)
+    ctrl_imp = np.random.normal(1e4, 1e3, (aon.size, 1, 3))[:, 0]
+    test_imp = np.random.normal(1e4, 1e3, (aon.size, 1, 3))[:, 0]
+
+    ctrl, test = df["Ctrl Intensity"].to_list(), df["Test Intensity"].to_list()
+    for k, i in enumerate(aon):
+        if alt[i] == "less":
+            ctrl[i] = ctrl_imp[k].tolist()
+        else:
+            test[i] = test_imp[k].tolist()
+
+    single = _functions._add_ttest(
+        df.with_columns(pl.Series("Ctrl Intensity", ctrl), pl.Series("Test Intensity", test)), "Ctrl", "Test", rcParams
+    )
+
+    for col in ["T-test", "P-value", "Ctrl Mean", "Ctrl Std", "Test Mean", "Test Std"]:
+        np.testing.assert_allclose(pooled[col].to_numpy(), single[col].to_numpy(), rtol=1e-9)
+    assert pooled["P-value"][aon].is_not_null().all()
+
+
+def test_pooled_moderated_statistics_use_the_moderated_dof():
+    df = _aon_frame()
+    rcParams = {"ion.aon_impute_type": "multiple", "ion.aon_impute_draws": 50, "ion.aon_impute_scale": 0.0}
+    aon = df["Alternative Hypothesis"].ne("two-sided")
+
+    # Identical draws have no between-imputation variance, pooling leaves the complete-data T-test with Barnard-Rubin dof
+    pooled = {}
+    for ttest_type in ["welch", "moderated"]:
+        rc = rcParams | {"ttest.type": ttest_type}
+        np.random.seed(3)
+        single = _functions._add_ttest(df, "Ctrl", "Test", rc)
+        pooled[ttest_type] = _functions._pool_aon_imputations(single, "Ctrl", "Test", 3, 3, rc).filter(aon)
+
+    assert not np.allclose(pooled["welch"]["T-test"].to_numpy(), pooled["moderated"]["T-test"].to_numpy())
+
+    expected = _functions._moderated_ttest(
+        df.with_columns(
+            pl.when(pl.col("Alternative Hypothesis").eq("less")).then(pl.lit([1e4] * 3)).otherwise(pl.col("Ctrl Intensity")).alias("Ctrl Intensity"),
+            pl.when(pl.col("Alternative Hypothesis").eq("greater")).then(pl.lit([1e4] * 3)).otherwise(pl.col("Test Intensity")).alias("Test Intensity"),
+        ),
+        "Ctrl", "Test",
+    ).filter(aon)["Stats"]
+
+    np.testing.assert_allclose(pooled["moderated"]["T-test"].to_numpy(), expected.list.first().to_numpy(), rtol=1e-9)
+    assert (pooled["moderated"]["P-value"].to_numpy() >= expected.list.last().to_numpy()).all()
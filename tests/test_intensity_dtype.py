@@ -0,0 +1,50 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+from flippr.datatypes import Result
+
+# float32 intensities carry ~7 significant digits, the drift of every statistic stays well below this tolerance
+RTOL = 1e-3
+
+
+def _run(dda, dtype: str) -> Result:
+    flippr.rcParams["data.intensity_dtype"] = dtype
+    # Same AON imputation draws in both modes
+    np.random.seed(0)
+
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    return study.run()["a"]
+
+
+@pytest.fixture(scope="module")
+def results(dda):
+    saved = dict(flippr.rcParams)
+    try:
+        yield _run(dda, "float64"), _run(dda, "float32")
+    finally:
+        flippr.rcParams.clear()
+        flippr.rcParams.update(saved)
+
+
+def test_float32_stores_float32_intensities(results):
+    _, single = results
+
+    intensities = [col for col in single.ion.columns if col.endswith(" Intensity")]
+    assert intensities
+    assert all(single.ion.schema[col] == pl.Float32 for col in intensities)
+
+
+@pytest.mark.parametrize("table, key", [("ion", ["Protein ID", "Modified Sequence", "Start"]), ("cut_site", ["Cut Site ID"])])
+def test_float32_matches_float64(results, table, key):
+    double, single = (getattr(result, table).sort(key) for result in results)
+
+    # Culling and cut site assignment are unaffected by the intensity precision
+    assert double.select(key).equals(single.select(key))
+
+    for col in ["FC", "CV", "P-value", "Adj. P-value"]:
+        np.testing.assert_allclose(
+            single[col].cast(pl.Float64).to_numpy(), double[col].to_numpy(), rtol=RTOL, err_msg=col
+        )
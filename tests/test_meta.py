@@ -0,0 +1,76 @@
+import numpy as np
+import polars as pl
+import pytest
+import scipy as sp
+
+import flippr
+
+KEY = ["Protein ID", "Cut Site ID"]
+
+
+@pytest.fixture(scope="module")
+def results(dda):
+    # The second result only uses the first two replicates, its cut sites overlap with different statistics
+    study = flippr.Study(lip=dda)
+    study.add_process("A", "WT", "Drug", 3)
+    study.add_process("B", "WT", "Drug", ((1, 2), (1, 2)))
+
+    return study.run()
+
+
+def test_single_result_is_returned_unchanged(results):
+    meta = flippr.meta_analysis([results["A"]])
+    cut_site = results["A"].cut_site.filter(pl.col("P-value").is_finite() & pl.col("Log2 FC").is_finite())
+
+    joined = meta.join(cut_site, on=KEY, suffix=" A")
+    assert joined.height == cut_site.height == meta.height
+    np.testing.assert_allclose(joined["P-value"], joined["P-value A"], rtol=1e-6)
+    np.testing.assert_allclose(joined["Log2 FC"], joined["Log2 FC A"])
+    assert (meta["No. of Studies"] == 1).all()
+
+
+@pytest.mark.parametrize("method", ["stouffer", "fisher"])
+def test_rows_are_combined_across_results(results, method):
+    meta = flippr.meta_analysis(results, method=method, min_studies=2)
+    assert meta.height > 0 and (meta["No. of Studies"] == 2).all()
+
+    for row in meta.head(20).iter_rows(named=True):
+        p = np.array([row["P-value A"], row["P-value B"]])
+        fc = np.array([row["Log2 FC A"], row["Log2 FC B"]])
+
+        if method == "stouffer":
+            z = sp.stats.norm.isf(p / 2) * np.sign(fc)
+            expected = 2 * sp.stats.norm.sf(abs(z.sum()) / np.sqrt(2))
+        else:
+            expected = sp.stats.combine_pvalues(p, method="fisher").pvalue
+
+        assert row["P-value"] == pytest.approx(expected, rel=1e-6)
+        assert row["Log2 FC"] == pytest.approx(fc.mean())
+
+    adj = sp.stats.false_discovery_control(meta.sort(KEY)["P-value"].to_numpy())
+    np.testing.assert_allclose(meta.sort(KEY)["Adj. P-value"], adj)
+
+
+def test_min_studies_and_opposite_fold_changes(results):
+    one = flippr.meta_analysis(results)
+    two = flippr.meta_analysis(results, min_studies=2)
+    assert set(two.select(KEY).rows()) < set(one.select(KEY).rows())
+
+    # Identical P-values with opposite fold changes cancel out with Stouffer's method only
+    flipped = results["A"].cut_site.with_columns(-pl.col("Log2 FC"))
+    assert flipped.height > 0
+    fake = type("Flipped", (), {"cut_site": flipped, "_fc": "FC"})()
+    stouffer = flippr.meta_analysis([results["A"], fake])
+    fisher = flippr.meta_analysis([results["A"], fake], method="fisher")
+
+    assert np.allclose(stouffer["P-value"], 1.0)
+    significant = fisher.filter(pl.col("P-value 0") < 0.01)
+    assert significant.height > 0 and (significant["P-value"] < significant["P-value 0"]).all()
+
+
+def test_unknown_level_and_method_raise(results):
+    with pytest.raises(ValueError, match='"protein" is not recognized'):
+        flippr.meta_analysis(results, level="protein")
+
+    with pytest.raises(ValueError, match='"tippett" is not recognized'):
+        flippr.meta_analysis(results, method="tippett")
@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import CancelledError
+
+import polars as pl
+import pytest
+
+import flippr
+from flippr import parallel as _parallel
+from flippr import progress as _progress
+
+KEY = ["Protein ID", "Modified Sequence", "Start", "End"]
+
+
+def _ion(dda, n_shards: int) -> pl.DataFrame:
+    flippr.rcParams["run.n_shards"] = n_shards
+    flippr.rcParams["run.n_workers"] = 2
+
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    return study.run()["a"].ion.sort(KEY)
+
+
+@pytest.mark.parametrize("ttest_type", ["welch", "moderated"])
+def test_sharded_ions_match_unsharded(dda, ttest_type):
+    flippr.rcParams["ttest.type"] = ttest_type
+    # AON draws come from a seed per shard, a zero scale makes the imputed intensities independent of the seeds
+    flippr.rcParams["ion.aon_impute_scale"] = 0.0
+
+    unsharded = _ion(dda, 1)
+    sharded = _ion(dda, 3)
+
+    assert unsharded["Alternative Hypothesis"].ne("two-sided").any()
+    assert sharded.equals(unsharded)
+
+
+def _tag_shard(shard: pl.DataFrame, seed: int, fail: bool = False) -> pl.DataFrame:
+    # Runs in a spawned worker process
+    if fail:
+        raise RuntimeError("shard failed")
+
+    return shard.with_columns(pl.lit(os.getpid()).alias("pid"), pl.lit(seed).alias("seed"))
+
+
+@pytest.fixture
+def table() -> pl.DataFrame:
+    return pl.DataFrame({"Protein ID": [f"P{i % 7}" for i in range(100)], "x": range(100)})
+
+
+def test_partition_keeps_every_key_in_one_contiguous_shard(table):
+    df, bounds = _parallel._partition(table, "Protein ID", 3)
+
+    assert sorted(df["x"]) == list(range(100))
+    assert sum(length for _, length in bounds) == df.height
+    shards = [df.slice(offset, length) for offset, length in bounds]
+    keys = [set(shard["Protein ID"]) for shard in shards]
+    assert sum(len(k) for k in keys) == len(set().union(*keys)) == 7
+
+
+def test_attach_shard_reads_only_its_slice(tmp_path, table):
+    src = tmp_path.joinpath("input.arrow")
+    table.write_ipc(src, compression="uncompressed")
+
+    dst = _parallel._attach_shard(_tag_shard, src, 10, 5, tmp_path.joinpath("output.arrow"), seed=3)
+
+    out = pl.read_ipc(dst)
+    assert out["x"].to_list() == list(range(10, 15))
+    assert out["seed"].unique().to_list() == [3]
+
+
+def test_map_shards_runs_in_workers_and_removes_its_files(tmp_path, table):
+    events: list[dict] = []
+    monitor = _progress._Monitor("a", events.append)
+
+    out = _parallel._map_shards(table, "Protein ID", _tag_shard, 3, n_workers=2, shared_dir=str(tmp_path), monitor=monitor)
+
+    assert out.drop("pid", "seed").sort("x").equals(table)
+    assert os.getpid() not in out["pid"]
+    assert out.group_by("Protein ID").agg(pl.col("seed").n_unique())["seed"].to_list() == [1] * 7
+    assert [event["shard"] for event in events] == [1, 2, 3]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_map_shards_removes_its_files_when_a_shard_fails(tmp_path, table):
+    with pytest.raises(RuntimeError, match="shard failed"):
+        _parallel._map_shards(table, "Protein ID", _tag_shard, 3, n_workers=2, shared_dir=str(tmp_path), fail=True)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_map_shards_stops_when_cancelled(tmp_path, table):
+    token = flippr.CancellationToken()
+    token.cancel()
+
+    with pytest.raises(CancelledError):
+        _parallel._map_shards(
+            table, "Protein ID", _tag_shard, 3, n_workers=1, shared_dir=str(tmp_path), monitor=_progress._Monitor("a", tokens=[token])
+        )
+
+    assert list(tmp_path.iterdir()) == []
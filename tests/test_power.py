@@ -0,0 +1,55 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+
+# Every intensity is quantified, so every ion is tested
+QUANTIFIED = {"missing_loc": -100.0, "missing_rate": 0.0}
+
+
+def test_seeded_simulations_are_reproducible():
+    state = np.random.get_state()[1].copy()
+
+    a = flippr.simulate_power(n_reps=[3], effect_sizes=[1.5], n_sims=50, seed=7)
+    b = flippr.simulate_power(n_reps=[3], effect_sizes=[1.5], n_sims=50, seed=7)
+    c = flippr.simulate_power(n_reps=[3], effect_sizes=[1.5], n_sims=50, seed=8)
+
+    assert a.equals(b)
+    assert not a.equals(c)
+    # The AON imputation seed does not leak into the global generator
+    assert (np.random.get_state()[1] == state).all()
+
+
+def test_power_follows_the_effect_size():
+    power = flippr.simulate_power(n_reps=[3, 5], effect_sizes=[0.5, 3.0], n_sims=100, cv=0.1, seed=0, **QUANTIFIED)
+
+    assert power.select("No. of Replicates", "Effect Size").rows() == [(3, 0.5), (3, 3.0), (5, 0.5), (5, 3.0)]
+    assert (power["Fraction of Quantified Ions"] == 1.0).all()
+
+    # Below `protein.fc_sig_thresh` nothing is significant, an 8-fold change with 10% CV is almost always found
+    small, large = power.filter(pl.col("Effect Size") == 0.5), power.filter(pl.col("Effect Size") == 3.0)
+    assert (small["Power (P-value)"] == 0.0).all()
+    assert large["Power (P-value)"].to_list() == [pytest.approx(0.95, abs=0.05), 1.0]
+    assert large["Protein Power (Adj. P-value)"][1] == 1.0
+    assert (power["False Positive Rate (P-value)"] == 0.0).all()
+
+
+def test_power_grows_with_replicates():
+    # 1.5-fold (log2 0.58 < 1) thresholds would hide the effect, significance alone is counted
+    flippr.rcParams["protein.fc_sig_thresh"] = 0.0
+    power = flippr.simulate_power(n_reps=[2, 6], effect_sizes=[0.58], n_sims=300, cv=0.3, seed=1, **QUANTIFIED)
+
+    low, high = power["Power (P-value)"].to_list()
+    assert 0.0 < low < high
+
+    # Unchanged ions are significant at about the P-value threshold
+    assert power["False Positive Rate (P-value)"].max() == pytest.approx(0.01, abs=0.01)
+
+
+def test_invalid_designs_raise():
+    with pytest.raises(ValueError, match="greater than or equal to `2`"):
+        flippr.simulate_power(n_reps=[1])
+
+    with pytest.raises(ValueError, match="`changed_fraction`"):
+        flippr.simulate_power(changed_fraction=0.0)
@@ -0,0 +1,82 @@
+from concurrent.futures import CancelledError
+
+import pytest
+
+import flippr
+from flippr import datatypes as _types
+
+STAGES = [stage for stage, _ in _types._RUN_STAGES]
+
+
+def _study(dda, pids=("a",)) -> flippr.Study:
+    study = flippr.Study(lip=dda)
+    for pid in pids:
+        study.add_process(pid, "WT", "Drug", 3)
+
+    return study
+
+
+def _stages(events: list[dict]) -> list[tuple[str, str]]:
+    return [(e["event"], e["stage"]) for e in events if e["event"].startswith("stage_")]
+
+
+def test_run_reports_every_stage_in_order(dda):
+    events: list[dict] = []
+    results = _study(dda, ("a", "b")).run(progress=events.append)
+
+    for pid in ["a", "b"]:
+        process = [e for e in events if e["process"] == pid]
+
+        assert process[0] == {"event": "process_started", "process": pid}
+        assert process[-1] == {"event": "process_finished", "process": pid, "rows": results[pid].ion.height}
+        assert _stages(process) == [
+            (event, stage) for stage in ["read", *STAGES, "clean_up"] for event in ["stage_started", "stage_finished"]
+        ]
+        for e in process:
+            if e["event"] == "stage_finished":
+                assert e["table"] == "ion" and e["rows"] > 0 and e["seconds"] >= 0
+
+    # Processes run one after the other
+    assert [e["process"] for e in events] == sorted(e["process"] for e in events)
+
+
+def test_sharded_run_reports_every_shard(dda):
+    flippr.rcParams["run.n_shards"] = 3
+    flippr.rcParams["run.n_workers"] = 2
+
+    events: list[dict] = []
+    results = _study(dda).run(progress=events.append)
+
+    assert _stages(events) == [
+        (event, stage) for stage in ["read", "shards"] for event in ["stage_started", "stage_finished"]
+    ]
+
+    started = events.index({"event": "stage_started", "process": "a", "table": "ion", "stage": "shards"})
+    shards = [e for e in events if e["event"] == "shard_finished"]
+
+    assert [e["shard"] for e in shards] == [1, 2, 3]
+    assert all(e["n_shards"] == 3 for e in shards)
+    assert sum(e["rows"] for e in shards) == results["a"].ion.height
+    # Shard events are reported while the `shards` stage runs
+    assert events[started + 1:started + 4] == shards
+    assert events[started + 4]["stage"] == "shards"
+
+
+def test_cancelled_run_keeps_finished_processes(dda):
+    token = flippr.CancellationToken()
+    events: list[dict] = []
+
+    def progress(event: dict) -> None:
+        events.append(event)
+        if event["process"] == "b" and event.get("stage") == "impute" and event["event"] == "stage_finished":
+            token.cancel()
+
+    study = _study(dda, ("a", "b", "c"))
+    with pytest.raises(CancelledError, match="cancelled"):
+        study.run(progress=progress, cancel=token)
+
+    # The running stage completes, the next one is never started
+    assert events[-1] == {**events[-1], "event": "stage_finished", "process": "b", "stage": "impute"}
+    assert not any(e["process"] == "c" for e in events)
+    assert list(study.results) == ["a"]
+    assert study.results["a"].ion.height > 0
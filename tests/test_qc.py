@@ -0,0 +1,70 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+from flippr import qc as _qc
+
+SAMPLES = {"A_1": "A_1 Intensity", "A_2": "A_2 Intensity", "B_1": "B_1 Intensity", "B_2": "B_2 Intensity"}
+CONDITIONS = {name: name.split("_")[0] for name in SAMPLES}
+
+
+@pytest.fixture
+def intensities() -> pl.DataFrame:
+    x = np.random.lognormal(14, 1, (200, len(SAMPLES)))
+    x[np.random.random(x.shape) < 0.2] = 0.0
+    x[np.random.random(x.shape) < 0.05] = np.nan
+
+    return pl.DataFrame(x, schema=list(SAMPLES.values())).fill_nan(None)
+
+
+def test_correlation_matches_pairwise_pearson(intensities, monkeypatch):
+    # Several chunks are accumulated
+    monkeypatch.setattr(_qc, "_CHUNK_SIZE", 64)
+    corr = _qc._sample_correlation(intensities, SAMPLES)
+
+    assert corr["Sample"].to_list() == list(SAMPLES)
+    for i, a in enumerate(SAMPLES.values()):
+        for name, b in SAMPLES.items():
+            both = intensities.filter(pl.col(a).gt(0) & pl.col(b).gt(0)).select(pl.col(a, b).log(base=2))
+            assert corr[name][i] == pytest.approx(np.corrcoef(both[a], both[b])[0, 1])
+
+
+def test_missingness_counts_null_and_zero(intensities):
+    missing = _qc._sample_missingness(intensities, SAMPLES, CONDITIONS)
+
+    expected = [intensities.select(pl.col(col).fill_null(0).eq(0).sum()).item() for col in SAMPLES.values()]
+    assert missing["Missing"].to_list() == expected
+    assert missing["Missing Fraction"].to_list() == pytest.approx([n / intensities.height for n in expected])
+    assert missing["Condition"].to_list() == ["A", "A", "B", "B"]
+
+
+def test_intensity_and_cv_distributions(intensities):
+    intensity = _qc._sample_intensity(intensities, SAMPLES, CONDITIONS)
+    a_1 = intensities.filter(pl.col("A_1 Intensity").gt(0))["A_1 Intensity"].log(base=2).to_numpy()
+
+    row = intensity.row(0, named=True)
+    assert row["N"] == a_1.size
+    assert row["Mean"] == pytest.approx(a_1.mean())
+    assert (row["Min"], row["Max"]) == pytest.approx((a_1.min(), a_1.max()))
+
+    cv = _qc._condition_cv(intensities, SAMPLES, CONDITIONS)
+    a = intensities.select("A_1 Intensity", "A_2 Intensity").fill_null(0).to_numpy()
+    a = a[(a > 0).all(axis=1)]
+    cvs = a.std(axis=1, ddof=1) / a.mean(axis=1)
+
+    row = cv.row(0, named=True)
+    assert (row["Condition"], row["Replicates"], row["N"]) == ("A", 2, cvs.size)
+    assert row["Mean"] == pytest.approx(cvs.mean())
+
+
+def test_study_qc_covers_lip_and_trp(dda):
+    qc = flippr.Study(lip=dda, trp=dda).qc()
+
+    assert set(qc) == {"LiP", "TrP"}
+    for dataset in qc.values():
+        assert dataset.correlation["Sample"].to_list() == ["WT_1", "WT_2", "WT_3", "Drug_1", "Drug_2", "Drug_3"]
+        assert dataset.correlation.select(pl.exclude("Sample")).to_numpy().diagonal() == pytest.approx(1.0)
+        assert dataset.cv["Condition"].to_list() == ["WT", "Drug"]
+        assert dataset.missingness["Missing Fraction"].is_between(0, 1).all()
+        assert dataset.intensity.height == 6
@@ -0,0 +1,208 @@
+import gzip
+import shutil
+
+import numpy as np
+import polars as pl
+import pytest
+import zstandard
+
+import flippr
+
+from flippr import datatypes as _types
+from flippr import functions as _functions
+from flippr import reader as _reader
+from flippr import store as _store
+
+from .conftest import _write_dda
+
+RUNS = ["WT_1", "WT_2", "Drug_1", "Drug_2"]
+
+
+@pytest.fixture
+def report(tmp_path):
+    n = 3
+    rows = [
+        {
+            "Protein.Group": f"P{i}",
+            "Protein.Ids": f"P{i}",
+            "Protein.Names": f"E{i}",
+            "Genes": f"G{i}",
+            "First.Protein.Description": "d",
+            "Proteotypic": 1,
+            "Stripped.Sequence": f"PEPTIDE{i}K",
+            "Modified.Sequence": f"PEPTIDE{i}K",
+            "Precursor.Charge": 2,
+            "Precursor.Id": f"PEPTIDE{i}K2",
+            # DIA-NN reports the file name of every run, without its directory or extension
+            "Run": run,
+            "Precursor.Normalised": 1000.0 * (i + 1) + r,
+            "PG.MaxLFQ": 2000.0 * (i + 1) + r,
+            "Q.Value": 0.001,
+            "Lib.Q.Value": 0.001,
+            "PG.Q.Value": 0.001,
+            "Lib.PG.Q.Value": 0.001,
+        }
+        for i in range(n) for r, run in enumerate(RUNS)
+    ]
+
+    file = tmp_path.joinpath("report.parquet")
+    pl.DataFrame(rows).write_parquet(file)
+
+    return file
+
+
+def _annotation(tmp_path, files):
+    pl.DataFrame(
+        [(file, run.split("_")[0], run, run.split("_")[0], int(run.split("_")[1])) for file, run in zip(files, RUNS)],
+        schema=["file", "sample", "sample_name", "condition", "replicate"], orient="row",
+    ).write_csv(tmp_path.joinpath("experiment_annotation.tsv"), separator="\t")
+
+    return _reader._read_experiment_annotation(tmp_path)
+
+
+@pytest.mark.parametrize("prefix", ["", "/data/raw/", "C:\\data\\raw\\"])
+def test_diann_report_matches_annotated_paths(tmp_path, report, prefix):
+    annot = _annotation(tmp_path, [f"{prefix}{run}.mzML" for run in RUNS])
+
+    df = _reader._rename_dia_columns(_reader._pivot_diann_report(report, "dia_precursor", "float64", annot), annot)
+    intensities = [f"{run} Intensity" for run in RUNS]
+
+    assert [col for col in df.columns if col.endswith(" Intensity")] == intensities
+    assert df.select(pl.all_horizontal(pl.col(intensities) > 0)).to_series().all()
+
+    sparse = _reader._sparse_diann_report(report, "dia_precursor", "float64", annot)
+    samples = sparse["Intensities"].explode().struct.field("Sample")
+
+    assert samples.dtype == pl.Enum(intensities)
+    assert samples.cast(pl.String).value_counts()["count"].to_list() == [3] * len(RUNS)
+
+
+def test_diann_report_without_annotated_runs_raises(tmp_path, report):
+    annot = _annotation(tmp_path, [f"/data/raw/other_{run}.mzML" for run in RUNS])
+
+    with pytest.raises(ValueError, match="No run"):
+        _reader._pivot_diann_report(report, "dia_precursor", "float64", annot)
+
+    with pytest.raises(ValueError, match="No run"):
+        _reader._sparse_diann_report(report, "dia_precursor", "float64", annot)
+
+
+def test_densify_fills_samples_without_intensities():
+    sample = pl.Enum(["A Intensity", "B Intensity", "C Intensity"])
+    intensities = pl.List(pl.Struct({"Sample": sample, "Intensity": pl.Float32}))
+    df = pl.DataFrame(
+        {
+            "Peptide Sequence": ["PEPK", "TIDEK", "LESK"],
+            "Intensities": [
+                [{"Sample": "B Intensity", "Intensity": 2.0}, {"Sample": "A Intensity", "Intensity": 1.0}],
+                [],
+                [{"Sample": "C Intensity", "Intensity": 3.0}],
+            ],
+        },
+        schema={"Peptide Sequence": pl.String, "Intensities": intensities},
+    )
+
+    # `C Intensity` is only quantified in a dropped row
+    dense = _reader._densify(df, ["Peptide Sequence", "A Intensity", "C Intensity", "B Intensity"], pl.col("Peptide Sequence") != "LESK")
+
+    assert dense.schema == pl.Schema({
+        "Peptide Sequence": pl.String, "A Intensity": pl.Float32, "C Intensity": pl.Float32, "B Intensity": pl.Float32,
+    })
+    assert dense.rows() == [("PEPK", 1.0, 0.0, 2.0), ("TIDEK", 0.0, 0.0, 0.0)]
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+def test_presence_zero_count_matches_the_intensity_zero_count(layout):
+    # 70 samples span two `Presence` words
+    rng = np.random.default_rng(0)
+    samples = [f"S{i} Intensity" for i in range(70)]
+    intensities = rng.lognormal(10, 1, (200, len(samples))) * (rng.random((200, len(samples))) > 0.4)
+    dense = pl.DataFrame(intensities, schema=samples).with_columns(pl.Series("Peptide Sequence", [f"P{i}" for i in range(200)]))
+
+    df = _reader._add_presence(
+        dense if layout == "dense" else _reader._sparsify(dense.lazy(), samples).collect()
+    )
+
+    assert _reader._presence_samples(df) == samples
+    for cols in [samples[:3], samples[60:70], samples[::7], [samples[69], samples[0]]]:
+        expected = dense.select(pl.concat_list(cols).list.count_matches(0)).to_series()
+        zero_count = df.select(_reader._presence_zero_count(samples, cols, len(cols))).to_series()
+
+        assert zero_count.to_list() == expected.to_list()
+
+
+@pytest.mark.parametrize("layout", ["dense", "sparse"])
+@pytest.mark.parametrize("max_missing", [0, 1, 2])
+def test_presence_cull_matches_the_intensity_count_cull(dda, layout, max_missing):
+    ctrl_ints = ["WT_1 Intensity", "WT_2 Intensity", "WT_3 Intensity"]
+    test_ints = ["Drug_1 Intensity", "Drug_2 Intensity", "Drug_3 Intensity"]
+    rcParams = {**flippr.rcParams, "data.ion_layout": layout, "ion.missing_intensity_thresh": max_missing}
+    args = {
+        "ctrl_name": "WT", "test_name": "Drug", "ctrl_ints": ctrl_ints, "test_ints": test_ints,
+        "ctrl_n_rep": 3, "test_n_rep": 3, "rcParams": rcParams,
+    }
+    columns = ["Peptide Sequence", "Modified Sequence", "Charge"] + ctrl_ints + test_ints
+
+    culled = _types._read_ions(_store.ResultStore(rcParams), dda, "dda", columns, rcParams, args)
+    # The zero counts of the bitmask are kept, `_cull_intensities()` only adds missing ones
+    bitmask = _functions._cull_intensities(culled, **args)
+    counted = _functions._cull_intensities(_reader._read_ion(dda, "dda").select(columns), **args)
+
+    assert 0 < bitmask.height < _reader._read_ion(dda, "dda").height
+    assert bitmask.equals(counted.select(bitmask.columns))
+
+
+def _write_ion(tmp_path, rows):
+    file = tmp_path.joinpath("combined_ion.tsv")
+    file.write_text("\n".join("\t".join(row) for row in rows) + "\n")
+
+    return file
+
+
+def test_scan_fragpipe_pins_dtypes_without_inference(tmp_path):
+    # `Compensation Voltage` looks numeric and `A Intensity` is empty on every row, inference would guess both
+    file = _write_ion(tmp_path, [
+        ["Peptide Sequence", "Start", "Charge", "M/Z", "Compensation Voltage", "A Spectral Count", "A Intensity", "B Intensity", "Unknown"],
+        ["PEPK", "1", "2", "500.5", "-45", "3", "", "10", "7"],
+        ["TIDEK", "9", "3", "600.5", "-45", "0", "", "", "8"],
+    ])
+
+    df = _reader._scan_fragpipe(file, "dda_ion", "float32").collect()
+
+    assert df.schema == pl.Schema({
+        "Peptide Sequence": pl.String, "Start": pl.Int64, "Charge": pl.Int64, "M/Z": pl.Float64,
+        "Compensation Voltage": pl.String, "A Spectral Count": pl.Int64,
+        "A Intensity": pl.Float32, "B Intensity": pl.Float32, "Unknown": pl.String,
+    })
+    assert df["A Intensity"].to_list() == [0.0, 0.0]
+    assert df["B Intensity"].to_list() == [10.0, 0.0]
+
+
+def test_scan_fragpipe_rejects_values_of_the_wrong_dtype(tmp_path):
+    file = _write_ion(tmp_path, [
+        ["Peptide Sequence", "Start", "A Intensity"],
+        ["PEPK", "1", "10"],
+        ["TIDEK", "n/a", "20"],
+    ])
+
+    with pytest.raises(pl.exceptions.ComputeError):
+        _reader._scan_fragpipe(file, "dda_ion", "float64").collect()
+
+    with pytest.raises(ValueError, match="data.intensity_dtype"):
+        _reader._scan_fragpipe(file, "dda_ion", "float16")
+
+
+@pytest.mark.parametrize("suffix, compress", [(".gz", gzip.compress), (".zst", zstandard.compress)])
+def test_compressed_tables_match_the_plain_tsv(tmp_path, dda, suffix, compress):
+    shutil.copytree(dda, tmp_path, dirs_exist_ok=True)
+    for name in ["combined_ion.tsv", "combined_protein.tsv"]:
+        file = tmp_path.joinpath(name)
+        file.with_name(name + suffix).write_bytes(compress(file.read_bytes()))
+        file.unlink()
+
+    assert _reader._read_header(tmp_path.joinpath("combined_ion.tsv" + suffix)) == _reader._read_header(dda.joinpath("combined_ion.tsv"))
+    assert _reader._ion_header(tmp_path, "dda") == _reader._ion_header(dda, "dda")
+
+    assert _reader._read_ion(tmp_path, "dda").equals(_reader._read_ion(dda, "dda"))
+    assert _reader._read_ion_sparse(tmp_path, "dda").equals(_reader._read_ion_sparse(dda, "dda"))
+    assert _reader._read_trp(tmp_path, "dda").equals(_reader._read_trp(dda, "dda"))
@@ -0,0 +1,92 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import flippr
+
+
+@pytest.fixture
+def result(dda):
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    return study.run()["a"]
+
+
+def test_ion_is_formatted_on_access(result):
+    ion = result.ion
+
+    assert {"Cut Site", "Cut Site ID"} <= set(ion.columns)
+    assert "Cut Site Key" not in ion.columns
+    assert set(result.cut_site["Cut Site ID"]) <= set(ion["Cut Site ID"])
+
+    # Only the raw ions are held in the store
+    assert result.memory_usage["Table"].to_list() == ["ion", "cut_site"]
+
+
+def test_ion_can_be_reassigned(result):
+    cut_site = result.cut_site
+
+    result.ion = result.ion.sort("P-value")
+
+    assert "Cut Site Key" not in result.ion.columns
+    assert result.cut_site.sort("Cut Site ID").equals(cut_site.sort("Cut Site ID"))
+
+
+def test_query_after_ion_is_reordered(result):
+    pid = result.ion["Protein ID"][0]
+    expected = result.ion.filter(result.ion["Protein ID"] == pid).sort("P-value", maintain_order=True)
+
+    # Rows of a protein are no longer contiguous, lookups go through the sorting permutation
+    result.ion = result.ion.sort("P-value")
+    rows = result.query("ion", protein=pid)
+
+    assert rows.equals(expected)
+    assert result.query("ion", top=5)["P-value"].to_list() == result.ion["P-value"].head(5).to_list()
+
+
+def test_query_top_proteins_requires_by(result):
+    with pytest.raises(ValueError, match="`by` is required"):
+        result.query("protein", top=5)
+
+    by = "No. of Significant Cut Sites (Adj. P-value)"
+    top = result.query("protein", top=5, by=by, descending=True)
+
+    assert top[by].to_list() == result.protein_summary[by].sort(descending=True).head(5).to_list()
+
+
+def test_study_memory_usage_reports_parsed_inputs(dda):
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    study.run()
+
+    usage = study.memory_usage
+
+    assert usage.filter(pl.col("Process").is_null())["Table"].str.starts_with("ion:").all()
+    assert usage.filter(pl.col("Process").eq("a"))["Table"].to_list() == ["ion"]
+    assert usage["Bytes"].sum() == study._store.nbytes
+
+
+def test_parsed_inputs_count_against_the_memory_budget(dda):
+    flippr.rcParams["store.memory_budget"] = 100_000
+
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    study.add_process("b", "WT", "Drug", 3)
+    study.run()
+
+    assert study._store.nbytes <= 100_000
+    # Evicted inputs are parsed again
+    assert study.qc()["LiP"].missingness.height == 6
+
+
+def test_sparse_ion_layout_matches_dense(dda, result):
+    flippr.rcParams["data.ion_layout"] = "sparse"
+    # Same AON imputation draws as the dense `result`
+    np.random.seed(0)
+
+    study = flippr.Study(lip=dda)
+    study.add_process("a", "WT", "Drug", 3)
+    sparse = study.run()["a"]
+
+    assert sparse.ion.equals(result.ion)
+    assert sparse.cut_site.equals(result.cut_site)
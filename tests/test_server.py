@@ -0,0 +1,123 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import flippr
+from flippr import server as _server
+
+
+@pytest.fixture
+def server():
+    server = _server._make_server("127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def _request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=60)
+    headers = {"Content-Type": "application/json", **(headers or {})}
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def _run_request(dda, **fields):
+    return {"lip": str(dda), "processes": [{"pid": "a", "lip_ctrl": "WT", "lip_test": "Drug", "n_rep": 3}], **fields}
+
+
+def test_run_exports_inside_output_dir(server, dda, tmp_path):
+    flippr.rcParams["server.output_root"] = str(tmp_path)
+    status, body = _request(server, "POST", "/run", _run_request(dda, output_dir=str(tmp_path)))
+
+    assert status == 200
+    assert body["results"]["a"]["cut_site"] == str(tmp_path.joinpath("a.cut_site.parquet"))
+
+
+@pytest.mark.parametrize("pid", ["../escaped", "/tmp/escaped", "..\\escaped", ".."])
+def test_run_rejects_pid_paths(server, dda, tmp_path, pid):
+    flippr.rcParams["server.output_root"] = str(tmp_path)
+    request = _run_request(dda, output_dir=str(tmp_path.joinpath("out")))
+    request["processes"][0]["pid"] = pid
+
+    status, body = _request(server, "POST", "/run", request)
+
+    assert status == 400
+    assert "pid" in body["error"]
+    assert not any(tmp_path.rglob("*escaped*"))
+
+
+def test_run_rejects_output_dir_without_output_root(server, dda, tmp_path):
+    status, body = _request(server, "POST", "/run", _run_request(dda, output_dir=str(tmp_path)))
+
+    assert status == 400
+    assert "server.output_root" in body["error"]
+    assert not any(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("output_dir", ["..", "../outside", "root/../../outside"])
+def test_run_rejects_output_dir_outside_output_root(server, dda, tmp_path, output_dir):
+    root = tmp_path.joinpath("root")
+    flippr.rcParams["server.output_root"] = str(root)
+
+    status, body = _request(server, "POST", "/run", _run_request(dda, output_dir=str(root.joinpath(output_dir))))
+
+    assert status == 400
+    assert "server.output_root" in body["error"]
+    assert not any(tmp_path.rglob("*.parquet"))
+
+
+@pytest.mark.parametrize("key", ["server.max_concurrent", "store.spill_dir", "run.shared_dir", "run.n_shards"])
+def test_run_rejects_shared_rc_params(server, dda, key):
+    status, body = _request(server, "POST", "/run", _run_request(dda, rcParams={key: 1}))
+
+    assert status == 400
+    assert key in body["error"]
+    assert not server._studies
+
+
+def test_study_is_parsed_with_the_request_rc_params(server, dda):
+    status, _ = _request(server, "POST", "/run", _run_request(dda, rcParams={"data.intensity_dtype": "float32"}))
+
+    (study,) = server._studies.values()
+    raw = study._store._usage("__raw__")["Table"].to_list()
+
+    assert status == 200
+    assert raw == [f"ion:dense:dda:float32:{study.lip}"]
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({"Content-Type": "text/plain"}, 415),
+    ({"Origin": "http://evil.example"}, 403),
+    ({"Origin": "null"}, 403),
+    ({"Host": "evil.example"}, 403),
+])
+def test_cross_origin_requests_are_refused(server, dda, headers, status):
+    if "Host" in headers:
+        # A rebound name keeps the port of the server
+        headers = {"Host": f"{headers['Host']}:{server.server_address[1]}"}
+
+    code, body = _request(server, "POST", "/run", _run_request(dda), headers)
+
+    assert code == status
+    assert "error" in body
+    assert server._studies == {}
+
+
+def test_same_origin_requests_are_accepted(server):
+    port = server.server_address[1]
+
+    for headers in [{}, {"Host": f"localhost:{port}", "Origin": f"http://localhost:{port}"}]:
+        status, body = _request(server, "GET", "/studies", headers=headers)
+
+        assert status == 200
+        assert body == {"studies": []}
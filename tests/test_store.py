@@ -0,0 +1,103 @@
+import threading
+import time
+
+import polars as pl
+import pytest
+
+from flippr.store import ResultStore
+
+
+def _table(value: int, n: int = 1000) -> pl.DataFrame:
+    return pl.DataFrame({"x": [value] * n})
+
+
+def _store(tmp_path, eviction: str) -> ResultStore:
+    # Room for a single table
+    return ResultStore({"store.memory_budget": _table(0).estimated_size() + 1, "store.eviction": eviction, "store.spill_dir": tmp_path})
+
+
+def test_spilled_tables_are_reloaded_from_disk(tmp_path):
+    store = _store(tmp_path, "spill")
+    store.put(("a", "ion"), _table(1))
+    store.put(("a", "peptide"), _table(2))
+
+    usage = store._usage()
+    assert usage["State"].to_list() == ["disk", "memory"]
+    assert len(list(tmp_path.glob("flippr_*/*.arrow"))) == 1
+
+    def fail() -> pl.DataFrame:
+        raise AssertionError("spilled tables are not recomputed")
+
+    assert store.get(("a", "ion"), fail).equals(_table(1))
+    assert store._usage()["State"].to_list() == ["disk", "memory"]
+
+    store.discard(("a", "ion"))
+    store.discard(("a", "peptide"))
+    assert list(tmp_path.glob("flippr_*/*.arrow")) == []
+
+
+def test_evicted_tables_are_recomputed(tmp_path):
+    store = _store(tmp_path, "recompute")
+    store.put(("a", "ion"), _table(1), spill=True)
+    store.put(("a", "peptide"), _table(2))
+    store.put(("a", "cut_site"), _table(3))
+
+    # Base tables are spilled regardless of `store.eviction`, derived tables are dropped
+    assert store._usage().rows() == [("a", "ion", 0, "disk"), ("a", "cut_site", _table(3).estimated_size(), "memory")]
+
+    calls = []
+    df = store.get(("a", "peptide"), lambda: calls.append(1) or _table(2))
+
+    assert df.equals(_table(2)) and calls == [1]
+    assert store.get(("a", "peptide")).equals(_table(2))
+
+    with pytest.raises(KeyError):
+        store.get(("a", "missing"))
+
+
+def test_concurrent_gets_recompute_once(tmp_path):
+    store = _store(tmp_path, "recompute")
+    calls = []
+
+    def recompute() -> pl.DataFrame:
+        calls.append(1)
+        time.sleep(0.2)
+        return _table(4)
+
+    results: list[pl.DataFrame] = []
+    threads = [threading.Thread(target=lambda: results.append(store.get(("a", "peptide"), recompute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert len(results) == 8 and all(df.equals(_table(4)) for df in results)
+
+
+def test_failed_recompute_is_raised_to_every_waiter_and_retried(tmp_path):
+    store = _store(tmp_path, "recompute")
+    started = threading.Event()
+
+    def fail() -> pl.DataFrame:
+        started.set()
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def wait() -> None:
+        started.wait()
+        try:
+            store.get(("a", "peptide"), lambda: _table(5))
+        except RuntimeError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    with pytest.raises(RuntimeError, match="boom"):
+        store.get(("a", "peptide"), fail)
+    waiter.join()
+
+    assert len(errors) == 1
+    assert store.get(("a", "peptide"), lambda: _table(5)).equals(_table(5))
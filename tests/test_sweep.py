@@ -0,0 +1,62 @@
+import itertools
+
+import polars as pl
+import pytest
+
+import flippr
+
+GRID = {
+    "ion.missing_intensity_thresh": [0, 1],
+    "trp_protein.fc_sig_tresh": [0.1, 1.0],
+    "protein.adj_pval_sig_thresh": [0.01, 0.2],
+}
+
+
+def _study(dda) -> flippr.Study:
+    study = flippr.Study(lip=dda, trp=dda)
+    study.add_process("a", "WT", "Drug", 3, "WT", "Drug", 3)
+    return study
+
+
+def _standalone(dda, params: dict) -> dict:
+    flippr.rcParams.update(params)
+    result = _study(dda).run()["a"]
+
+    summary = result.protein_summary
+    row = {
+        "No. of Ions": result.ion.height,
+        "No. of Normalized Proteins": result.ion.filter(pl.col("Normalization Factor").gt(0))["Protein ID"].n_unique(),
+        "No. of Proteins with Significant Cut Sites (Adj. P-value)": summary.filter(
+            pl.col("No. of Significant Cut Sites (Adj. P-value)").gt(0)
+        ).height,
+    }
+
+    return row | {col: summary[col].sum() for col in summary.columns if col.startswith("No. of ") and col not in row}
+
+
+def test_every_sweep_point_matches_a_standalone_run(dda):
+    # AON imputations are drawn in a different order by the sweep, a zero scale makes them independent of the draws
+    flippr.rcParams["ion.aon_impute_scale"] = 0.0
+    defaults = dict(flippr.rcParams)
+
+    sweep = _study(dda).sweep(GRID)
+    assert sweep.height == 8
+    assert flippr.rcParams == defaults
+    # Every stage changes the counts
+    for col in ["No. of Ions", "No. of Normalized Proteins", "No. of Significant Cut Sites (Adj. P-value)"]:
+        assert sweep[col].n_unique() > 1, col
+
+    for values in itertools.product(*GRID.values()):
+        params = dict(zip(GRID, values))
+        point = sweep.filter(pl.all_horizontal(pl.col(key).eq(value) for key, value in params.items())).row(0, named=True)
+
+        flippr.rcParams.clear()
+        flippr.rcParams.update(defaults)
+        expected = _standalone(dda, params)
+
+        assert {col: point[col] for col in expected} == expected, params
+
+
+def test_sweep_rejects_keys_that_cannot_be_swept(dda):
+    with pytest.raises(ValueError, match='"run.n_shards" cannot be swept'):
+        _study(dda).sweep({"run.n_shards": [1, 2]})
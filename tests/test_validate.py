@@ -0,0 +1,33 @@
+import polars as pl
+import pytest
+
+import flippr
+
+from .conftest import _write_dda
+
+
+def test_add_process_reports_every_missing_column_before_reading(dda):
+    study = flippr.Study(lip=dda, trp=dda)
+
+    with pytest.raises(ValueError, match="Columns required by the process were not found") as e:
+        study.add_process("a", "WT", "Nope", 3, "Nope", "Drug", 3)
+
+    message = str(e.value)
+    assert all(f"`Nope_{rep} Intensity`" in message for rep in (1, 2, 3))
+    assert f'LiP output "{study.lip}" is missing' in message
+    assert f'TrP output "{study.trp}" is missing' in message
+    assert "WT_1" not in message
+
+    # Only the headers were read
+    assert study._store.nbytes == 0
+
+
+def test_add_process_reports_columns_missing_from_the_header(tmp_path):
+    path = _write_dda(tmp_path, n=50)
+    ion = pl.read_csv(path.joinpath("combined_ion.tsv"), separator="\t")
+    ion.drop("Prev AA").write_csv(path.joinpath("combined_ion.tsv"), separator="\t")
+
+    study = flippr.Study(lip=path)
+
+    with pytest.raises(ValueError, match="`Prev AA`"):
+        study.add_process("a", "WT", "Drug", 3)